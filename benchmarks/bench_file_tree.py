@@ -0,0 +1,130 @@
+"""
+Memory of the interactive selector's file tree, fully loaded.
+
+Loads every directory of a synthetic tree (see ``synthetic_tree.py``)
+into the selector's array-backed ``FileTree`` and, for comparison, into
+one object per file with its own ``Path`` and child list, the way the
+selector stored its tree before. Memory is what ``tracemalloc`` still
+sees allocated once each tree is built; the times include tracemalloc's
+overhead.
+
+    python benchmarks/bench_file_tree.py [DIR] [--files N]
+"""
+
+import argparse
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rich.console import Console
+
+import shotgun_terminal.tree_selector as tree_selector
+from shotgun_terminal.walker import scan_directory
+from synthetic_tree import make_tree
+
+# The reduction the array-backed tree is expected to reach
+TARGET_REDUCTION = 5
+
+
+class FileNode:
+    """A node of the object-per-file tree the selector used before."""
+
+    def __init__(
+        self,
+        path: Path,
+        is_directory: bool = False,
+        parent: Optional["FileNode"] = None,
+    ):
+        self.path = path
+        self.is_directory = is_directory
+        self.parent = parent
+        self.children: List["FileNode"] = []
+        self.checked = True
+        self.size = 0
+        self.expanded = False
+        self.loaded = not is_directory
+        self.user_set = False
+
+
+def build_object_tree(root: Path, rules) -> FileNode:
+    """Load every directory into FileNode objects, as the old selector did."""
+    top = FileNode(root, True)
+    pending = [(top, "")]
+    while pending:
+        node, prefix = pending.pop()
+        node.loaded = True
+        dirs, files, sizes = scan_directory(str(node.path), True)
+        entries = [(name, True, 0) for name in dirs]
+        entries.extend(zip(files, [False] * len(files), sizes))
+        for name, is_dir, size in sorted(entries):
+            relative_path = prefix + name
+            if rules.matches(relative_path, is_dir):
+                continue
+            child = FileNode(node.path / name, is_dir, node)
+            child.size = size
+            node.children.append(child)
+            if is_dir:
+                pending.append((child, relative_path + "/"))
+    return top
+
+
+def build_file_tree(root: Path):
+    """Load every directory into the selector's FileTree."""
+    selector = tree_selector.RichFileTreeSelector(root, use_git=False, use_cache=False)
+    selector.build_file_tree()
+    selector.load_all()
+    return selector.tree
+
+
+def measure(func, *args):
+    """Memory still allocated after ``func`` returns, its time and result."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "root",
+        nargs="?",
+        default=os.path.join(tempfile.gettempdir(), "shotgun-bench-tree"),
+        help="Where the synthetic tree is (created if missing)",
+    )
+    parser.add_argument("--files", type=int, default=200_000, help="Files in the tree")
+    args = parser.parse_args()
+
+    root = Path(make_tree(args.root, args.files))
+    tree_selector.console = Console(file=io.StringIO())
+    rules = tree_selector.ShotgunIgnoreManager(root).default_rules
+
+    old_memory, old_time, _ = measure(build_object_tree, root, rules)
+    new_memory, new_time, tree = measure(build_file_tree, root)
+
+    print(f"Synthetic tree in {root}, {len(tree)} nodes loaded")
+    print(f"  FileNode objects  {old_memory / 1e6:7.1f} MB  {old_time:6.2f} s")
+    print(f"  FileTree arrays   {new_memory / 1e6:7.1f} MB  {new_time:6.2f} s")
+
+    reduction = old_memory / max(new_memory, 1)
+    verdict = "meets" if reduction >= TARGET_REDUCTION else "misses"
+    print(
+        f"{reduction:.1f}x less memory, which {verdict} the {TARGET_REDUCTION}x target"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Throughput of the offline token estimator.
+
+Builds a buffer of about 100 MB from the source files below a directory
+(the Python standard library by default) and times the estimator on it,
+as one buffer, as 20 KB files and as decoded text.
+
+    python benchmarks/bench_tokens.py [--source DIR] [--size MB]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from shotgun_terminal.tokens import estimate_bytes_tokens, estimate_tokens
+
+# Throughput the estimator is expected to reach
+TARGET_MB_PER_S = 100
+
+FILE_SIZE = 20 * 1024
+
+
+def read_corpus(source: str, size: int) -> bytes:
+    """Read the .py files below ``source``, repeated up to ``size`` bytes."""
+    parts = []
+    total = 0
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            try:
+                with open(os.path.join(root, name), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            parts.append(data)
+            total += len(data)
+            if total >= size:
+                return b"".join(parts)[:size]
+
+    if not parts:
+        sys.exit(f"No .py files found below {source}")
+    data = b"".join(parts)
+    return (data * (size // len(data) + 1))[:size]
+
+
+def best_of(runs: int, func, *args) -> float:
+    """Best wall time of ``runs`` calls, in seconds."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--source",
+        default=os.path.dirname(os.__file__),
+        help="Directory to take .py files from (default: the standard library)",
+    )
+    parser.add_argument("--size", type=int, default=100, help="Buffer size in MB")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per case")
+    args = parser.parse_args()
+
+    data = read_corpus(args.source, args.size * 1000 * 1000)
+    chunks = [data[i : i + FILE_SIZE] for i in range(0, len(data), FILE_SIZE)]
+    text = data.decode("utf-8", "replace")
+
+    cases = [
+        ("bytes, one buffer", lambda: estimate_bytes_tokens(data), len(data)),
+        (
+            "bytes, 20 KB files",
+            lambda: sum(map(estimate_bytes_tokens, chunks)),
+            len(data),
+        ),
+        ("str, one buffer", lambda: estimate_tokens(text), len(text)),
+    ]
+
+    print(f"{len(data) / 1e6:.0f} MB of .py files from {args.source}")
+    slowest = float("inf")
+    for label, func, length in cases:
+        rate = length / best_of(args.runs, func) / 1e6
+        slowest = min(slowest, rate)
+        print(f"  {label:20} {rate:7.0f} MB/s")
+
+    verdict = "meets" if slowest >= TARGET_MB_PER_S else "misses"
+    print(f"Slowest case {verdict} the {TARGET_MB_PER_S} MB/s target")
+
+
+if __name__ == "__main__":
+    main()
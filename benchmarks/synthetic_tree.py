@@ -0,0 +1,97 @@
+"""
+Generate a synthetic project tree for the benchmarks.
+
+The tree holds ``files`` small source files spread evenly over
+``packages`` x ``modules`` directories (src/pkgN/modM/fK.py), plus a
+build/ directory and __pycache__ directories that the default ignore
+patterns prune. Generating the same tree again is a no-op; a tree of
+another shape there is deleted first.
+
+    python benchmarks/synthetic_tree.py DIR [--files N]
+"""
+
+import argparse
+import os
+import shutil
+
+# Holds the tree's shape once it is complete, so an interrupted run is
+# redone next time; its presence marks the directory as safe to replace
+MARKER = ".synthetic-tree"
+
+
+def source_count(files: int, packages: int = 10, modules: int = 100) -> int:
+    """Get how many source files a tree asked to hold ``files`` really has."""
+    return max(files // (packages * modules), 1) * packages * modules
+
+
+def make_tree(
+    root: str, files: int = 200_000, packages: int = 10, modules: int = 100
+) -> str:
+    """
+    Create the synthetic tree below ``root`` unless it is already there.
+
+    A tree of another shape in ``root`` is deleted first, so the files of a
+    larger one don't stay behind. A non-empty directory without the marker
+    is left alone.
+
+    Raises:
+        ValueError: If ``root`` is a non-empty directory that holds no
+            synthetic tree
+
+    Returns:
+        ``root``
+    """
+    marker = os.path.join(root, MARKER)
+    stamp = f"{files} {packages} {modules}\n"
+    try:
+        with open(marker, encoding="utf-8") as f:
+            if f.read() == stamp:
+                return root
+    except FileNotFoundError:
+        if os.path.exists(root) and os.listdir(root):
+            raise ValueError(f"{root} is not empty and holds no synthetic tree")
+    else:
+        shutil.rmtree(root)
+
+    os.makedirs(root, exist_ok=True)
+    with open(marker, "w", encoding="utf-8"):
+        pass
+
+    per_module = source_count(files, packages, modules) // (packages * modules)
+    for package in range(packages):
+        for module in range(modules):
+            directory = os.path.join(root, "src", f"pkg{package}", f"mod{module}")
+            os.makedirs(os.path.join(directory, "__pycache__"), exist_ok=True)
+            for index in range(per_module):
+                # Sizes vary from file to file, from about 100 bytes to 4 KB
+                lines = 2 + (index * 7 + module) % 100
+                with open(os.path.join(directory, f"f{index}.py"), "w") as f:
+                    f.write(f'"""Module {index}."""\n')
+                    for line in range(lines):
+                        f.write(f"value_{line} = {line * index}\n")
+            with open(os.path.join(directory, "__pycache__", "f0.pyc"), "wb") as f:
+                f.write(b"\0" * 64)
+
+    build = os.path.join(root, "build")
+    os.makedirs(build, exist_ok=True)
+    for index in range(1000):
+        with open(os.path.join(build, f"out{index}.o"), "wb") as f:
+            f.write(b"\0" * 256)
+
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(stamp)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="Directory to create the tree in")
+    parser.add_argument("--files", type=int, default=200_000, help="Files to create")
+    args = parser.parse_args()
+
+    make_tree(args.root, args.files)
+    print(f"Synthetic tree of {source_count(args.files)} source files in {args.root}")
+
+
+if __name__ == "__main__":
+    main()
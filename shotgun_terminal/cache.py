@@ -0,0 +1,273 @@
+"""Persistent content cache with XDG-compliant storage."""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from rich.console import Console
+
+console = Console()
+
+# Bump when the meaning of stored values changes so stale caches are ignored
+CACHE_VERSION = 3
+
+# Queued contents are written once they add up to this many characters, so
+# memory use stays bounded however much is read before the next flush
+FLUSH_THRESHOLD = 4 * 1024 * 1024
+
+# Decoded view of a file; ``content`` is None for binary files
+CachedFile = namedtuple(
+    "CachedFile", ["content", "is_binary", "encoding", "content_hash", "tokens"]
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    is_binary INTEGER NOT NULL,
+    encoding TEXT,
+    content TEXT,
+    content_hash TEXT,
+    tokens INTEGER NOT NULL,
+    nbytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used);
+CREATE TABLE IF NOT EXISTS outlines (
+    key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    outline TEXT NOT NULL
+);
+"""
+
+
+def get_cache_dir() -> Path:
+    """Get XDG-compliant cache directory."""
+    # Use XDG_CACHE_HOME if set, otherwise default to ~/.cache
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home:
+        return Path(cache_home) / "shotgun-code"
+    else:
+        return Path.home() / ".cache" / "shotgun-code"
+
+
+class ContentCache:
+    """
+    On-disk cache of decoded file contents.
+
+    Entries are keyed by path and only returned while the file's size,
+    mtime and inode still match. Storage is SQLite in WAL mode, so several
+    shotgun processes can share the cache safely. Connections are kept in
+    a pool and lent to one thread at a time, so there are never more than
+    the threads using the cache at once. Writes are buffered and applied
+    in one transaction by ``flush``, which runs by itself once
+    ``FLUSH_THRESHOLD`` is reached and also evicts least recently used
+    entries once the cache grows past ``max_size`` bytes.
+
+    Outlines of large files are stored alongside, keyed by content hash,
+    and dropped once no cached file has that content any more.
+    """
+
+    def __init__(
+        self, cache_dir: Optional[Path] = None, max_size: int = 512 * 1024 * 1024
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir()
+        self.db_file = self.cache_dir / f"content-v{CACHE_VERSION}.db"
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._idle_connections = []
+        self._pending_puts = []
+        self._pending_bytes = 0
+        self._pending_touches = []
+        self._pending_outlines = []
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool, opening one if none is idle."""
+        with self._lock:
+            conn = self._idle_connections.pop() if self._idle_connections else None
+
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self.db_file),
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error:
+                conn.close()
+                raise
+
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._idle_connections.append(conn)
+
+    def get(self, path: Path, stat_result: os.stat_result) -> Optional[CachedFile]:
+        """Get the cached view of a file if it has not changed since caching."""
+        key = str(Path(path).absolute())
+
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT size, mtime_ns, inode, is_binary, encoding, content, "
+                    "content_hash, tokens FROM files WHERE path = ?",
+                    (key,),
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+
+        if row is None:
+            return None
+
+        size, mtime_ns, inode, is_binary, encoding, content, content_hash, tokens = row
+        if (size, mtime_ns, inode) != (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            stat_result.st_ino,
+        ):
+            return None
+
+        with self._lock:
+            self._pending_touches.append((time.time(), key))
+
+        return CachedFile(content, bool(is_binary), encoding, content_hash, tokens)
+
+    def put(self, path: Path, stat_result: os.stat_result, cached: CachedFile):
+        """Queue a file's decoded view for storage, flushing if enough is queued."""
+        key = str(Path(path).absolute())
+        nbytes = len(cached.content) if cached.content else 0
+
+        with self._lock:
+            self._pending_bytes += nbytes
+            full = self._pending_bytes >= FLUSH_THRESHOLD
+            self._pending_puts.append(
+                (
+                    key,
+                    stat_result.st_size,
+                    stat_result.st_mtime_ns,
+                    stat_result.st_ino,
+                    int(cached.is_binary),
+                    cached.encoding,
+                    cached.content,
+                    cached.content_hash,
+                    cached.tokens,
+                    nbytes,
+                    time.time(),
+                )
+            )
+
+        if full:
+            self.flush()
+
+    def get_outline(self, key: str) -> Optional[str]:
+        """Get a cached outline by its key (see ``outline.outline_key``)."""
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT outline FROM outlines WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+
+        return row[0] if row else None
+
+    def put_outline(self, key: str, content_hash: str, outline: str):
+        """Queue an outline for storage on the next flush."""
+        with self._lock:
+            self._pending_outlines.append((key, content_hash, outline))
+
+    def flush(self):
+        """Write queued entries and evict old ones in a single transaction."""
+        # One flush at a time, so entries queued later are never written
+        # before (and overwritten by) older ones
+        with self._flush_lock, self._connection() as conn:
+            self._write(conn)
+
+    def _write(self, conn: sqlite3.Connection):
+        """Apply the queued entries on a connection, see ``flush``."""
+        with self._lock:
+            puts, self._pending_puts = self._pending_puts, []
+            touches, self._pending_touches = self._pending_touches, []
+            outlines, self._pending_outlines = self._pending_outlines, []
+            self._pending_bytes = 0
+
+        if not puts and not touches and not outlines:
+            return
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                puts,
+            )
+            conn.executemany("UPDATE files SET last_used = ? WHERE path = ?", touches)
+            conn.executemany(
+                "INSERT OR REPLACE INTO outlines VALUES (?, ?, ?)", outlines
+            )
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            console.print(
+                f"[yellow]Warning:[/yellow] Could not update content cache: {e}"
+            )
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until the cache fits its size cap."""
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM files").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        # Evict down to 90% of the cap so we don't evict again on every run
+        excess = total - int(self.max_size * 0.9)
+        stale = []
+        rows = conn.execute("SELECT path, nbytes FROM files ORDER BY last_used")
+        for path, nbytes in rows:
+            if excess <= 0:
+                break
+            stale.append((path,))
+            excess -= nbytes
+        rows.close()
+
+        conn.executemany("DELETE FROM files WHERE path = ?", stale)
+        conn.execute(
+            "DELETE FROM outlines WHERE content_hash NOT IN "
+            "(SELECT content_hash FROM files WHERE content_hash IS NOT NULL)"
+        )
+
+    def close(self):
+        """Flush pending writes and close all connections."""
+        self.flush()
+
+        with self._lock:
+            connections, self._idle_connections = self._idle_connections, []
+
+        for conn in connections:
+            conn.close()
+
+
+def open_content_cache() -> Optional[ContentCache]:
+    """Open the default content cache, or return None if it is unavailable."""
+    try:
+        return ContentCache()
+    except (OSError, sqlite3.Error) as e:
+        console.print(f"[yellow]Warning:[/yellow] Content cache disabled: {e}")
+        return None
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import click
+from click.core import ParameterSource
 import os
 from rich.console import Console
 from rich.panel import Panel
@@ -8,14 +9,25 @@ from rich.prompt import Prompt, Confirm
 from rich.table import Table
 import inquirer
 
-from .prompts import process_template
+from .prompts import process_template, write_template
 from .file_selector import FileSelector
 from .context_generator import ContextGenerator
+from .cache import open_content_cache
+from .packing import (
+    PACK_ORDERS,
+    TRUNCATED,
+    SUMMARIZED,
+    OMITTED,
+    pack_manifest,
+)
+from .tokens import estimate_tokens
+from .transforms import TRANSFORMS, TransformPipeline
 from .user_input import UserInputCollector
 from .settings import SettingsManager
 from .config import ConfigManager
 from .translator import TranslationService
 from .gemini_service import GeminiService
+from .watch import LiveContext, watch_context
 
 console = Console()
 
@@ -39,9 +51,89 @@ console = Console()
     type=click.Choice(["dev", "architect", "bug"]),
     help="Type of prompt to generate",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Number of files to read in parallel (default: based on CPU count)",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Don't use the persistent file content cache and directory index",
+)
+@click.option(
+    "--no-dedup",
+    is_flag=True,
+    help="Emit files with identical content in full instead of referencing the first copy",
+)
+@click.option(
+    "--no-git",
+    is_flag=True,
+    help="List every file by walking the directory, ignoring git and .gitignore files",
+)
+@click.option(
+    "--transform",
+    "transforms",
+    multiple=True,
+    type=click.Choice(list(TRANSFORMS) + ["all"]),
+    help="Strip content before emitting it; repeat for several (or 'all')",
+)
+@click.option(
+    "--outline",
+    "outline_patterns",
+    multiple=True,
+    metavar="PATTERN",
+    help="Emit files matching this path/glob as outlines (signatures and docstrings)",
+)
+@click.option(
+    "--outline-over",
+    type=click.IntRange(min=1),
+    metavar="KB",
+    help="Emit files larger than this as outlines (default: the 1MB file limit)",
+)
+@click.option(
+    "--token-budget",
+    type=click.IntRange(min=1),
+    help="Pack files into this many tokens instead of the 10MB size limit",
+)
+@click.option(
+    "--pack-order",
+    type=click.Choice(PACK_ORDERS),
+    default="smallest",
+    show_default=True,
+    help="Which files get priority under --token-budget",
+)
+@click.option(
+    "--rank-file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="File listing paths/globs by priority, for --pack-order ranking",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep the output up to date as the selected files change, until Ctrl+C",
+)
 @click.option("--config", is_flag=True, help="Configure API settings (translation, Gemini, etc.)")
 @click.option("--quick-setup", is_flag=True, help="Quick setup with test credentials")
-def main(directory, output, prompt_type, config, quick_setup):
+def main(
+    directory,
+    output,
+    prompt_type,
+    jobs,
+    no_cache,
+    no_dedup,
+    no_git,
+    transforms,
+    outline_patterns,
+    outline_over,
+    token_budget,
+    pack_order,
+    rank_file,
+    watch,
+    config,
+    quick_setup,
+):
     """Shotgun Terminal - Generate comprehensive project context for LLM workflows."""
 
     console.print(
@@ -63,6 +155,16 @@ def main(directory, output, prompt_type, config, quick_setup):
 
         return
 
+    if pack_order == "ranking" and not rank_file:
+        raise click.UsageError("--pack-order ranking requires --rank-file")
+    if token_budget is None:
+        # Packing is what these steer, and it only happens with a budget
+        context = click.get_current_context()
+        if context.get_parameter_source("pack_order") != ParameterSource.DEFAULT:
+            raise click.UsageError("--pack-order requires --token-budget")
+        if rank_file:
+            raise click.UsageError("--rank-file requires --token-budget")
+
     # Initialize components
     settings = SettingsManager()
     user_input = UserInputCollector()
@@ -169,7 +271,12 @@ def main(directory, output, prompt_type, config, quick_setup):
 
     # Step 5: Interactive file selection
     console.print("\n" + "=" * 60)
-    file_selector = FileSelector(directory)
+    file_selector = FileSelector(
+        directory,
+        token_budget=token_budget,
+        use_git=not no_git,
+        use_cache=not no_cache,
+    )
     included_files, ignore_patterns = file_selector.interactive_selection()
     console.print("\n[green]✓[/green] Files selected")
 
@@ -185,7 +292,7 @@ def main(directory, output, prompt_type, config, quick_setup):
     # Step 8: Generate context
     console.print("\n" + "=" * 60)
     console.print("[yellow]Generating context...[/yellow]")
-    final_output = generate_context(
+    total_tokens = generate_context(
         directory,
         included_files,
         ignore_patterns,
@@ -193,10 +300,24 @@ def main(directory, output, prompt_type, config, quick_setup):
         output,
         user_task,
         custom_rules,
+        jobs,
+        use_cache=not no_cache,
+        dedupe=not no_dedup,
+        transforms=transforms,
+        outline_patterns=outline_patterns,
+        outline_size=outline_over * 1024 if outline_over else None,
+        token_budget=token_budget,
+        pack_order=pack_order,
+        rank_file=rank_file,
+        use_git=not no_git,
+        watch=watch,
     )
 
     # Step 9: Check if Gemini is enabled and process if so
-    if settings.is_gemini_enabled():
+    if watch and settings.is_gemini_enabled():
+        console.print("\n[dim]Gemini processing is skipped in watch mode[/dim]")
+
+    if settings.is_gemini_enabled() and not watch:
         console.print("\n" + "=" * 60)
         console.print(
             "[yellow]🤖 Gemini integration enabled - processing prompt...[/yellow]"
@@ -210,6 +331,10 @@ def main(directory, output, prompt_type, config, quick_setup):
                 temperature = settings.get_gemini_temperature()
                 thinking_budget = settings.get_gemini_thinking_budget()
 
+                # The context was streamed to disk; load it for the API call
+                with open(output, "r", encoding="utf-8") as f:
+                    final_output = f.read()
+
                 # Process with Gemini
                 gemini_output_file = gemini_service.process_prompt(
                     final_output,
@@ -237,6 +362,7 @@ def main(directory, output, prompt_type, config, quick_setup):
                         gemini_output_file,
                         user_task,
                         len(included_files),
+                        total_tokens,
                         temperature,
                         thinking_budget,
                     )
@@ -246,28 +372,28 @@ def main(directory, output, prompt_type, config, quick_setup):
                     )
                     console.print("[green]✓[/green] Context generated successfully!")
                     console.print(f"[green]✓[/green] Output saved to: {output}")
-                    show_summary(output, user_task, len(included_files))
+                    show_summary(output, user_task, len(included_files), total_tokens)
             else:
                 console.print(
                     "\n[yellow]⚠️  Failed to configure Gemini - using standard output[/yellow]"
                 )
                 console.print("[green]✓[/green] Context generated successfully!")
                 console.print(f"[green]✓[/green] Output saved to: {output}")
-                show_summary(output, user_task, len(included_files))
+                show_summary(output, user_task, len(included_files), total_tokens)
         else:
             console.print(
                 "\n[yellow]⚠️  Gemini enabled but no API key configured - using standard output[/yellow]"
             )
             console.print("[green]✓[/green] Context generated successfully!")
             console.print(f"[green]✓[/green] Output saved to: {output}")
-            show_summary(output, user_task, len(included_files))
+            show_summary(output, user_task, len(included_files), total_tokens)
     else:
         console.print("\n[bold green]🎉 Success![/bold green]")
         console.print("[green]✓[/green] Context generated successfully!")
         console.print(f"[green]✓[/green] Output saved to: {output}")
 
         # Show final summary
-        show_summary(output, user_task, len(included_files))
+        show_summary(output, user_task, len(included_files), total_tokens)
 
 
 def select_directory(settings):
@@ -338,55 +464,160 @@ def generate_context(
     output_file,
     user_task,
     custom_rules,
+    jobs=None,
+    use_cache=True,
+    dedupe=True,
+    transforms=(),
+    outline_patterns=(),
+    outline_size=None,
+    token_budget=None,
+    pack_order="smallest",
+    rank_file=None,
+    use_git=True,
+    watch=False,
 ):
-    """Generate context using internal Python implementation."""
+    """Generate context using internal Python implementation, returning its estimated tokens.
+
+    With ``watch``, the output is then kept up to date as files change
+    until Ctrl+C, and the tokens of its last version are returned.
+    """
+
+    cache = open_content_cache() if use_cache else None
 
     try:
         # Create context generator
-        generator = ContextGenerator(directory)
+        if "all" in transforms:
+            transforms = TRANSFORMS
+        pipeline = TransformPipeline(transforms)
+
+        generator = ContextGenerator(
+            directory,
+            jobs=jobs,
+            cache=cache,
+            dedupe=dedupe,
+            transforms=pipeline,
+            outline_size=outline_size,
+            outline_patterns=outline_patterns,
+        )
+
+        # Scan the selection once; every stage below reads from the manifest
+        manifest = generator.scan(included_files, ignore_patterns)
 
         # Show file statistics
-        stats = generator.get_file_stats(included_files, ignore_patterns)
+        stats = generator.get_file_stats(manifest)
         console.print(f"[blue]Files to process: {stats['total_files']}[/blue]")
         console.print(f"[blue]Total size: {stats['total_size'] / 1024:.1f} KB[/blue]")
+        console.print(f"[blue]Estimated file tokens: {stats['total_tokens']}[/blue]")
+        if pipeline:
+            console.print(f"[blue]Transforms: {', '.join(pipeline.names)}[/blue]")
 
         if stats["large_files"]:
             console.print(
                 f"[yellow]Large files (will be skipped): {len(stats['large_files'])}[/yellow]"
             )
 
+        if stats["outlined_files"]:
+            console.print(
+                f"[yellow]Large files (will be outlined): {len(stats['outlined_files'])}[/yellow]"
+            )
+
         if stats["binary_files"]:
             console.print(
                 f"[yellow]Binary files (will be summarized): {len(stats['binary_files'])}[/yellow]"
             )
 
+        if stats["duplicate_files"]:
+            console.print(
+                f"[yellow]Duplicate files (will be referenced): {len(stats['duplicate_files'])}[/yellow]"
+            )
+
         # Generate project tree
-        project_tree = generator.generate_project_tree(included_files, ignore_patterns)
+        project_tree = generator.generate_project_tree(manifest)
 
-        # Generate context
-        context = generator.generate_context(
-            included_files, ignore_patterns, "claude-xml"
+        # Fit files into the token budget left over by the prompt itself
+        plan = None
+        prompt_tokens = estimate_tokens(
+            process_template(prompt_type, user_task, custom_rules, "", project_tree)
         )
+        if token_budget:
+            file_budget = max(token_budget - prompt_tokens, 0)
+            if not file_budget:
+                console.print(
+                    "[yellow]Token budget is smaller than the prompt itself[/yellow]"
+                )
 
-        # Process template with user inputs
-        final_output = process_template(
-            prompt_type, user_task, custom_rules, context, project_tree
-        )
+            plan = pack_manifest(
+                manifest,
+                file_budget,
+                generator.max_file_size,
+                pack_order,
+                user_task,
+                rank_file,
+            )
+            console.print(
+                f"[blue]Token budget: {token_budget} "
+                f"({prompt_tokens} for the prompt, {file_budget} for files)[/blue]"
+            )
+            for mode, label in [
+                (TRUNCATED, "truncated"),
+                (SUMMARIZED, "summarized"),
+                (OMITTED, "omitted"),
+            ]:
+                if plan.count(mode):
+                    console.print(
+                        f"[yellow]Files {label} to fit the budget: {plan.count(mode)}[/yellow]"
+                    )
+
+        # Watch mode rewrites the output from the blocks kept here
+        if watch:
+            generator.block_memo = {}
 
-        # Write to output file
+        # Stream context into the template and straight to the output file
+        context_blocks = generator.iter_context(manifest, "claude-xml", plan)
         with open(output_file, "w", encoding="utf-8") as f:
-            f.write(final_output)
+            write_template(
+                f, prompt_type, user_task, custom_rules, context_blocks, project_tree
+            )
 
-        # Return the final output for potential Gemini processing
-        return final_output
+        total_tokens = prompt_tokens + generator.context_tokens
+        if token_budget:
+            console.print(
+                f"[green]Estimated tokens: {total_tokens} / {token_budget}[/green]"
+            )
+        else:
+            console.print(f"[green]Estimated tokens: {total_tokens}[/green]")
+
+        if watch:
+            console.print(f"[green]✓[/green] Output saved to: {output_file}")
+            live = LiveContext(
+                generator,
+                manifest,
+                output_file,
+                prompt_type,
+                user_task,
+                custom_rules,
+                ignore_patterns,
+                token_budget,
+                pack_order,
+                rank_file,
+                use_git,
+            )
+            watch_context(live, output_file)
+            total_tokens = live.total_tokens or total_tokens
+
+        return total_tokens
 
     except Exception as e:
         console.print(f"[red]Error generating context:[/red] {e}")
         raise
 
+    finally:
+        if cache is not None:
+            cache.close()
+
 
 def show_gemini_summary(
-    gemini_output_file, user_task, file_count, temperature, thinking_budget
+    gemini_output_file, user_task, file_count, token_count, temperature, thinking_budget
 ):
     """Show final summary with Gemini processing details."""
     console.print(
@@ -394,6 +625,7 @@ def show_gemini_summary(
             "[bold green]🤖 Gemini Processing Summary[/bold green]\n\n"
             f"[blue]Task:[/blue] {user_task[:100]}{'...' if len(user_task) > 100 else ''}\n"
             f"[blue]Files processed:[/blue] {file_count}\n"
+            f"[blue]Estimated tokens:[/blue] {token_count}\n"
             f"[blue]Temperature:[/blue] {temperature}\n"
             f"[blue]Thinking Budget:[/blue] {thinking_budget}\n"
             f"[blue]Gemini Response:[/blue] {gemini_output_file}\n\n"
@@ -404,13 +636,14 @@ def show_gemini_summary(
     )
 
 
-def show_summary(output_file, user_task, file_count):
+def show_summary(output_file, user_task, file_count, token_count):
     """Show final summary of the generated context."""
     console.print(
         Panel.fit(
             "[bold green]📄 Context Summary[/bold green]\n\n"
             f"[blue]Task:[/blue] {user_task[:100]}{'...' if len(user_task) > 100 else ''}\n"
             f"[blue]Files processed:[/blue] {file_count}\n"
+            f"[blue]Estimated tokens:[/blue] {token_count}\n"
             f"[blue]Output file:[/blue] {output_file}\n\n"
             f"[dim]You can now copy the content from {output_file} and paste it into your preferred LLM interface.[/dim]",
             border_style="green",
@@ -1,234 +1,524 @@
 """Context generation module using Python implementation."""
 
-import os
-import fnmatch
+import stat
+from collections import deque
+from functools import partial
 from pathlib import Path
 from rich.console import Console
+from .cache import CachedFile
+from .file_reader import read_text_file, sniff_binary
+from .ignore_rules import compile_ignore_rules
+from .ingest import default_processes, iter_ordered
+from .manifest import ManifestEntry, ScanManifest
+from .outline import outline_header, outline_key, outline_language, outline_text
+from .packing import (
+    DUPLICATE,
+    FULL,
+    OMITTED,
+    SUMMARIZED,
+    TRUNCATED,
+    summary_text,
+    truncate_text,
+)
+from .tokens import estimate_size_tokens, estimate_tokens, token_estimator
 from .tree_generator import TreeGenerator
 
 console = Console()
 
+# Transforms move to worker processes once this much text is selected
+TRANSFORM_PROCESS_MIN_SIZE = 8 * 1024 * 1024
+
 
 class ContextGenerator:
     """Generate project context without external command dependencies."""
 
-    def __init__(self, directory):
+    def __init__(
+        self,
+        directory,
+        jobs=None,
+        cache=None,
+        dedupe=True,
+        transforms=None,
+        outline_size=None,
+        outline_patterns=(),
+    ):
         self.directory = Path(directory)
         self.max_file_size = 1024 * 1024  # 1MB per file limit
         self.max_total_size = 10 * 1024 * 1024  # 10MB total limit
+        self.jobs = jobs  # Parallel file readers (None = default_jobs())
+        self.cache = cache  # Optional ContentCache shared across runs
+        self.dedupe = dedupe  # Emit repeated file contents only once
+        self.transforms = transforms  # Optional TransformPipeline for file text
+        # Files over outline_size bytes (default: max_file_size), or matching
+        # outline_patterns, are emitted as outlines
+        self.outline_size = outline_size
+        self.outline_rules = compile_ignore_rules(outline_patterns)
+        self.max_outline_size = 32 * 1024 * 1024  # Skipped even as outlines
+        self._outlines = {}  # Outline key -> outline, shared by scan and emit
+        self.context_tokens = 0  # Estimated tokens emitted by the last iter_context
+        # With a dict, iter_context keeps the blocks it emits here and reuses
+        # those of files unchanged since the previous call
+        self.block_memo = None
+        self.verbose = True  # Report progress and skipped files while emitting
         self.tree_generator = TreeGenerator(directory)
 
-    def generate_context(
-        self, included_files, ignore_patterns, format_type="claude-xml"
-    ):
-        """Generate context from included files."""
-
-        if format_type == "claude-xml":
-            return self._generate_claude_xml_format(included_files, ignore_patterns)
-        else:
-            return self._generate_default_format(included_files, ignore_patterns)
-
-    def _generate_claude_xml_format(self, included_files, ignore_patterns):
-        """Generate context in Claude XML format."""
-
-        output_lines = []
-        total_size = 0
-        processed_files = 0
-
-        # Start with files directly (no header needed)
-
-        for file_path in included_files:
-            if self._should_ignore_file(file_path, ignore_patterns):
-                continue
-
-            full_path = self.directory / file_path
-
-            if not full_path.is_file():
-                continue
-
-            try:
-                # Check file size
-                file_size = full_path.stat().st_size
-                if file_size > self.max_file_size:
-                    console.print(
-                        f"[yellow]Skipping large file:[/yellow] {file_path} ({file_size} bytes)"
-                    )
-                    continue
-
-                # Check total size limit
-                if total_size + file_size > self.max_total_size:
-                    console.print(
-                        f"[yellow]Reached size limit. Processed {processed_files} files.[/yellow]"
-                    )
-                    break
-
-                # Read file content
-                content = self._read_file_safely(full_path)
-                if content is None:
-                    continue
-
-                # Add to output in Claude XML format
-                output_lines.append(f'<file path="{file_path}">')
-                output_lines.append(content)
-                output_lines.append("</file>")
-                output_lines.append("")
+    def scan(self, included_files, ignore_patterns):
+        """
+        Stat, read and classify every selected file once.
+
+        The returned manifest holds each file's size, mtime, binary flag,
+        encoding and token estimate, and feeds the statistics, tree and
+        context stages. Decoded text goes to the content cache (when one is
+        configured) rather than being kept in memory.
+
+        With ``dedupe`` on, files whose content matches an earlier file are
+        marked as duplicates here, before any size or token limit is applied.
+        """
+        ignore_rules = compile_ignore_rules(ignore_patterns)
+        candidates = (
+            file_path
+            for file_path in included_files
+            if not ignore_rules.matches(file_path)
+        )
+
+        entries = [
+            entry
+            for _, entry in iter_ordered(self._scan_file, candidates, self.jobs)
+            if entry is not None
+        ]
+
+        if self.cache is not None:
+            self.cache.flush()
+
+        manifest = ScanManifest(self.directory, entries)
+        if self.dedupe:
+            manifest.mark_duplicates()
+
+        return manifest
+
+    def _scan_file(self, file_path):
+        """Build the manifest entry for one file. Runs on an ingestion worker thread."""
+
+        full_path = self.directory / file_path
+
+        try:
+            stat_result = full_path.stat()
+        except OSError:
+            return None
+
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+
+        entry = ManifestEntry(file_path, stat_result)
+        wants_outline = self._wants_outline(file_path, stat_result.st_size)
+
+        try:
+            # Large files are skipped, so don't spend a full read on them
+            if stat_result.st_size > self.max_file_size and not wants_outline:
+                entry.is_binary = sniff_binary(full_path)
+                entry.tokens = estimate_size_tokens(stat_result.st_size)
+                return entry
+
+            cached = self._read_file_cached(full_path, stat_result)
+            entry.is_binary = cached.is_binary
+            entry.encoding = cached.encoding
+            entry.content_hash = cached.content_hash
+            entry.tokens = cached.tokens
+
+            if wants_outline and not cached.is_binary:
+                entry.outlined = True
+                entry.tokens = estimate_tokens(
+                    self._outline_content(file_path, cached, stat_result.st_size)
+                )
+
+        except Exception as e:
+            entry.error = e
+
+        return entry
+
+    def _wants_outline(self, file_path, size):
+        """Check if a file should be emitted as an outline."""
+        if size > self.max_outline_size:
+            return False
+
+        threshold = self.outline_size
+        if threshold is None:
+            threshold = self.max_file_size
+
+        return size > threshold or self.outline_rules.matches(file_path)
+
+    def _outline_content(self, file_path, cached, size):
+        """Get the text emitted for an outlined file.
+
+        Outlines are cached by content hash and language, in memory for this
+        run and in the content cache across runs. Files without an outliner
+        are truncated instead.
+        """
+        language = outline_language(file_path)
+        key = outline_key(cached.content_hash, language)
+        outline = self._outlines.get(key)
+
+        if outline is None and self.cache is not None:
+            outline = self.cache.get_outline(key)
+
+        if outline is None:
+            outline = outline_text(file_path, cached.content, cached.tokens)
+            if self.cache is not None:
+                self.cache.put_outline(key, cached.content_hash, outline)
+
+        self._outlines[key] = outline
+        header = outline_header(cached.tokens, size, truncated=language is None)
+        return f"{header}\n{outline}"
+
+    def generate_context(self, manifest, format_type="claude-xml", plan=None):
+        """Generate context from the scanned files."""
+        return "\n".join(self.iter_context(manifest, format_type, plan))
+
+    def iter_context(self, manifest, format_type="claude-xml", plan=None):
+        """Yield the context one file block at a time.
 
-                total_size += file_size
-                processed_files += 1
+        Only a single file's content is held in memory at once, which lets
+        callers stream the context straight to disk. Joining the blocks with
+        a newline gives the same text as ``generate_context``.
 
-                if processed_files % 10 == 0:
-                    console.print(f"[blue]Processed {processed_files} files...[/blue]")
+        Without a ``plan`` files are emitted until ``max_total_size`` is
+        reached. With a PackPlan from ``packing.pack_manifest`` the token
+        budget replaces the byte limit, and files that did not fit are
+        truncated or summarized as the plan says.
 
-            except Exception as e:
-                console.print(f"[red]Error processing {file_path}:[/red] {e}")
-                continue
+        With ``transforms`` set, file text goes through the pipeline before
+        it is truncated and emitted.
 
-        console.print(f"[green]Successfully processed {processed_files} files[/green]")
-        return "\n".join(output_lines)
+        With a ``block_memo``, files whose stat and packing decision match
+        the previous call are not read again; their earlier block is reused.
+        """
 
-    def _generate_default_format(self, included_files, ignore_patterns):
-        """Generate context in default format."""
+        if format_type == "claude-xml":
+            format_block = self._format_claude_xml_block
+            format_duplicate = self._format_claude_xml_duplicate
+        else:
+            format_block = self._format_default_block
+            format_duplicate = self._format_default_duplicate
 
-        output_lines = []
         total_size = 0
         processed_files = 0
-
-        for file_path in included_files:
-            if self._should_ignore_file(file_path, ignore_patterns):
-                continue
-
-            full_path = self.directory / file_path
-
-            if not full_path.is_file():
-                continue
-
-            try:
-                # Check file size
-                file_size = full_path.stat().st_size
-                if file_size > self.max_file_size:
+        duplicate_files = 0
+        self.context_tokens = 0
+
+        # Only files whose content is emitted are loaded, and with a memo
+        # only those that changed
+        memo = self.block_memo
+        memo_keys = {}
+        if memo is not None:
+            memo_keys = {
+                entry.path: self._block_key(entry, format_type, plan)
+                for entry in manifest
+            }
+        to_load = [
+            entry
+            for entry in manifest
+            if self._needs_content(entry, plan)
+            and not (memo and memo_keys[entry.path] in memo)
+        ]
+        load_index = 0
+        new_memo = {}
+
+        # Contents are loaded on worker threads; the size checks below run
+        # here, in manifest order, so the output is identical to a serial run
+        loader = partial(self._load_content, plan=plan)
+        loaded_files = iter_ordered(loader, to_load, self.jobs)
+        if self.transforms:
+            loaded_files = self._iter_transformed(loaded_files, to_load, plan)
+
+        for entry in manifest:
+            file_path = entry.path
+            memo_key = memo_keys.get(file_path)
+            reused = memo.get(memo_key) if memo else None
+
+            # The block, its tokens and the size it counts against the
+            # limit, which is None for references to duplicates
+            if reused is not None:
+                block, block_tokens, file_size = reused
+            else:
+                content = None
+                if load_index < len(to_load) and to_load[load_index] is entry:
+                    _, content = next(loaded_files)
+                    load_index += 1
+
+                if entry.error is not None:
                     console.print(
-                        f"[yellow]Skipping large file:[/yellow] {file_path} ({file_size} bytes)"
+                        f"[red]Error processing {file_path}:[/red] {entry.error}"
                     )
                     continue
 
-                # Check total size limit
-                if total_size + file_size > self.max_total_size:
+                # Duplicates cost a one-line reference, not their size; the
+                # original always comes before them in the manifest
+                if self._is_reference(entry, plan):
+                    block = format_duplicate(file_path, entry.duplicate_of)
+                    block_tokens = estimate_tokens(block)
+                    file_size = None
+                else:
+                    # Check file size; outlines only cost what they emit
+                    file_size = entry.size
+                    if entry.outlined:
+                        file_size = len(content) if content else 0
+                    elif file_size > self.max_file_size:
+                        if self.verbose:
+                            console.print(
+                                f"[yellow]Skipping large file:[/yellow] {file_path} ({file_size} bytes)"
+                            )
+                        continue
+
+            if file_size is None:
+                yield block
+
+                self.context_tokens += block_tokens
+                duplicate_files += 1
+                if memo is not None:
+                    new_memo[memo_key] = (block, block_tokens, None)
+                continue
+
+            # Check total size limit
+            if plan is None and total_size + file_size > self.max_total_size:
+                if self.verbose:
                     console.print(
                         f"[yellow]Reached size limit. Processed {processed_files} files.[/yellow]"
                     )
-                    break
+                break
 
-                # Read file content
-                content = self._read_file_safely(full_path)
+            if reused is None:
                 if content is None:
                     continue
 
-                # Add to output in default format
-                output_lines.append(f"--- {file_path} ---")
-                output_lines.append(content)
-                output_lines.append("")
+                if plan is not None and plan.mode(file_path) == TRUNCATED:
+                    content_tokens = estimate_tokens(content)
+                    if content_tokens > plan.allowance(file_path):
+                        content = truncate_text(
+                            content, content_tokens, plan.allowance(file_path)
+                        )
+
+                block = format_block(file_path, content)
+                block_tokens = estimate_tokens(block)
+
+            yield block
+
+            self.context_tokens += block_tokens
+            total_size += file_size
+            processed_files += 1
+            if memo is not None:
+                new_memo[memo_key] = (block, block_tokens, file_size)
+
+            if self.verbose and processed_files % 10 == 0:
+                console.print(f"[blue]Processed {processed_files} files...[/blue]")
+
+        loaded_files.close()
+        if memo is not None:
+            self.block_memo = new_memo
+
+        if self.cache is not None:
+            self.cache.flush()
+
+        if self.verbose:
+            console.print(
+                f"[green]Successfully processed {processed_files} files[/green]"
+            )
+            if duplicate_files:
+                console.print(
+                    f"[green]Referenced {duplicate_files} duplicate files instead of repeating them[/green]"
+                )
+
+    def _block_key(self, entry, format_type, plan=None):
+        """Identify the block emitted for a file, for ``block_memo``."""
+        stat_result = entry.stat_result
+        decision = None
+        if plan is not None:
+            decision = (plan.mode(entry.path), plan.allowance(entry.path))
+
+        return (
+            format_type,
+            entry.path,
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            stat_result.st_ino,
+            entry.outlined,
+            entry.duplicate_of,
+            decision,
+        )
+
+    def _is_reference(self, entry, plan=None):
+        """Check if a file is emitted as a reference to an identical earlier one."""
+        return entry.duplicate_of is not None and (
+            plan is None or plan.mode(entry.path) == DUPLICATE
+        )
+
+    def _needs_content(self, entry, plan=None):
+        """Check if a file's content is emitted, rather than nothing or a reference."""
+        return (
+            entry.error is None
+            and not self._is_reference(entry, plan)
+            and (entry.size <= self.max_file_size or entry.outlined)
+        )
+
+    def _load_content(self, entry, plan=None):
+        """Get the text emitted for a manifest entry. Runs on an ingestion worker thread."""
+
+        if not self._needs_content(entry, plan):
+            return None
+
+        if plan is not None:
+            mode = plan.mode(entry.path)
+            if mode == OMITTED:
+                return None
+            if mode == SUMMARIZED:
+                return summary_text(entry)
+
+        full_path = self.directory / entry.path
+
+        if entry.is_binary:
+            return self._binary_placeholder(full_path)
+
+        try:
+            cached = self._read_file_cached(
+                full_path, entry.stat_result, entry.encoding
+            )
+        except Exception as e:
+            entry.error = e
+            return None
+
+        if cached.is_binary:
+            return self._binary_placeholder(full_path)
+
+        if entry.outlined:
+            return self._outline_content(entry.path, cached, entry.size)
+
+        return cached.content
+
+    def _iter_transformed(self, loaded_files, manifest, plan=None):
+        """Run the transform pipeline over loaded files, keeping manifest order.
+
+        Small selections are transformed inline. Past
+        ``TRANSFORM_PROCESS_MIN_SIZE`` the regex work moves to a process
+        pool, since it is CPU-bound and would otherwise hold the GIL.
+        """
+        loaded = deque()
+
+        def payloads():
+            for entry, content in loaded_files:
+                loaded.append((entry, content))
+                is_text = not entry.is_binary and (
+                    plan is None or plan.mode(entry.path) in (FULL, TRUNCATED)
+                )
+                yield entry.path, content if is_text else None
+
+        text_size = sum(
+            entry.size
+            for entry in manifest
+            if not entry.is_binary
+            and (entry.size <= self.max_file_size or entry.outlined)
+        )
+        if text_size >= TRANSFORM_PROCESS_MIN_SIZE:
+            jobs = min(self.jobs or default_processes(), default_processes())
+            transformed = iter_ordered(self.transforms, payloads(), jobs, True)
+        else:
+            transformed = iter_ordered(self.transforms, payloads(), 1)
 
-                total_size += file_size
-                processed_files += 1
+        try:
+            for _, result in transformed:
+                entry, content = loaded.popleft()
+                yield entry, content if result is None else result
+        finally:
+            transformed.close()
+            loaded_files.close()
 
-                if processed_files % 10 == 0:
-                    console.print(f"[blue]Processed {processed_files} files...[/blue]")
+    def _read_file_cached(self, full_path, stat_result, encoding=None):
+        """Get a file's decoded view from the content cache, reading it on a miss."""
 
-            except Exception as e:
-                console.print(f"[red]Error processing {file_path}:[/red] {e}")
-                continue
+        if self.cache is not None:
+            cached = self.cache.get(full_path, stat_result)
+            if cached is not None:
+                return cached
 
-        console.print(f"[green]Successfully processed {processed_files} files[/green]")
-        return "\n".join(output_lines)
+        cached = self._read_file_record(full_path, encoding)
 
-    def _should_ignore_file(self, file_path, ignore_patterns):
-        """Check if file should be ignored based on patterns."""
+        if self.cache is not None:
+            self.cache.put(full_path, stat_result, cached)
 
-        for pattern in ignore_patterns:
-            if fnmatch.fnmatch(file_path, pattern) or fnmatch.fnmatch(
-                os.path.basename(file_path), pattern
-            ):
-                return True
+        return cached
 
-            # Check if any parent directory matches pattern
-            parts = Path(file_path).parts
-            for part in parts:
-                if fnmatch.fnmatch(part, pattern):
-                    return True
+    def _binary_placeholder(self, file_path):
+        """Get the text emitted in place of a binary file."""
+        return f"<Binary file: {file_path.suffix} file>"
 
-        return False
+    def _format_claude_xml_block(self, file_path, content):
+        """Format a single file in Claude XML format."""
+        return f'<file path="{file_path}">\n{content}\n</file>\n'
 
-    def _read_file_safely(self, file_path):
-        """Read file content safely with encoding detection."""
+    def _format_default_block(self, file_path, content):
+        """Format a single file in default format."""
+        return f"--- {file_path} ---\n{content}\n"
 
-        # Try different encodings
-        encodings = ["utf-8", "latin-1", "cp1252", "iso-8859-1"]
+    def _format_claude_xml_duplicate(self, file_path, original_path):
+        """Format a reference to an identical file in Claude XML format."""
+        return f'<file path="{file_path}" duplicate-of="{original_path}">\n</file>\n'
 
-        for encoding in encodings:
-            try:
-                with open(file_path, "r", encoding=encoding) as f:
-                    content = f.read()
+    def _format_default_duplicate(self, file_path, original_path):
+        """Format a reference to an identical file in default format."""
+        return f"--- {file_path} (duplicate of {original_path}) ---\n"
 
-                # Check if it's a binary file (contains null bytes)
-                if "\x00" in content:
-                    return f"<Binary file: {file_path.suffix} file>"
+    def _read_file_record(self, file_path, encoding=None):
+        """Read and decode a file into a CachedFile.
 
-                return content
+        ``encoding`` is tried first when given, e.g. the encoding found by an
+        earlier scan. Read errors are raised.
+        """
+        content, encoding, content_hash = read_text_file(file_path, encoding)
 
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                console.print(f"[red]Error reading {file_path}:[/red] {e}")
-                return None
+        if content is None:
+            return self._binary_record()
 
-        # If all encodings fail, treat as binary
-        return f"<Binary file: {file_path.suffix} file>"
+        tokens = token_estimator.estimate(content, content_hash)
+        return CachedFile(content, False, encoding, content_hash, tokens)
+
+    def _binary_record(self):
+        """Get the CachedFile describing a binary file."""
+        return CachedFile(None, True, None, None, 0)
 
-    def get_file_stats(self, included_files, ignore_patterns):
+    def get_file_stats(self, manifest):
         """Get statistics about files to be processed."""
 
         stats = {
             "total_files": 0,
             "total_size": 0,
+            "total_tokens": 0,
             "file_types": {},
             "large_files": [],
             "binary_files": [],
+            "duplicate_files": [],
+            "outlined_files": [],
         }
 
-        for file_path in included_files:
-            if self._should_ignore_file(file_path, ignore_patterns):
-                continue
+        for entry in manifest:
+            file_size = entry.size
+            file_ext = entry.suffix or "no extension"
 
-            full_path = self.directory / file_path
+            stats["total_files"] += 1
+            stats["total_size"] += file_size
+            if entry.duplicate_of is not None:
+                stats["duplicate_files"].append((entry.path, entry.duplicate_of))
+            else:
+                stats["total_tokens"] += entry.tokens
+            stats["file_types"][file_ext] = stats["file_types"].get(file_ext, 0) + 1
 
-            if not full_path.is_file():
-                continue
-
-            try:
-                file_size = full_path.stat().st_size
-                file_ext = full_path.suffix or "no extension"
-
-                stats["total_files"] += 1
-                stats["total_size"] += file_size
-                stats["file_types"][file_ext] = stats["file_types"].get(file_ext, 0) + 1
+            if entry.outlined:
+                stats["outlined_files"].append((entry.path, file_size))
+            elif file_size > self.max_file_size:
+                stats["large_files"].append((entry.path, file_size))
 
-                if file_size > self.max_file_size:
-                    stats["large_files"].append((file_path, file_size))
-
-                # Quick binary check
-                try:
-                    with open(full_path, "rb") as f:
-                        sample = f.read(1024)
-                    if b"\x00" in sample:
-                        stats["binary_files"].append(file_path)
-                except OSError:
-                    pass
-
-            except Exception:
-                continue
+            if entry.is_binary:
+                stats["binary_files"].append(entry.path)
 
         return stats
 
-    def generate_project_tree(self, included_files, ignore_patterns):
+    def generate_project_tree(self, manifest):
         """Generate project tree structure."""
-        return self.tree_generator.generate_tree(included_files, ignore_patterns)
+        return self.tree_generator.generate_tree(manifest.paths())
@@ -0,0 +1,213 @@
+"""Persistent directory listings, revalidated by directory mtime."""
+
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from rich.console import Console
+
+from .cache import get_cache_dir
+from .walker import scan_directory
+
+console = Console()
+
+# Bump when the meaning of stored values changes so stale indexes are ignored
+INDEX_VERSION = 1
+
+# A directory changed this recently may change again within the same mtime
+# tick, unnoticed, so its listing is used but not stored
+RACY_WINDOW_NS = 2 * 10**9
+
+# A stored listing; ``sizes`` is None if the files were not stat'ed
+IndexedListing = namedtuple("IndexedListing", ["mtime_ns", "dirs", "files", "sizes"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path BLOB PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    dirs BLOB NOT NULL,
+    files BLOB NOT NULL,
+    sizes BLOB
+);
+"""
+
+
+def _encode_names(names: List[str]) -> bytes:
+    return "\0".join(names).encode("utf-8", "surrogateescape")
+
+
+def _decode_names(data: bytes) -> List[str]:
+    return data.decode("utf-8", "surrogateescape").split("\0") if data else []
+
+
+def _subtree_range(path: str) -> Tuple[bytes, bytes]:
+    """Bounds of the keys of everything below a directory."""
+    prefix = os.fsencode(os.path.join(path, ""))
+    return prefix, prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+class DirectoryIndex:
+    """
+    Directory listings from earlier runs, kept under the XDG cache directory.
+
+    Adding, removing or renaming an entry updates the mtime of the
+    directory it is in, so a stored listing is reused as long as its
+    directory's mtime is unchanged and only changed directories are
+    listed again. The sizes of files are stored with the listing and are
+    not revalidated: a file edited in place keeps its old size here until
+    something in its directory is added or removed. That only affects
+    size and token estimates, never which files are read.
+
+    ``load`` reads the stored listings below a directory in one query;
+    after that, lookups and new listings are handled in memory, from any
+    thread, and ``flush`` writes the changes in one transaction.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir()
+        self.db_file = self.cache_dir / f"dirs-v{INDEX_VERSION}.db"
+        self._listings: Dict[str, IndexedListing] = {}
+        self._pending_puts: Dict[str, IndexedListing] = {}
+        self._pending_deletes: List[str] = []
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.db_file),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def load(self, directory):
+        """Read the stored listings of a directory and everything below it."""
+        path = os.path.abspath(directory)
+        low, high = _subtree_range(path)
+
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime_ns, dirs, files, sizes FROM dirs "
+                "WHERE path = ? OR (path >= ? AND path < ?)",
+                (os.fsencode(path), low, high),
+            ).fetchall()
+
+        listings = {}
+        for key, mtime_ns, dirs, files, sizes in rows:
+            if sizes is not None:
+                sizes = array("q", sizes).tolist()
+            listings[os.fsdecode(key)] = IndexedListing(
+                mtime_ns, _decode_names(dirs), _decode_names(files), sizes
+            )
+
+        with self._lock:
+            listings.update(self._listings)
+            self._listings = listings
+
+    def scan(
+        self, path: str, mtime_ns: int, stat_files: bool = False
+    ) -> Tuple[List[str], List[str], Optional[List[int]]]:
+        """
+        List a directory, see ``walker.scan_directory``, from the index if
+        its mtime is still ``mtime_ns``.
+
+        The lists returned are shared with the index and must not be
+        modified.
+
+        Raises:
+            OSError: If the directory has changed and cannot be listed
+        """
+        path = os.path.abspath(path)
+        listing = self._listings.get(path)
+        if listing is not None and listing.mtime_ns == mtime_ns:
+            if listing.sizes is not None or not stat_files:
+                return listing.dirs, listing.files, listing.sizes
+
+        dirs, files, sizes = scan_directory(path, stat_files)
+        new_listing = IndexedListing(mtime_ns, dirs, files, sizes)
+
+        with self._lock:
+            self._listings[path] = new_listing
+            if mtime_ns < time.time_ns() - RACY_WINDOW_NS:
+                self._pending_puts[path] = new_listing
+
+            if listing is not None:
+                # Forget what was below subdirectories that are gone
+                gone = set(listing.dirs).difference(dirs)
+                self._pending_deletes.extend(os.path.join(path, name) for name in gone)
+
+        return dirs, files, sizes
+
+    def flush(self):
+        """Write new listings and drop those of removed directories."""
+        with self._lock:
+            puts, self._pending_puts = self._pending_puts, {}
+            deletes, self._pending_deletes = self._pending_deletes, []
+
+        if not puts and not deletes:
+            return
+
+        rows = [
+            (
+                os.fsencode(path),
+                listing.mtime_ns,
+                _encode_names(listing.dirs),
+                _encode_names(listing.files),
+                None if listing.sizes is None else array("q", listing.sizes).tobytes(),
+            )
+            for path, listing in puts.items()
+        ]
+        removed = []
+        for path in deletes:
+            removed.append((os.fsencode(path),) + _subtree_range(path))
+
+        with self._db_lock:
+            conn = self._conn
+            if conn is None:
+                return
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+                    removed,
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", rows
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                console.print(
+                    f"[yellow]Warning:[/yellow] Could not update directory index: {e}"
+                )
+
+    def close(self):
+        """Flush pending writes and close the database."""
+        self.flush()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_directory_index(directory) -> Optional[DirectoryIndex]:
+    """
+    Open the default directory index with the listings below ``directory``
+    loaded, or return None if it is unavailable.
+    """
+    try:
+        index = DirectoryIndex()
+        index.load(directory)
+        return index
+    except (OSError, sqlite3.Error) as e:
+        console.print(f"[yellow]Warning:[/yellow] Directory index disabled: {e}")
+        return None
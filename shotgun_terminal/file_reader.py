@@ -0,0 +1,107 @@
+"""Byte-level file reading with early binary detection."""
+
+import hashlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Bytes inspected before deciding whether a file is binary
+SNIFF_SIZE = 8192
+
+# Encodings tried in order; latin-1 decodes any byte sequence, so it ends the chain
+DECODE_CHAIN = ("utf-8", "latin-1")
+
+# Magic numbers of common binary formats that may not contain NUL bytes early on
+BINARY_SIGNATURES = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",  # JPEG
+    b"GIF87a",
+    b"GIF89a",
+    b"%PDF-",
+    b"PK\x03\x04",  # zip, jar, docx, wheel
+    b"\x1f\x8b",  # gzip
+    b"7z\xbc\xaf\x27\x1c",
+    b"Rar!\x1a\x07",
+    b"\x7fELF",
+    b"\xca\xfe\xba\xbe",  # Java class, Mach-O fat binary
+    b"\xcf\xfa\xed\xfe",  # Mach-O 64-bit
+    b"\x00asm",  # WebAssembly
+    b"SQLite format 3\x00",
+    b"OggS",
+    b"fLaC",
+    b"wOFF",
+    b"wOF2",
+)
+
+
+def is_binary_sample(sample: bytes) -> bool:
+    """Check if the first block of a file looks binary."""
+    return b"\x00" in sample or sample.startswith(BINARY_SIGNATURES)
+
+
+def sniff_binary(file_path: Path) -> bool:
+    """Check if a file looks binary by reading only its first block."""
+    try:
+        with open(file_path, "rb") as f:
+            return is_binary_sample(f.read(SNIFF_SIZE))
+    except OSError:
+        return False
+
+
+def decode_bytes(data: bytes, encoding: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Decode file bytes with the fallback chain.
+
+    Args:
+        data: Raw file contents
+        encoding: Encoding to try first, e.g. one found on an earlier run
+
+    Returns:
+        Tuple of (text, encoding used). Newlines are normalized the same
+        way text-mode ``open`` does it.
+    """
+    encodings = DECODE_CHAIN if not encoding else (encoding,) + DECODE_CHAIN
+
+    for candidate in encodings:
+        try:
+            text = data.decode(candidate)
+        except (UnicodeDecodeError, LookupError):
+            continue
+
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text, candidate
+
+    # Unreachable with latin-1 in the chain, kept for custom chains
+    return data.decode("latin-1"), "latin-1"
+
+
+def read_text_file(
+    file_path: Path, encoding: Optional[str] = None
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Read a file once and decode it in memory.
+
+    The first block is sniffed for NUL bytes and known magic numbers, so
+    binary files are rejected after a single small read.
+
+    Args:
+        file_path: File to read
+        encoding: Encoding to try first
+
+    Returns:
+        Tuple of (text, encoding, content hash); all None for binary files
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+        if is_binary_sample(head):
+            return None, None, None
+        rest = f.read()
+
+    if b"\x00" in rest:
+        return None, None, None
+
+    data = head + rest if rest else head
+    text, encoding = decode_bytes(data, encoding)
+    content_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    return text, encoding, content_hash
@@ -8,16 +8,30 @@ from rich.table import Table
 from rich.prompt import Confirm, Prompt
 import inquirer
 
+from .dir_index import open_directory_index
+from .git_files import list_git_files
+from .ignore_rules import NestedIgnoreRules, compile_ignore_rules
 from .tree_selector import run_hierarchical_selector, run_simple_selector
+from .walker import walk
 
 console = Console()
 
 
+def _is_hidden(relative_path):
+    """Check whether the last component of a relative path is hidden."""
+    return relative_path.rsplit("/", 1)[-1].startswith(".")
+
+
 class FileSelector:
     """Interactive file selector with ignore pattern support."""
 
-    def __init__(self, directory):
+    def __init__(self, directory, token_budget=None, use_git=True, use_cache=True):
         self.directory = Path(directory)
+        self.token_budget = token_budget
+        # Inside a git work tree, list what git lists (honoring .gitignore)
+        self.use_git = use_git
+        # Reuse unchanged directory listings from earlier runs
+        self.use_cache = use_cache
         self.default_ignore_patterns = [
             "*.pyc",
             "__pycache__",
@@ -66,7 +80,9 @@ class FileSelector:
         console.print("[dim]Type 'help' for detailed instructions[/dim]\n")
 
         try:
-            selected_files = run_hierarchical_selector(self.directory)
+            selected_files = run_hierarchical_selector(
+                self.directory, self.token_budget, self.use_git, self.use_cache
+            )
 
             if selected_files:
                 # Convert Path objects to relative strings for compatibility
@@ -120,17 +136,41 @@ class FileSelector:
 
     def _get_all_files(self):
         """Get all files in directory recursively."""
-        files = []
-        for root, dirs, filenames in os.walk(self.directory):
+        git_files = list_git_files(self.directory) if self.use_git else None
+        if git_files is not None:
+            # Hidden files are skipped here too
+            return [
+                path.replace("/", os.sep)
+                for path in git_files.paths
+                if not path.startswith(".") and "/." not in path
+            ]
+
+        # Outside a git work tree, the .gitignore files are applied as git would
+        gitignore = None
+        if self.use_git:
+            gitignore = NestedIgnoreRules(self.directory, [".gitignore"])
+
+        def prune(relative_dir):
             # Skip hidden directories
-            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            if _is_hidden(relative_dir):
+                return True
+            return gitignore is not None and gitignore.should_prune(relative_dir)
 
-            for filename in filenames:
-                if not filename.startswith("."):
-                    file_path = Path(root) / filename
-                    rel_path = file_path.relative_to(self.directory)
-                    files.append(str(rel_path))
+        dir_index = open_directory_index(self.directory) if self.use_cache else None
 
+        files = []
+        for listing in walk(self.directory, prune=prune, index=dir_index):
+            prefix = listing.relative_dir + "/" if listing.relative_dir else ""
+
+            for name in listing.files:
+                if name.startswith("."):
+                    continue
+                if gitignore is not None and gitignore.matches(prefix + name):
+                    continue
+                files.append((prefix + name).replace("/", os.sep))
+
+        if dir_index is not None:
+            dir_index.close()
         return sorted(files)
 
     def _show_file_overview(self, files):
@@ -210,32 +250,7 @@ class FileSelector:
 
     def _apply_ignore_patterns(self, files, ignore_patterns):
         """Apply ignore patterns to file list."""
-        filtered_files = []
-
-        for file in files:
-            should_ignore = False
-
-            for pattern in ignore_patterns:
-                if fnmatch.fnmatch(file, pattern) or fnmatch.fnmatch(
-                    os.path.basename(file), pattern
-                ):
-                    should_ignore = True
-                    break
-
-                # Check if any parent directory matches pattern
-                parts = Path(file).parts
-                for part in parts:
-                    if fnmatch.fnmatch(part, pattern):
-                        should_ignore = True
-                        break
-
-                if should_ignore:
-                    break
-
-            if not should_ignore:
-                filtered_files.append(file)
-
-        return filtered_files
+        return compile_ignore_rules(ignore_patterns).filter(files)
 
     def _manual_file_selection(self, files):
         """Manual file selection interface."""
@@ -0,0 +1,383 @@
+"""Compact array-backed file tree for the interactive selector."""
+
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from .ignore_rules import escape_pattern
+
+# Node flags, one bit each in ``FileTree.flags``
+IS_DIRECTORY = 1
+LOADED = 2  # Children have been listed (always set for files)
+CHECKED = 4
+EXPANDED = 8
+USER_SET = 16  # Checked state chosen by the user, not the ignore rules
+PENDING = 32  # Descendants have yet to take this directory's checked state
+RULE_IGNORED = 64  # Matched by the ignore patterns when last classified
+
+ROOT = 0
+NO_NODE = -1
+
+# Names shared by many files (__init__.py, index.js, README.md) turn up early
+# in a walk, so the first names seen are stored once and reused; later ones
+# go straight into the pool, which keeps the lookup table's size bounded
+MAX_INTERNED_NAMES = 1024
+
+# Files below a node and how many of them are selected; a file counts itself
+NodeTotals = namedtuple(
+    "NodeTotals", ["files", "size", "selected_files", "selected_size"]
+)
+
+
+class FileTree:
+    """
+    A file tree stored in flat arrays indexed by node id.
+
+    A ``FileNode`` object with its own ``Path`` and child list costs several
+    hundred bytes per file; here a node is one slot in each of a handful of
+    typed arrays. Names are kept as UTF-8 in one shared pool, common ones
+    only once, the structure is kept as parent / first-child / next-sibling
+    links and the flags of a node are the bits of a single byte. Node
+    ``ROOT`` is the tree's root directory, and paths are rebuilt from the
+    parent links when needed.
+
+    Every node also carries the totals of the files below it, which are
+    kept up to date by walking up the parent links, so a toggle costs
+    O(depth) however large the tree is. Checking a directory doesn't touch
+    its descendants: the directory is marked ``PENDING`` and its state is
+    pushed down one level at a time, only where a path through it is used.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.name_pool = bytearray()
+        self._interned: Dict[str, Tuple[int, int]] = {}
+
+        self.name_start = array("I")
+        self.name_length = array("H")
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.flags = bytearray()
+
+        # Totals of the files below each node (the file itself for files)
+        self.file_count = array("I")
+        self.total_size = array("q")
+        self.selected_count = array("I")
+        self.selected_size = array("q")
+
+        self._append(NO_NODE, "", IS_DIRECTORY | CHECKED, 0)
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    def _store_name(self, name: str) -> Tuple[int, int]:
+        """Get the pool position of a name, adding it to the pool if needed."""
+        position = self._interned.get(name)
+        if position is None:
+            # Undecodable bytes in file names survive as surrogates
+            encoded = name.encode("utf-8", "surrogateescape")
+            position = (len(self.name_pool), len(encoded))
+            self.name_pool += encoded
+            if len(self._interned) < MAX_INTERNED_NAMES:
+                self._interned[name] = position
+        return position
+
+    def _append(self, parent: int, name: str, flags: int, size: int) -> int:
+        """Append an unlinked node and return its id."""
+        start, length = self._store_name(name)
+        self.name_start.append(start)
+        self.name_length.append(length)
+        self.parent.append(parent)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+
+        is_file = not flags & IS_DIRECTORY
+        selected = is_file and flags & CHECKED
+        self.flags.append(flags | LOADED if is_file else flags)
+        self.file_count.append(1 if is_file else 0)
+        self.total_size.append(size if is_file else 0)
+        self.selected_count.append(1 if selected else 0)
+        self.selected_size.append(size if selected else 0)
+        return len(self.flags) - 1
+
+    def _add_totals(
+        self, node: int, files: int, size: int, selected_files: int, selected_size: int
+    ):
+        """Add to the totals of a node and every directory above it."""
+        while node != NO_NODE:
+            self.file_count[node] += files
+            self.total_size[node] += size
+            self.selected_count[node] += selected_files
+            self.selected_size[node] += selected_size
+            node = self.parent[node]
+
+    def add_children(
+        self, parent: int, children: Iterable[Tuple[str, int, int]]
+    ) -> List[int]:
+        """
+        Add children after any existing children of ``parent``.
+
+        Children that are directories start with empty totals; see
+        ``set_totals`` for filling them in before they are loaded.
+
+        Args:
+            parent: Node id of the directory
+            children: ``(name, flags, size)`` for each child, in display order
+
+        Returns:
+            The new node ids
+        """
+        last = NO_NODE
+        child = self.first_child[parent]
+        while child != NO_NODE:
+            last = child
+            child = self.next_sibling[child]
+
+        added = []
+        for name, flags, size in children:
+            node = self._append(parent, name, flags, size)
+            if last == NO_NODE:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[last] = node
+            last = node
+            added.append(node)
+
+        self._add_totals(
+            parent,
+            sum(self.file_count[node] for node in added),
+            sum(self.total_size[node] for node in added),
+            sum(self.selected_count[node] for node in added),
+            sum(self.selected_size[node] for node in added),
+        )
+        return added
+
+    def name(self, node: int) -> str:
+        """Get the file or directory name of a node."""
+        start = self.name_start[node]
+        return self.name_pool[start : start + self.name_length[node]].decode(
+            "utf-8", "surrogateescape"
+        )
+
+    def has_flag(self, node: int, flag: int) -> bool:
+        """Check whether a node has a flag set."""
+        return bool(self.flags[node] & flag)
+
+    def set_flag(self, node: int, flag: int, value: bool = True):
+        """Set or clear a flag on a node."""
+        if value:
+            self.flags[node] |= flag
+        else:
+            self.flags[node] &= ~flag & 0xFF
+
+    def is_directory(self, node: int) -> bool:
+        """Check whether a node is a directory."""
+        return bool(self.flags[node] & IS_DIRECTORY)
+
+    def _pending_ancestor(self, node: int) -> int:
+        """Get the topmost ancestor whose state is still to be pushed down."""
+        pending = NO_NODE
+        node = self.parent[node]
+        while node != NO_NODE:
+            if self.flags[node] & PENDING:
+                pending = node
+            node = self.parent[node]
+        return pending
+
+    def _effective_flags(self, node: int) -> int:
+        """Get the flags of a node with pending states above it applied."""
+        flags = self.flags[node]
+        pending = self._pending_ancestor(node)
+        if pending != NO_NODE:
+            flags = (flags & ~CHECKED & 0xFF) | (self.flags[pending] & CHECKED)
+            flags |= USER_SET
+        return flags
+
+    def is_checked(self, node: int) -> bool:
+        """Check whether a node is selected."""
+        return bool(self._effective_flags(node) & CHECKED)
+
+    def is_user_set(self, node: int) -> bool:
+        """Check whether the user chose a node's state (itself or above it)."""
+        return bool(self._effective_flags(node) & USER_SET)
+
+    def totals(self, node: int) -> NodeTotals:
+        """Get the totals of the files below a node."""
+        files = self.file_count[node]
+        size = self.total_size[node]
+
+        pending = self._pending_ancestor(node)
+        if pending == NO_NODE:
+            return NodeTotals(
+                files, size, self.selected_count[node], self.selected_size[node]
+            )
+        if self.flags[pending] & CHECKED:
+            return NodeTotals(files, size, files, size)
+        return NodeTotals(files, size, 0, 0)
+
+    def _apply_state(self, node: int, state: int):
+        """Give a node the checked bit ``state``, without updating ancestors."""
+        flags = self.flags[node]
+        flags = (flags & ~CHECKED & 0xFF) | state | USER_SET
+        if flags & IS_DIRECTORY:
+            flags |= PENDING
+        self.flags[node] = flags
+
+        if state:
+            self.selected_count[node] = self.file_count[node]
+            self.selected_size[node] = self.total_size[node]
+        else:
+            self.selected_count[node] = 0
+            self.selected_size[node] = 0
+
+    def _push_down(self, node: int):
+        """Hand a pending directory's state on to its children."""
+        state = self.flags[node] & CHECKED
+        for child in self.children(node):
+            self._apply_state(child, state)
+        self.flags[node] &= ~PENDING & 0xFF
+
+    def resolve(self, node: int):
+        """Push pending states down to ``node``, making its own state exact."""
+        path = []
+        ancestor = self.parent[node]
+        while ancestor != NO_NODE:
+            path.append(ancestor)
+            ancestor = self.parent[ancestor]
+
+        for ancestor in reversed(path):
+            if self.flags[ancestor] & PENDING:
+                self._push_down(ancestor)
+
+    def set_totals(
+        self, node: int, files: int, size: int, selected_files: int, selected_size: int
+    ):
+        """
+        Set the totals of a directory whose children are not loaded.
+
+        ``selected_files`` and ``selected_size`` are what the ignore rules
+        select; they are ignored if the user has chosen the state of the
+        directory, in which case either all or none of it is selected.
+        """
+        self.resolve(node)
+        flags = self.flags[node]
+        if flags & USER_SET:
+            selected_files = files if flags & CHECKED else 0
+            selected_size = size if flags & CHECKED else 0
+
+        deltas = (
+            files - self.file_count[node],
+            size - self.total_size[node],
+            selected_files - self.selected_count[node],
+            selected_size - self.selected_size[node],
+        )
+        if any(deltas):
+            self._add_totals(node, *deltas)
+
+    def set_rule_state(self, node: int, checked: bool):
+        """Set the state the ignore rules give a node, unless the user chose one."""
+        self.resolve(node)
+        flags = self.flags[node]
+        if flags & USER_SET or bool(flags & CHECKED) == checked:
+            return
+
+        self.flags[node] = flags ^ CHECKED
+        if not flags & IS_DIRECTORY:
+            # A directory's totals come from what is below it
+            sign = 1 if checked else -1
+            self._add_totals(node, 0, 0, sign, sign * self.total_size[node])
+
+    def children(self, node: int) -> Iterator[int]:
+        """Iterate over the children of a node in order."""
+        child = self.first_child[node]
+        while child != NO_NODE:
+            yield child
+            child = self.next_sibling[child]
+
+    def relative_path(self, node: int) -> str:
+        """Get the ``/``-separated path of a node relative to the root."""
+        parts = []
+        while node > ROOT:
+            parts.append(self.name(node))
+            node = self.parent[node]
+        return "/".join(reversed(parts))
+
+    def path(self, node: int) -> Path:
+        """Get the full path of a node."""
+        relative_path = self.relative_path(node)
+        return self.root / relative_path if relative_path else self.root
+
+    def iter_subtree(self, node: int = ROOT) -> Iterator[int]:
+        """
+        Iterate over a node and everything below it, depth first.
+
+        Pending states are pushed down on the way, so the flags of every
+        node are exact when it is reached.
+        """
+        self.resolve(node)
+        yield node
+        stack = [node]
+        while stack:
+            directory = stack.pop()
+            if self.flags[directory] & PENDING:
+                self._push_down(directory)
+
+            child = self.first_child[directory]
+            while child != NO_NODE:
+                yield child
+                if self.flags[child] & IS_DIRECTORY:
+                    stack.append(child)
+                child = self.next_sibling[child]
+
+    def iter_files(self, node: int = ROOT) -> Iterator[int]:
+        """Iterate over the file nodes (not directories) below a node."""
+        flags = self.flags
+        return (n for n in self.iter_subtree(node) if not flags[n] & IS_DIRECTORY)
+
+    def iter_selected(self, node: int = ROOT) -> Iterator[int]:
+        """Iterate over the selected file nodes below a node."""
+        flags = self.flags
+        return (
+            n
+            for n in self.iter_subtree(node)
+            if flags[n] & (IS_DIRECTORY | CHECKED) == CHECKED
+        )
+
+    def set_checked(self, node: int, checked: bool):
+        """Check or uncheck a node and everything below it, in O(depth)."""
+        self.resolve(node)
+        selected_files = self.selected_count[node]
+        selected_size = self.selected_size[node]
+
+        self._apply_state(node, CHECKED if checked else 0)
+        self._add_totals(
+            self.parent[node],
+            0,
+            0,
+            self.selected_count[node] - selected_files,
+            self.selected_size[node] - selected_size,
+        )
+
+    def unchecked_patterns(self) -> Set[str]:
+        """Get ignore patterns for unchecked items, topmost ones only."""
+        patterns = set()
+        stack = [ROOT]
+        while stack:
+            directory = stack.pop()
+            if self.flags[directory] & PENDING:
+                self._push_down(directory)
+
+            for child in self.children(directory):
+                flags = self.flags[child]
+                if not flags & CHECKED:
+                    patterns.add(
+                        escape_pattern(
+                            self.relative_path(child), bool(flags & IS_DIRECTORY)
+                        )
+                    )
+                elif flags & IS_DIRECTORY:
+                    # Check children only if this node is checked
+                    stack.append(child)
+        return patterns
@@ -0,0 +1,184 @@
+"""File lists from git, which leave out everything ``.gitignore`` excludes."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# Bytes read from git at a time while its output is parsed
+READ_SIZE = 1024 * 1024
+
+
+def _ls_files(directory, options: List[str]) -> Iterator[List[str]]:
+    """
+    Stream the NUL-separated records of ``git ls-files`` run in a directory,
+    decoded like file names, a chunk of them at a time. The first chunk is
+    empty and comes as soon as git has been started.
+
+    Raises:
+        OSError: If git cannot be run
+        subprocess.CalledProcessError: If git fails
+    """
+    command = ["git", "ls-files", "-z"] + options
+    process = subprocess.Popen(
+        command,
+        cwd=str(directory),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+    encoding = sys.getfilesystemencoding()
+    errors = sys.getfilesystemencodeerrors()
+    pending = b""
+    finished = False
+    try:
+        yield []
+        while True:
+            chunk = process.stdout.read(READ_SIZE)
+            if not chunk:
+                finished = True
+                break
+
+            # Decoded a chunk at a time, up to the last complete record
+            data = pending + chunk
+            end = data.rfind(b"\0") + 1
+            pending = data[end:]
+            records = data[:end].decode(encoding, errors).split("\0")
+            records.pop()
+            yield records
+    finally:
+        process.stdout.close()
+        if not finished:
+            # Closed early: the rest of the listing isn't wanted, and git
+            # fails on the closed pipe anyway
+            process.kill()
+        process.wait()
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+
+def _iter_nested(directory: Path, relative_dir: str) -> Iterator[str]:
+    """
+    List the files of a repository nested in another one, from its own git,
+    prefixed with ``relative_dir``.
+
+    Submodules that are not checked out and nested repositories git can't
+    list are left out.
+    """
+    nested = os.path.join(str(directory), relative_dir)
+    if not os.path.exists(os.path.join(nested, ".git")):
+        return
+
+    try:
+        paths = list(iter_git_files(Path(nested)))
+    except (OSError, subprocess.CalledProcessError):
+        return
+
+    for path in paths:
+        yield f"{relative_dir}/{path}"
+
+
+def iter_git_files(directory: Path) -> Iterator[str]:
+    """
+    Stream the files git sees below a directory.
+
+    That is tracked files plus untracked ones that are not ignored (by
+    ``.gitignore`` files, ``.git/info/exclude`` and the global excludes
+    file), relative to ``directory`` with ``/`` separators. Tracked files
+    deleted from the work tree are listed too. Submodules and untracked
+    repositories nested inside are listed by their own git, so their
+    files are included as git sees them there.
+
+    Tracked files come first, then untracked ones, each sorted.
+
+    Raises:
+        OSError: If git cannot be run
+        subprocess.CalledProcessError: If git fails, for instance because
+            the directory is not inside a git work tree
+    """
+    # Both listings are started at once; the untracked files take git
+    # longer to find than the index takes to read
+    cached = _ls_files(directory, ["--cached", "--stage"])
+    others = _ls_files(directory, ["--others", "--exclude-standard"])
+    try:
+        next(cached)
+        next(others)
+
+        previous = None
+        offset = None
+        for records in cached:
+            if records and offset is None:
+                # Records are "<mode> <object> <stage>\t<path>", and all but
+                # the path have the same length in every one
+                offset = records[0].index("\t") + 1
+
+            # Submodules, whose files the index above them doesn't list
+            submodules = {
+                record[offset:] for record in records if record.startswith("160000 ")
+            }
+
+            for name in [record[offset:] for record in records]:
+                # Files with merge conflicts are listed once per stage
+                if name == previous:
+                    continue
+                previous = name
+
+                if submodules and name in submodules:
+                    yield from _iter_nested(directory, name)
+                else:
+                    yield name
+
+        for records in others:
+            for record in records:
+                if record.endswith("/"):
+                    # An untracked repository, listed as a directory
+                    yield from _iter_nested(directory, record[:-1])
+                else:
+                    yield record
+    finally:
+        try:
+            cached.close()
+        finally:
+            others.close()
+
+
+class GitFileList:
+    """
+    The files git sees below a directory, sorted, with the directories
+    that hold them (``""`` being the directory itself).
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = sorted(paths)
+        self.files = frozenset(self.paths)
+
+        dirs = {""}
+        for path in self.paths:
+            parent = path.rpartition("/")[0]
+            while parent not in dirs:
+                dirs.add(parent)
+                parent = parent.rpartition("/")[0]
+        self.dirs = frozenset(dirs)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+
+def list_git_files(directory: Path) -> Optional[GitFileList]:
+    """
+    List the files git sees below a directory.
+
+    Returns None if the directory is not inside a git work tree, git is
+    not installed, or git lists no files (as in an ignored directory), so
+    callers can fall back to walking the directory.
+    """
+    try:
+        paths = list(iter_git_files(directory))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    if not paths:
+        return None
+    return GitFileList(paths)
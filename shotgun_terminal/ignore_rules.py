@@ -0,0 +1,609 @@
+"""Compiled ignore-pattern matching shared by all file selectors."""
+
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import PurePath
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple, Union
+
+GLOB_CHARS = frozenset("*?[")
+
+# Characters with a meaning in .gitignore patterns
+GITIGNORE_SPECIAL_CHARS = frozenset("*?[\\")
+
+# Whether paths compare case-insensitively here (as on Windows)
+CASE_INSENSITIVE = os.path.normcase("A") == "a"
+
+# One line of an ignore file: ``regex`` matches the whole path the pattern
+# applies to, ``literal`` is the unescaped text when it has no wildcards and
+# ``suffix`` the text after the star of a ``*.ext`` pattern
+GitIgnorePattern = namedtuple(
+    "GitIgnorePattern",
+    ["negated", "dir_only", "anchored", "regex", "literal", "suffix"],
+)
+
+
+def _normalize(path: str) -> str:
+    """Normalize a path or pattern for matching (case and separators)."""
+    path = os.path.normcase(path)
+    if os.sep != "/":
+        path = path.replace(os.sep, "/")
+    return path
+
+
+def _glob_to_regex(pattern: str, single_component: bool = False) -> str:
+    """
+    Translate a glob into an unanchored regex with ``fnmatch`` semantics.
+
+    With ``single_component``, wildcards don't match ``/``.
+    """
+    any_char = "[^/]" if single_component else "."
+    i, n = 0, len(pattern)
+    parts = []
+
+    while i < n:
+        c = pattern[i]
+        i += 1
+
+        if c == "*":
+            # Collapse runs of stars, they match the same thing
+            while i < n and pattern[i] == "*":
+                i += 1
+            parts.append(any_char + "*")
+        elif c == "?":
+            parts.append(any_char)
+        elif c == "[":
+            j = i
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 1
+
+            if j >= n:
+                # No closing bracket, treat literally
+                parts.append("\\[")
+            else:
+                stuff = pattern[i:j].replace("\\", "\\\\")
+                i = j + 1
+                if stuff.startswith("!"):
+                    stuff = "^" + stuff[1:]
+                elif stuff.startswith("^"):
+                    stuff = "\\" + stuff
+                parts.append(f"[{stuff}]")
+        else:
+            parts.append(re.escape(c))
+
+    return "".join(parts)
+
+
+class IgnoreRuleSet:
+    """
+    A set of ignore patterns compiled once for fast matching.
+
+    A relative path is ignored when any of its components (or the whole
+    path) matches a pattern without a ``/``, or when it lies under a
+    pattern containing a ``/`` (such as ``docs/build/`` or ``src/*.py``).
+
+    Patterns are split by kind so most checks avoid regex work entirely:
+    literal names go into a hash set, ``*.ext`` patterns into a suffix
+    table, and all remaining globs into two combined regexes.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = frozenset(p for p in patterns if p and p.strip())
+
+        names = set()
+        suffixes = set()
+        name_globs = []
+        path_globs = []
+
+        for pattern in self.patterns:
+            pattern = _normalize(pattern.strip())
+
+            if "/" in pattern.rstrip("/"):
+                path_globs.append(pattern)
+            elif pattern.endswith("/"):
+                # "dir/" ignores the directory wherever it appears
+                self._add_name(pattern.rstrip("/"), names, suffixes, name_globs)
+            else:
+                self._add_name(pattern, names, suffixes, name_globs)
+
+        self._names = frozenset(names)
+        self._suffixes = tuple(sorted(suffixes))
+        self._name_regex = None
+        self._path_regex = None
+
+        if name_globs:
+            self._name_regex = re.compile(
+                "(?s:%s)\\Z" % "|".join(_glob_to_regex(g) for g in name_globs)
+            ).match
+
+        if path_globs:
+            alternatives = []
+            for pattern in path_globs:
+                # Whole-path match, as fnmatch would do it
+                alternatives.append(_glob_to_regex(pattern))
+                # Component-wise prefix match: everything under the pattern
+                components = [c for c in pattern.split("/") if c]
+                alternatives.append(
+                    "/".join(_glob_to_regex(c, True) for c in components) + "(?:/.*)?"
+                )
+            self._path_regex = re.compile(
+                "(?s:%s)\\Z" % "|".join(f"(?:{a})" for a in alternatives)
+            ).match
+
+    @staticmethod
+    def _add_name(pattern: str, names: set, suffixes: set, name_globs: list):
+        """Sort a single-component pattern into the fastest matching bucket."""
+        if not GLOB_CHARS.intersection(pattern):
+            names.add(pattern)
+        elif pattern.startswith("*.") and not GLOB_CHARS.intersection(pattern[1:]):
+            suffixes.add(pattern[1:])
+        else:
+            name_globs.append(pattern)
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def matches(
+        self, relative_path: Union[str, PurePath], is_dir: bool = False
+    ) -> bool:
+        """
+        Check if a project-relative path is ignored.
+
+        ``is_dir`` is accepted for a common interface with
+        ``NestedIgnoreRules``; these patterns match files and directories
+        alike.
+        """
+        path = _normalize(str(relative_path))
+        if not path or path == ".":
+            return False
+
+        parts = path.split("/")
+
+        if self._names and not self._names.isdisjoint(parts):
+            return True
+
+        if self._suffixes:
+            for part in parts:
+                if part.endswith(self._suffixes):
+                    return True
+
+        if self._name_regex is not None:
+            if self._name_regex(path):
+                return True
+            for part in parts:
+                if self._name_regex(part):
+                    return True
+
+        if self._path_regex is not None and self._path_regex(path):
+            return True
+
+        return False
+
+    def should_prune(self, relative_dir: Union[str, PurePath]) -> bool:
+        """Check if a directory and everything below it can be skipped."""
+        # An ignored directory is dropped together with its contents
+        return self.matches(relative_dir)
+
+    def filter(self, relative_paths: Iterable[str]) -> List[str]:
+        """Return the paths that are not ignored, preserving order."""
+        return [p for p in relative_paths if not self.matches(p)]
+
+
+@lru_cache(maxsize=32)
+def _compile_frozen(patterns: FrozenSet[str]) -> IgnoreRuleSet:
+    return IgnoreRuleSet(patterns)
+
+
+def compile_ignore_rules(patterns: Iterable[str]) -> IgnoreRuleSet:
+    """Get a compiled rule set for ``patterns``, reusing earlier compilations."""
+    if isinstance(patterns, IgnoreRuleSet):
+        return patterns
+    return _compile_frozen(frozenset(patterns))
+
+
+def _gitignore_glob_to_regex(pattern: str) -> str:
+    """
+    Translate the body of a ``.gitignore`` pattern into an anchored regex.
+
+    Wildcards don't match ``/``, except ``**`` as a whole component:
+    ``**/`` matches any number of directories and a final ``/**``
+    everything inside. A backslash makes the next character literal.
+    """
+    i, n = 0, len(pattern)
+    parts = []
+
+    while i < n:
+        c = pattern[i]
+
+        if c == "*":
+            j = i
+            while j < n and pattern[j] == "*":
+                j += 1
+            whole_component = (i == 0 or pattern[i - 1] == "/") and (
+                j == n or pattern[j] == "/"
+            )
+            if j - i >= 2 and whole_component:
+                if j == n:
+                    parts.append(".*")
+                else:
+                    parts.append("(?:.*/)?")
+                    j += 1  # The slash is part of "**/"
+            else:
+                parts.append("[^/]*")
+            i = j
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = i + 1
+            negated = j < n and pattern[j] in "!^"
+            if negated:
+                j += 1
+
+            items = []
+            while j < n and (pattern[j] != "]" or not items):
+                char = pattern[j]
+                if char == "\\" and j + 1 < n:
+                    j += 1
+                    items.append(re.escape(pattern[j]))
+                elif char == "-" and items and j + 1 < n and pattern[j + 1] != "]":
+                    items.append("-")
+                elif char != "/":
+                    items.append(re.escape(char))
+                j += 1
+
+            if j >= n:
+                # No closing bracket, treat literally
+                parts.append("\\[")
+                i += 1
+            else:
+                body = "".join(items)
+                parts.append(f"[^/{body}]" if negated else f"[{body}]")
+                i = j + 1
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+
+    return "".join(parts)
+
+
+def _compile_alternatives(alternatives: List[str]):
+    """Combine regexes into one ``match`` function, or None without any."""
+    if not alternatives:
+        return None
+    flags = re.IGNORECASE if CASE_INSENSITIVE else 0
+    return re.compile("|".join(alternatives), flags).match
+
+
+class GitIgnoreRules:
+    """
+    The patterns of one ignore file, with ``.gitignore`` semantics.
+
+    A pattern without a ``/`` (other than a trailing one) matches a name
+    at any depth below the file's directory; one with a leading or inner
+    ``/`` matches paths relative to that directory. A trailing ``/``
+    matches directories only, ``!`` re-includes what an earlier pattern
+    ignored, and the last matching pattern decides.
+
+    Files without ``!`` patterns, like those the selector writes, are
+    matched by kind as ``IgnoreRuleSet`` does: literal names and paths in
+    hash sets, the rest in combined regexes. Otherwise every pattern goes
+    into one regex, latest first, and the first alternative that matches
+    tells whether the path is ignored.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        patterns = []
+        for line in lines:
+            parsed = self._parse(line)
+            if parsed is not None:
+                patterns.append(parsed)
+        self.patterns = patterns
+
+        self._ordered = any(pattern.negated for pattern in patterns)
+        if self._ordered:
+            self._compile_ordered(patterns)
+        else:
+            self._compile_by_kind(patterns)
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    @staticmethod
+    def _parse(line: str) -> Optional[GitIgnorePattern]:
+        """Parse a line of an ignore file, unless it is blank or a comment."""
+        line = line.rstrip("\r\n")
+
+        # Trailing spaces are dropped unless escaped with a backslash
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+
+        if not line or line.startswith("#"):
+            return None
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+
+        dir_only = line.endswith("/")
+        if dir_only:
+            line = line[:-1]
+
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            return None
+
+        regex = _gitignore_glob_to_regex(line)
+        try:
+            re.compile(regex)
+        except re.error:
+            return None  # Such as a bracket range running backwards
+
+        literal = suffix = None
+        if line[:1] == "*" and line[1:] and not anchored:
+            if not GITIGNORE_SPECIAL_CHARS.intersection(line[1:]):
+                suffix = line[1:]
+        if not GLOB_CHARS.intersection(re.sub(r"\\.", "", line)):
+            literal = re.sub(r"\\(.)", r"\1", line)
+        return GitIgnorePattern(negated, dir_only, anchored, regex, literal, suffix)
+
+    def _compile_ordered(self, patterns):
+        file_alternatives, dir_alternatives = [], []
+        # Whether the pattern behind each group re-includes, by group number
+        self._file_negated = [False]
+        self._dir_negated = [False]
+
+        for pattern in reversed(patterns):
+            regex = pattern.regex
+            if not pattern.anchored:
+                regex = "(?:.*/)?" + regex
+            alternative = f"({regex}\\Z)"
+
+            dir_alternatives.append(alternative)
+            self._dir_negated.append(pattern.negated)
+            if not pattern.dir_only:
+                file_alternatives.append(alternative)
+                self._file_negated.append(pattern.negated)
+
+        self._file_regex = _compile_alternatives(file_alternatives)
+        self._dir_regex = _compile_alternatives(dir_alternatives)
+
+    def _compile_by_kind(self, patterns):
+        # Index 0 holds the patterns for everything, 1 those for directories
+        names = (set(), set())
+        paths = (set(), set())
+        suffixes = (set(), set())
+        name_globs = ([], [])
+        path_globs = ([], [])
+
+        for pattern in patterns:
+            kind = 1 if pattern.dir_only else 0
+            if pattern.suffix is not None:
+                text = pattern.suffix.lower() if CASE_INSENSITIVE else pattern.suffix
+                suffixes[kind].add(text)
+            elif pattern.literal is not None:
+                text = pattern.literal.lower() if CASE_INSENSITIVE else pattern.literal
+                (paths if pattern.anchored else names)[kind].add(text)
+            else:
+                globs = path_globs if pattern.anchored else name_globs
+                globs[kind].append(f"(?:{pattern.regex})\\Z")
+
+        self._names = names
+        self._paths = paths
+        self._suffixes = tuple(tuple(sorted(texts)) for texts in suffixes)
+        self._name_regexes = tuple(_compile_alternatives(globs) for globs in name_globs)
+        self._path_regexes = tuple(_compile_alternatives(globs) for globs in path_globs)
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        Decide on a path relative to the file's directory.
+
+        Returns True if ignored, False if re-included by a ``!`` pattern
+        and None if no pattern matches.
+        """
+        if self._ordered:
+            if is_dir:
+                match = self._dir_regex and self._dir_regex(path)
+                return None if not match else not self._dir_negated[match.lastindex]
+            match = self._file_regex and self._file_regex(path)
+            return None if not match else not self._file_negated[match.lastindex]
+
+        name = path.rpartition("/")[2]
+        key, name_key = path, name
+        if CASE_INSENSITIVE:
+            key, name_key = path.lower(), name.lower()
+
+        for kind in (0, 1) if is_dir else (0,):
+            if name_key in self._names[kind] or key in self._paths[kind]:
+                return True
+            if self._suffixes[kind] and name_key.endswith(self._suffixes[kind]):
+                return True
+            name_regex = self._name_regexes[kind]
+            if name_regex is not None and name_regex(name):
+                return True
+            path_regex = self._path_regexes[kind]
+            if path_regex is not None and path_regex(path):
+                return True
+        return None
+
+
+def escape_pattern(relative_path: str, is_dir: bool = False) -> str:
+    """Write a ``.gitignore`` pattern matching exactly one project-relative path."""
+    escaped = "".join(
+        "\\" + c if c in GITIGNORE_SPECIAL_CHARS else c for c in relative_path
+    )
+    if escaped.endswith(" "):
+        escaped = escaped[:-1] + "\\ "
+    return "/" + escaped + ("/" if is_dir else "")
+
+
+# Ignore files in effect in a directory, innermost first, each with the
+# relative path of the directory it is in
+RuleChain = Tuple[Tuple[str, GitIgnoreRules], ...]
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Get the (mtime, size) of a file, or None if it is missing."""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+class NestedIgnoreRules:
+    """
+    Ignore files at every level of a project, applied the way git does.
+
+    The patterns in a file apply below its directory and take precedence
+    over those of files further up (and of ``base_rules``); when several
+    file names are given, later ones take precedence in the same
+    directory. A path inside an ignored directory is ignored whatever the
+    patterns for the path itself say, so an ignored directory can be
+    pruned without listing it.
+
+    Each directory's ignore files are read the first time a path in it is
+    checked, and the decision for each directory is cached, so checking
+    the files of a walk costs one ``GitIgnoreRules.match`` per rule file
+    in effect. ``changed()`` tells whether any of the files looked for
+    has been edited, created or deleted since.
+    """
+
+    def __init__(
+        self,
+        root,
+        filenames: Sequence[str],
+        base_rules: Sequence[GitIgnoreRules] = (),
+    ):
+        self.root = os.fspath(root)
+        self.filenames = tuple(filenames)
+        self._base_chain: RuleChain = tuple(
+            ("", rules) for rules in reversed(base_rules)
+        )
+        self._chains: Dict[str, RuleChain] = {}
+        self._ignored_dirs: Dict[str, bool] = {"": False}
+        # (mtime, size) of each ignore file looked for, None if it was missing
+        self._stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def __bool__(self) -> bool:
+        return True
+
+    def _read(self, relative_dir: str) -> List[GitIgnoreRules]:
+        """Read the ignore files in a directory, those present and readable."""
+        found = []
+        directory = os.path.join(self.root, relative_dir)
+        for filename in self.filenames:
+            path = os.path.join(directory, filename)
+            # Stamped before reading, so an edit during the read shows up
+            self._stamps[path] = _file_stamp(path)
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    rules = GitIgnoreRules(f.read().splitlines())
+            except OSError:
+                continue
+            if rules:
+                found.append(rules)
+        return found
+
+    def changed(self) -> bool:
+        """Check whether any ignore file looked for so far has changed."""
+        # A copy, as a walk on another thread may be reading more files
+        for path, stamp in list(self._stamps.items()):
+            if _file_stamp(path) != stamp:
+                return True
+        return False
+
+    def _chain(self, relative_dir: str) -> RuleChain:
+        chain = self._chains.get(relative_dir)
+        if chain is None:
+            if relative_dir:
+                parent_chain = self._chain(relative_dir.rpartition("/")[0])
+            else:
+                parent_chain = self._base_chain
+
+            own = self._read(relative_dir)
+            chain = (
+                tuple((relative_dir, rules) for rules in reversed(own)) + parent_chain
+            )
+            self._chains[relative_dir] = chain
+        return chain
+
+    def _decide(self, path: str, is_dir: bool, parent: str) -> bool:
+        for base, rules in self._chain(parent):
+            verdict = rules.match(path[len(base) + 1 :] if base else path, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def _dir_ignored(self, relative_dir: str) -> bool:
+        ignored = self._ignored_dirs.get(relative_dir)
+        if ignored is None:
+            parent = relative_dir.rpartition("/")[0]
+            ignored = self._dir_ignored(parent) or self._decide(
+                relative_dir, True, parent
+            )
+            self._ignored_dirs[relative_dir] = ignored
+        return ignored
+
+    def matches(
+        self, relative_path: Union[str, PurePath], is_dir: bool = False
+    ) -> bool:
+        """Check if a project-relative path is ignored."""
+        path = relative_path if isinstance(relative_path, str) else str(relative_path)
+        if os.sep != "/":
+            path = path.replace(os.sep, "/")
+        if not path or path == ".":
+            return False
+
+        if is_dir:
+            return self._dir_ignored(path)
+
+        parent = path.rpartition("/")[0]
+        if self._dir_ignored(parent):
+            return True
+        # Most directories have no ignore files in effect at all
+        return bool(self._chains.get(parent, True)) and self._decide(
+            path, False, parent
+        )
+
+    def should_prune(self, relative_dir: Union[str, PurePath]) -> bool:
+        """Check if a directory and everything below it can be skipped."""
+        return self.matches(relative_dir, is_dir=True)
+
+
+class RuleUnion:
+    """Several rule sets acting as one: a path is ignored if any of them ignores it."""
+
+    def __init__(self, *rule_sets):
+        self.rule_sets = rule_sets
+
+    def __bool__(self) -> bool:
+        return any(self.rule_sets)
+
+    def matches(
+        self, relative_path: Union[str, PurePath], is_dir: bool = False
+    ) -> bool:
+        """Check if a project-relative path is ignored."""
+        for rules in self.rule_sets:
+            if rules.matches(relative_path, is_dir):
+                return True
+        return False
+
+    def should_prune(self, relative_dir: Union[str, PurePath]) -> bool:
+        """Check if a directory and everything below it can be skipped."""
+        return any(rules.should_prune(relative_dir) for rules in self.rule_sets)
+
+
+# Anything answering ``matches`` and ``should_prune`` for relative paths
+PathRules = Union[IgnoreRuleSet, NestedIgnoreRules, RuleUnion]
@@ -0,0 +1,84 @@
+"""Parallel file ingestion with deterministic, ordered results."""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def default_jobs() -> int:
+    """Get the default number of ingestion workers.
+
+    File reads are I/O-bound, so this follows the thread pool default of
+    ``cpu_count + 4`` capped at 32.
+    """
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def default_processes() -> int:
+    """Get the default number of worker processes for CPU-bound stages."""
+    return os.cpu_count() or 1
+
+
+def iter_ordered(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    jobs: Optional[int] = None,
+    processes: bool = False,
+) -> Iterator[Tuple[T, R]]:
+    """
+    Apply ``func`` to every item on a bounded thread or process pool.
+
+    Results are yielded as ``(item, result)`` pairs in input order. At most
+    ``2 * jobs`` items are in flight at once, so memory stays bounded no
+    matter how many items there are. Closing the iterator early cancels
+    work that has not started yet.
+
+    Args:
+        func: Function to run for each item
+        items: Items to process
+        jobs: Number of workers (default: ``default_jobs()``, or
+            ``default_processes()`` with ``processes``)
+        processes: Use worker processes instead of threads, for CPU-bound
+            work. ``func`` and the items must then be picklable.
+
+    Yields:
+        Tuples of (item, result) in the same order as ``items``
+    """
+    jobs = jobs or (default_processes() if processes else default_jobs())
+
+    if jobs <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    window = jobs * 2
+    pending = deque()
+    if processes:
+        # Callers feed this from other pools, and forking a process that
+        # runs threads can deadlock, so workers are always spawned
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=jobs)
+
+    try:
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+
+            if len(pending) >= window:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+
+        while pending:
+            done_item, future = pending.popleft()
+            yield done_item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
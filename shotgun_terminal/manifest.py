@@ -0,0 +1,103 @@
+"""In-memory manifest of the files selected for a context run."""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# Files smaller than this are always emitted in full; a reference would
+# not be much shorter than the content itself
+MIN_DUPLICATE_SIZE = 64
+
+
+class ManifestEntry:
+    """Metadata gathered for one file during the scan."""
+
+    __slots__ = (
+        "path",
+        "stat_result",
+        "is_binary",
+        "encoding",
+        "content_hash",
+        "tokens",
+        "duplicate_of",
+        "outlined",
+        "error",
+    )
+
+    def __init__(self, path: str, stat_result: os.stat_result):
+        self.path = path  # Project-relative path as given in the selection
+        self.stat_result = stat_result
+        self.is_binary = False
+        self.encoding: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.tokens = 0
+        self.duplicate_of: Optional[str] = None  # Path of an identical earlier file
+        self.outlined = False  # Emitted as an outline instead of in full
+        self.error: Optional[Exception] = None
+
+    @property
+    def size(self) -> int:
+        return self.stat_result.st_size
+
+    @property
+    def mtime_ns(self) -> int:
+        return self.stat_result.st_mtime_ns
+
+    @property
+    def suffix(self) -> str:
+        return Path(self.path).suffix
+
+
+class ScanManifest:
+    """
+    Ordered list of ManifestEntry objects produced by a single scan.
+
+    The statistics, project tree and context stages all read from the
+    manifest instead of going back to the filesystem, so each file is
+    stat-ed and classified exactly once per run.
+    """
+
+    def __init__(self, directory: Path, entries: List[ManifestEntry]):
+        self.directory = Path(directory)
+        self.entries = entries
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def paths(self) -> List[str]:
+        """Get the relative paths of all scanned files, in selection order."""
+        return [entry.path for entry in self.entries]
+
+    def mark_duplicates(self) -> int:
+        """
+        Point files with the same content as an earlier file at that file.
+
+        The first file in selection order keeps its content; later copies
+        get ``duplicate_of`` set to its path. Binary, unread and very small
+        files are left alone.
+
+        Returns:
+            Number of files marked as duplicates
+        """
+        first_seen: Dict[str, str] = {}
+        duplicates = 0
+
+        for entry in self.entries:
+            entry.duplicate_of = None
+
+            if (
+                entry.content_hash is None
+                or entry.error is not None
+                or entry.size < MIN_DUPLICATE_SIZE
+            ):
+                continue
+
+            original = first_seen.setdefault(entry.content_hash, entry.path)
+            if original != entry.path:
+                entry.duplicate_of = original
+                duplicates += 1
+
+        return duplicates
@@ -0,0 +1,213 @@
+"""Outlines of large source files: signatures and docstrings only."""
+
+import ast
+import re
+from pathlib import PurePath
+from typing import Dict, List, Optional
+
+from .tokens import estimate_tokens
+from .transforms import language_for, strip_comments
+
+# Bump when the outline format changes so cached outlines are rebuilt
+OUTLINE_VERSION = 1
+
+# Outlines are cut to this share of the full file's tokens
+MAX_OUTLINE_RATIO = 0.1
+
+# ... but are always allowed at least this many tokens
+MIN_OUTLINE_TOKENS = 256
+
+PYTHON_SUFFIXES = frozenset((".py", ".pyi", ".pyw"))
+
+# Languages outlines are built for, by suffix, named after the comment and
+# string syntax the generic outliner strips. Data, docs and markup have no
+# declarations to keep, so files in them are cut short instead
+OUTLINE_LANGUAGES: Dict[str, str] = {
+    **dict.fromkeys(PYTHON_SUFFIXES, "python"),
+    **dict.fromkeys(
+        (".c", ".h", ".cc", ".cpp", ".cxx", ".hh", ".hpp", ".hxx", ".m", ".mm"),
+        "c-like",
+    ),
+    **dict.fromkeys(
+        (".java", ".kt", ".kts", ".scala", ".cs", ".swift", ".dart", ".php"), "c-like"
+    ),
+    **dict.fromkeys((".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"), "js-like"),
+    ".rs": "rust",
+    ".go": "go",
+    **dict.fromkeys((".sh", ".bash", ".zsh", ".rb", ".pl", ".pm", ".r"), "hash"),
+    ".sql": "sql",
+    ".lua": "lua",
+}
+
+# Declarations in C-family, JavaScript/TypeScript, Rust, Go, Ruby, PHP and
+# similar languages, optionally preceded by modifiers
+_DECLARATION = re.compile(
+    r"^[ \t]*(?:(?:export|default|public|private|protected|internal|static|final|"
+    r"abstract|async|virtual|override|sealed|partial|extern|inline|unsafe|"
+    r"pub(?:\([^)]*\))?|declare|readonly|open|data)[ \t]+)*"
+    r"(?:class|interface|struct|union|enum|trait|impl|type|typedef|fn|func|"
+    r"function|def|module|namespace|object|protocol|extension|package|import|"
+    r"use|mod|#include|#define|template)\b"
+)
+
+# Function and method signatures without a declaration keyword: a return
+# type before the name ("static int main(void)", prototypes ending in ";"),
+# or a body opening on the same line ("render(props) {")
+_SIGNATURE = re.compile(
+    r"^(?=([ \t]*))\1"  # Indentation, never given back to the lookahead below
+    r"(?!(?:if|for|foreach|while|switch|return|else|catch|do|case|new|throw|"
+    r"delete|sizeof|await|yield)\b)"
+    r"(?:(?:[\w$<>\[\],\*&:~]+[ \t]+\**)+[\w$~:]+[ \t]*\([^;{}]*[{;]?"
+    r"|[\w$~:]+[ \t]*\([^;{}]*\)[^;{}]*\{)[ \t]*$"
+)
+
+
+def outline_language(path: str) -> Optional[str]:
+    """Get the language a file is outlined as, or None if it has no outliner."""
+    return OUTLINE_LANGUAGES.get(PurePath(path).suffix.lower())
+
+
+def outline_key(content_hash: str, language: Optional[str]) -> str:
+    """
+    Cache key of the outline for a file's content, which depends on the
+    language it is outlined as too.
+    """
+    return f"{OUTLINE_VERSION}:{language or 'text'}:{content_hash}"
+
+
+def outline_header(full_tokens: int, size: int, truncated: bool = False) -> str:
+    """First line of an emitted outline, saying what was left out."""
+    if truncated:
+        return f"<Truncated: ~{full_tokens} tokens, {size} bytes in full>"
+    return f"<Outline only: ~{full_tokens} tokens, {size} bytes in full>"
+
+
+def _docstring_summary(node) -> Optional[str]:
+    """First line of a node's docstring, if it has one."""
+    docstring = ast.get_docstring(node)
+    if not docstring:
+        return None
+    return docstring.strip().split("\n", 1)[0].replace('"""', '\\"\\"\\"')
+
+
+def _header_lines(node, lines: List[str]) -> List[str]:
+    """Source lines of a def or class statement, decorators included."""
+    first = min([d.lineno for d in node.decorator_list] + [node.lineno])
+    body_start = node.body[0].lineno
+    if body_start <= node.lineno:
+        # One-liner such as "def f(): pass"
+        return lines[first - 1 : node.lineno]
+
+    header = lines[first - 1 : body_start - 1]
+    # Drop comments and blank lines between the signature and the body
+    while len(header) > 1 and header[-1].strip()[:1] in ("", "#"):
+        header.pop()
+    return header
+
+
+def _outline_python_body(body, lines: List[str], out: List[str], indent: str):
+    """Append the outline of a module or class body."""
+    for node in body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and not indent:
+            out.extend(lines[node.lineno - 1 : node.end_lineno])
+
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            # Constants, fields and type aliases, abbreviated when long
+            first = lines[node.lineno - 1]
+            if node.end_lineno == node.lineno and len(first) <= 120:
+                out.append(first)
+            else:
+                target = first.split("=", 1)[0].rstrip()
+                out.append(f"{target} = ...")
+
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            out.extend(_header_lines(node, lines))
+
+            inner = indent + "    "
+            summary = _docstring_summary(node)
+            if summary:
+                out.append(f'{inner}"""{summary}"""')
+
+            if isinstance(node, ast.ClassDef):
+                before = len(out)
+                _outline_python_body(node.body, lines, out, inner)
+                if len(out) == before and not summary:
+                    out.append(f"{inner}...")
+            elif node.body[0].lineno > node.lineno:
+                out.append(f"{inner}...")
+
+
+def outline_python(text: str) -> Optional[str]:
+    """Outline Python source with ``ast``; None if it does not parse."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+    out = []
+    summary = _docstring_summary(tree)
+    if summary:
+        out.append(f'"""{summary}"""')
+
+    _outline_python_body(tree.body, text.splitlines(), out, "")
+    return "\n".join(out)
+
+
+def outline_generic(path: str, text: str) -> str:
+    """Outline source in other languages by keeping declaration lines."""
+    # Comments would otherwise be full of prose that reads like declarations
+    text = strip_comments(text, language_for(path))
+
+    out = []
+    for line in text.splitlines():
+        if len(line) <= 240 and (_DECLARATION.match(line) or _SIGNATURE.match(line)):
+            out.append(line.rstrip().rstrip("{").rstrip())
+    return "\n".join(out)
+
+
+def _cap(outline: str, max_tokens: int, what: str = "Outline") -> str:
+    """Cut an outline down to ``max_tokens`` at a line boundary."""
+    tokens = estimate_tokens(outline)
+    if tokens <= max_tokens:
+        return outline
+
+    cut = int(len(outline) * max_tokens / tokens)
+    newline = outline.rfind("\n", 0, cut)
+    if newline > 0:
+        cut = newline
+    return f"{outline[:cut]}\n<{what} cut short at ~{max_tokens} tokens>"
+
+
+def outline_text(path: str, text: str, full_tokens: Optional[int] = None) -> str:
+    """
+    Build the outline of a source file.
+
+    Python gets class and function signatures with docstring summaries,
+    plus imports and module-level assignments. Other source files (and
+    Python that doesn't parse) keep only lines that look like
+    declarations. Files with no outliner (see ``outline_language``) keep
+    their beginning instead.
+
+    Args:
+        path: File path, used to pick the outliner
+        text: Full file text
+        full_tokens: Token estimate of the full text, if already known
+
+    Returns:
+        Outline text, capped at ``MAX_OUTLINE_RATIO`` of the full tokens
+    """
+    if full_tokens is None:
+        full_tokens = estimate_tokens(text)
+    max_tokens = max(int(full_tokens * MAX_OUTLINE_RATIO), MIN_OUTLINE_TOKENS)
+
+    language = outline_language(path)
+    if language is None:
+        return _cap(text, max_tokens, "File")
+
+    outline = None
+    if language == "python":
+        outline = outline_python(text)
+    if outline is None:
+        outline = outline_generic(path, text)
+
+    return _cap(outline, max_tokens)
@@ -0,0 +1,228 @@
+"""Token-budget packing of scanned files."""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .ignore_rules import IgnoreRuleSet
+from .manifest import ManifestEntry, ScanManifest
+from .tokens import estimate_tokens
+
+PACK_ORDERS = ("smallest", "relevance", "ranking")
+
+# Packing decisions
+FULL = "full"
+TRUNCATED = "truncated"
+SUMMARIZED = "summarized"
+OMITTED = "omitted"
+DUPLICATE = "duplicate"
+
+# Don't bother truncating a file to less than this many tokens
+MIN_TRUNCATED_TOKENS = 256
+
+# Tokens charged for a binary file placeholder
+BINARY_PLACEHOLDER_TOKENS = 8
+
+STOPWORDS = frozenset(
+    "the and for with that this from into when what where which should would "
+    "could are was were has have not but all any add use using make file files "
+    "code need want please".split()
+)
+
+
+def block_overhead(path: str) -> int:
+    """Tokens used by the markup around a file block."""
+    return estimate_tokens(f'<file path="{path}">\n\n</file>\n\n')
+
+
+def duplicate_overhead(path: str, original_path: str) -> int:
+    """Tokens used by a reference to an identical file."""
+    return estimate_tokens(
+        f'<file path="{path}" duplicate-of="{original_path}">\n</file>\n\n'
+    )
+
+
+def summary_text(entry: ManifestEntry) -> str:
+    """Text emitted in place of a file that did not fit the budget."""
+    return f"<Omitted to fit token budget: ~{entry.tokens} tokens, {entry.size} bytes>"
+
+
+def truncate_text(content: str, full_tokens: int, allowance: int) -> str:
+    """Cut content down to roughly ``allowance`` tokens at a line boundary."""
+    marker = f"<Truncated to fit token budget: showing ~{allowance} of ~{full_tokens} tokens>"
+    chars_per_token = len(content) / max(full_tokens, 1)
+    cut = int((allowance - estimate_tokens(marker)) * chars_per_token)
+
+    newline = content.rfind("\n", 0, cut)
+    if newline > 0:
+        cut = newline
+
+    return f"{content[:cut]}\n{marker}"
+
+
+class PackPlan:
+    """Per-file packing decisions for one token budget."""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.decisions: Dict[str, Tuple[str, int]] = {}
+        self.planned_tokens = 0
+
+    def decide(self, path: str, mode: str, tokens: int = 0):
+        """Record how a file is emitted and how many tokens it may use."""
+        self.decisions[path] = (mode, tokens)
+
+    def mode(self, path: str) -> str:
+        return self.decisions.get(path, (OMITTED, 0))[0]
+
+    def allowance(self, path: str) -> int:
+        return self.decisions.get(path, (OMITTED, 0))[1]
+
+    def count(self, mode: str) -> int:
+        return sum(1 for m, _ in self.decisions.values() if m == mode)
+
+
+def _task_keywords(task: str) -> List[str]:
+    """Extract lowercase keywords from the task description."""
+    words = re.findall(r"[a-z0-9_]{3,}", task.lower())
+    return [w for w in dict.fromkeys(words) if w not in STOPWORDS]
+
+
+def _read_ranking(rank_file: str) -> List[IgnoreRuleSet]:
+    """Read a ranking file: one path or glob per line, highest priority first."""
+    rules = []
+    with open(rank_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                rules.append(IgnoreRuleSet([line]))
+    return rules
+
+
+def prioritize(
+    entries: Iterable[ManifestEntry],
+    order: str = "smallest",
+    task: str = "",
+    rank_file: Optional[str] = None,
+) -> List[ManifestEntry]:
+    """Sort entries by packing priority, highest first."""
+    entries = list(entries)
+
+    if order == "relevance":
+        keywords = _task_keywords(task)
+
+        def score(entry):
+            path = entry.path.lower()
+            return -sum(1 for keyword in keywords if keyword in path)
+
+    elif order == "ranking":
+        rules = _read_ranking(rank_file) if rank_file else []
+
+        def score(entry):
+            for rank, rule in enumerate(rules):
+                if rule.matches(entry.path):
+                    return rank
+            return len(rules)
+
+    else:
+
+        def score(entry):
+            return 0
+
+    # Ties fall back to smallest first, then path for determinism
+    return sorted(entries, key=lambda e: (score(e), e.tokens, e.path))
+
+
+def pack_manifest(
+    manifest: ScanManifest,
+    budget: int,
+    max_file_size: int,
+    order: str = "smallest",
+    task: str = "",
+    rank_file: Optional[str] = None,
+) -> PackPlan:
+    """
+    Decide which files fit in a token budget.
+
+    Files are taken in priority order and included in full while they fit.
+    The rest are truncated while there is room for a useful prefix, and
+    otherwise replaced by a one-line summary. Every file's summary is
+    reserved up front and handed back once the file is included, so
+    neither full files nor truncation crowd summaries out; only when the
+    budget can't even hold the summaries are files omitted.
+
+    Duplicates found by ``ScanManifest.mark_duplicates`` are decided after
+    the originals. A duplicate only becomes a short reference when its
+    original is included in full; otherwise it is packed like any other
+    file, so a reference never stands for content missing from the context.
+
+    Args:
+        manifest: Scanned files
+        budget: Tokens available for file blocks
+        max_file_size: Files larger than this are skipped unless outlined
+        order: One of PACK_ORDERS
+        task: User task, used by the relevance order
+        rank_file: Ranking file, used by the ranking order
+
+    Returns:
+        PackPlan with a decision for every packable file
+    """
+    plan = PackPlan(budget)
+    candidates = [
+        entry
+        for entry in manifest
+        if entry.error is None and (entry.size <= max_file_size or entry.outlined)
+    ]
+    ranked = prioritize(candidates, order, task, rank_file)
+
+    summary_costs = {
+        entry.path: block_overhead(entry.path) + estimate_tokens(summary_text(entry))
+        for entry in candidates
+    }
+    remaining = budget
+    reserved = sum(summary_costs.values())
+
+    # Originals first, then the duplicates, which can only be references
+    # once their original's fate is known
+    for duplicates in (False, True):
+        for entry in ranked:
+            if (entry.duplicate_of is not None) != duplicates:
+                continue
+
+            if duplicates and plan.mode(entry.duplicate_of) == FULL:
+                mode, allowance = DUPLICATE, 0
+                cost = duplicate_overhead(entry.path, entry.duplicate_of)
+            else:
+                mode = FULL
+                allowance = (
+                    BINARY_PLACEHOLDER_TOKENS if entry.is_binary else entry.tokens
+                )
+                cost = block_overhead(entry.path) + allowance
+
+            summary_cost = summary_costs[entry.path]
+            if cost <= remaining - reserved + summary_cost:
+                plan.decide(entry.path, mode, allowance)
+                remaining -= cost
+                reserved -= summary_cost
+
+    deferred = [entry for entry in ranked if entry.path not in plan.decisions]
+    spare = remaining - reserved
+
+    for entry in deferred:
+        summary_cost = summary_costs[entry.path]
+        overhead = block_overhead(entry.path)
+
+        # Upgrade the summary to a truncated copy while there is room
+        allowance = spare + summary_cost - overhead
+        if not entry.is_binary and allowance >= MIN_TRUNCATED_TOKENS:
+            allowance = min(allowance, entry.tokens)
+            plan.decide(entry.path, TRUNCATED, allowance)
+            spare -= allowance + overhead - summary_cost
+            remaining -= allowance + overhead
+        elif summary_cost <= remaining:
+            plan.decide(entry.path, SUMMARIZED, summary_cost - overhead)
+            remaining -= summary_cost
+        else:
+            plan.decide(entry.path, OMITTED)
+
+    plan.planned_tokens = budget - remaining
+    return plan
@@ -0,0 +1,172 @@
+"""Indexed fuzzy search over the relative paths of a project."""
+
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional
+
+# Paths are searched a block at a time; blocks missing a character of the
+# query are skipped, and a search can pause between any two blocks
+BLOCK_SIZE = 512
+
+# Longest query that is compiled into a pattern
+MAX_QUERY_LENGTH = 100
+
+# A query that extends the previous one only re-checks the previous matches,
+# if there are at most this many of them
+MAX_NARROWED_MATCHES = 4000
+
+
+@lru_cache(maxsize=64)
+def fuzzy_pattern(query: str) -> re.Pattern:
+    """
+    Compile a regex finding lines that contain ``query`` as a subsequence.
+
+    Indexed lines look like ``"\\n<path>\\t<id>"`` and the pattern captures
+    the id. Matching starts at the literal newline, so there is one attempt
+    per line, and the gap before each character of the query is atomic
+    (a lookahead capture, which is never backtracked into), so a line is
+    read once whether it matches or not.
+    """
+    parts = []
+    for group, char in enumerate(query, 1):
+        literal = re.escape(char)
+        # The backreference is grouped so a digit after it isn't read as
+        # part of the group number
+        parts.append(f"(?=([^\\n\\t{literal}]*))(?:\\{group}){literal}")
+    return re.compile("\\n" + "".join(parts) + "[^\\n\\t]*\\t(\\d+)")
+
+
+class SearchIndex:
+    """
+    Relative paths in the order they were found, ready for fuzzy search.
+
+    Paths are added from the scanning thread while searches run; the
+    lowercased text of every ``BLOCK_SIZE`` paths is joined into one block
+    together with the set of characters it contains.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.blocks: List[str] = []
+        self.block_chars: List[FrozenSet[str]] = []
+        self.complete = False
+        self._tail: List[str] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _line(path: str, path_id: int) -> str:
+        """Searchable form of a path, as expected by ``fuzzy_pattern``."""
+        text = path.lower().replace("\t", " ").replace("\n", " ")
+        return f"\n{text}\t{path_id}"
+
+    def _seal(self, lines: List[str]):
+        text = "".join(lines) + "\n"
+        self.block_chars.append(frozenset(text))
+        self.blocks.append(text)
+
+    def add(self, paths: Iterable[str]):
+        """Add paths to the index."""
+        with self._lock:
+            for path in paths:
+                self._tail.append(self._line(path, len(self.paths)))
+                self.paths.append(path)
+
+                if len(self._tail) >= BLOCK_SIZE:
+                    self._seal(self._tail)
+                    self._tail = []
+
+    def finish(self):
+        """Mark the index complete, making the last partial block searchable."""
+        with self._lock:
+            if self._tail:
+                self._seal(self._tail)
+                self._tail = []
+            self.complete = True
+
+    def search(
+        self, query: str, previous: Optional["SearchResults"] = None
+    ) -> "SearchResults":
+        """Start a search, reusing ``previous`` if ``query`` extends it."""
+        return SearchResults(self, query[:MAX_QUERY_LENGTH].lower(), previous)
+
+
+class SearchResults:
+    """
+    Ids of the paths matching a query, found lazily.
+
+    Matches are found in index order as they are asked for, so a keystroke
+    only pays for the rows on screen plus a bounded amount of scanning.
+    """
+
+    def __init__(
+        self,
+        index: SearchIndex,
+        query: str,
+        previous: Optional["SearchResults"] = None,
+    ):
+        self.index = index
+        self.query = query
+        self.matches: List[int] = []
+        self.next_block = 0
+
+        if not query:
+            self.next_block = None
+            return
+
+        self._pattern = fuzzy_pattern(query)
+        self._chars = frozenset(query)
+
+        if (
+            previous is not None
+            and previous.index is index
+            and previous.query
+            and query.startswith(previous.query)
+            and len(previous.matches) <= MAX_NARROWED_MATCHES
+        ):
+            # Everything that matches now matched before: re-check only
+            # those, then carry on scanning where the previous search was
+            candidates = "".join(
+                index._line(index.paths[i], i) for i in previous.matches
+            )
+            self.matches = [
+                int(m[-1]) for m in self._pattern.findall(candidates + "\n")
+            ]
+            self.next_block = previous.next_block
+
+    @property
+    def done(self) -> bool:
+        """Whether every match has been found."""
+        if self.next_block is None:
+            return True
+        return self.index.complete and self.next_block >= len(self.index.blocks)
+
+    def advance(self, until: Optional[int] = None, deadline: Optional[float] = None):
+        """
+        Scan further blocks of the index.
+
+        Args:
+            until: Stop once this many matches have been found
+            deadline: Stop at this ``time.perf_counter()`` value
+        """
+        if self.next_block is None:
+            return
+
+        blocks = self.index.blocks
+        block_chars = self.index.block_chars
+        while self.next_block < len(blocks):
+            if until is not None and len(self.matches) >= until:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+
+            if self._chars <= block_chars[self.next_block]:
+                found = self._pattern.findall(blocks[self.next_block])
+                self.matches.extend(int(m[-1]) for m in found)
+            self.next_block += 1
+
+    def complete(self) -> List[int]:
+        """Find all remaining matches (of the paths indexed so far)."""
+        self.advance()
+        return self.matches
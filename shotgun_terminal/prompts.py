@@ -1,6 +1,7 @@
 """Prompt templates for different use cases with placeholder support."""
 
 from datetime import datetime
+from typing import Iterable, Iterator, TextIO, Tuple
 
 # Git diff output format constraints for dev mode
 OUTPUT_FORMAT_CONSTRAINTS_DEV = """## 4. Output Format & Constraints (MANDATORY & STRICT)
@@ -322,6 +323,7 @@ The `File Structure` (provided in the next section) is formatted as follows:
     </file>
     The `path` attribute contains the project-root-relative path, using forward slashes (`/`).
     File content is the raw text of the file. Each file block is separated by a newline.
+    A block with a `duplicate-of` attribute has the same content as the file it names and is left empty.
 
 ---
 
@@ -391,6 +393,7 @@ The `File Structure` (provided in the next section, if applicable) is formatted
     </file>
     The `path` attribute contains the project-root-relative path, using forward slashes (`/`).
     File content is the raw text of the file. Each file block is separated by a newline.
+    A block with a `duplicate-of` attribute has the same content as the file it names and is left empty.
     *(This section may be omitted if no file structure is relevant to the task).*
 
 ---
@@ -466,6 +469,7 @@ The `File Structure` (provided in the next section, if applicable) is formatted
     </file>
     The `path` attribute contains the project-root-relative path, using forward slashes (`/`).
     File content is the raw text of the file. Each file block is separated by a newline.
+    A block with a `duplicate-of` attribute has the same content as the file it names and is left empty.
     *(This section may be omitted if no file structure is relevant to the task).*
 
 ---
@@ -485,6 +489,37 @@ def process_template(
     project_tree: str = "",
 ) -> str:
     """Process template with placeholder replacement."""
+    head, tail = _render_template_parts(template_type, task, rules, project_tree)
+    return head + file_structure.strip() + tail
+
+
+def write_template(
+    output: TextIO,
+    template_type: str,
+    task: str,
+    rules: str,
+    file_blocks: Iterable[str],
+    project_tree: str = "",
+):
+    """Stream a processed template to ``output``.
+
+    The text before and after ``{FILE_STRUCTURE}`` is written around the file
+    blocks as they are produced, so the full context never has to be held in
+    memory. Blocks are separated by a newline and the result is stripped the
+    same way ``process_template`` strips ``file_structure``.
+    """
+    head, tail = _render_template_parts(template_type, task, rules, project_tree)
+
+    output.write(head)
+    for chunk in _strip_chunks(_join_blocks(file_blocks)):
+        output.write(chunk)
+    output.write(tail)
+
+
+def _render_template_parts(
+    template_type: str, task: str, rules: str, project_tree: str
+) -> Tuple[str, str]:
+    """Render the template and split it around the file structure placeholder."""
     template = PROMPT_TEMPLATES.get(template_type, PROMPT_TEMPLATES["dev"])
 
     # Select appropriate output format constraints based on template type
@@ -497,18 +532,52 @@ def process_template(
 
     # Process user rules section
     rules_section = _format_user_rules(rules.strip(), template_type)
-
-    # Replace placeholders
-    processed = template.replace("{TASK}", task.strip())
-    processed = processed.replace("{RULES}", rules_section)
-    processed = processed.replace("{FILE_STRUCTURE}", file_structure.strip())
-    processed = processed.replace("{PROJECT_TREE}", project_tree.strip())
-    processed = processed.replace("{OUTPUT_FORMAT_CONSTRAINTS}", output_constraints)
-    processed = processed.replace(
-        "{CURRENT_DATE}", datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    )
-
-    return processed
+    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def fill(text: str) -> str:
+        # Replace placeholders
+        text = text.replace("{TASK}", task.strip())
+        text = text.replace("{RULES}", rules_section)
+        text = text.replace("{PROJECT_TREE}", project_tree.strip())
+        text = text.replace("{OUTPUT_FORMAT_CONSTRAINTS}", output_constraints)
+        text = text.replace("{CURRENT_DATE}", current_date)
+        return text
+
+    # File contents are spliced in afterwards so placeholders that happen to
+    # appear inside project files are left untouched.
+    head, _, tail = template.partition("{FILE_STRUCTURE}")
+    return fill(head), fill(tail)
+
+
+def _join_blocks(blocks: Iterable[str]) -> Iterator[str]:
+    """Yield blocks separated by a single newline."""
+    first = True
+    for block in blocks:
+        if not first:
+            yield "\n"
+        first = False
+        yield block
+
+
+def _strip_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """Yield chunks with leading and trailing whitespace of the whole stream removed."""
+    started = False
+    pending = ""
+
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+
+        stripped = chunk.rstrip()
+        if stripped:
+            # Whitespace held back from earlier chunks turned out to be interior
+            yield pending + stripped
+            pending = chunk[len(stripped) :]
+        else:
+            pending += chunk
 
 
 def _format_user_rules(rules: str, template_type: str) -> str:
@@ -0,0 +1,241 @@
+"""Token-reducing content transforms applied before files are emitted."""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import PurePath
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Comment syntax of a language; ``strings`` are literal regexes that are
+# skipped over so comment markers inside them are left alone
+CommentSyntax = namedtuple("CommentSyntax", ["line", "block", "strings"])
+
+_DOUBLE_QUOTED = r'"(?:\\.|[^"\\\n])*"'
+_SINGLE_QUOTED = r"'(?:\\.|[^'\\\n])*'"
+_BACKTICK = r"`(?:\\.|[^`\\])*`"
+_TRIPLE_QUOTED = r'"""[\s\S]*?"""' + "|" + r"'''[\s\S]*?'''"
+_QUOTES = frozenset("\"'`")
+
+_C_LIKE = CommentSyntax(("//",), (("/*", "*/"),), (_DOUBLE_QUOTED, _SINGLE_QUOTED))
+_JS_LIKE = CommentSyntax(
+    ("//",), (("/*", "*/"),), (_DOUBLE_QUOTED, _SINGLE_QUOTED, _BACKTICK)
+)
+# Single quotes are lifetimes in Rust, not strings
+_RUST = CommentSyntax(("//",), (("/*", "*/"),), (_DOUBLE_QUOTED,))
+_GO = CommentSyntax(("//",), (("/*", "*/"),), (_DOUBLE_QUOTED, _BACKTICK))
+_PYTHON = CommentSyntax(("#",), (), (_TRIPLE_QUOTED, _DOUBLE_QUOTED, _SINGLE_QUOTED))
+_HASH = CommentSyntax(("#",), (), (_DOUBLE_QUOTED, _SINGLE_QUOTED))
+_CSS = CommentSyntax((), (("/*", "*/"),), (_DOUBLE_QUOTED, _SINGLE_QUOTED))
+_SQL = CommentSyntax(("--",), (("/*", "*/"),), (_SINGLE_QUOTED, _DOUBLE_QUOTED))
+_LUA = CommentSyntax(("--",), (("--[[", "]]"),), (_DOUBLE_QUOTED, _SINGLE_QUOTED))
+_MARKUP = CommentSyntax((), (("<!--", "-->"),), ())
+
+LANGUAGES: Dict[str, CommentSyntax] = {
+    **dict.fromkeys(
+        (".c", ".h", ".cc", ".cpp", ".cxx", ".hh", ".hpp", ".hxx", ".m", ".mm"),
+        _C_LIKE,
+    ),
+    **dict.fromkeys(
+        (".java", ".kt", ".kts", ".scala", ".cs", ".swift", ".dart", ".php"), _C_LIKE
+    ),
+    **dict.fromkeys((".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"), _JS_LIKE),
+    ".rs": _RUST,
+    ".go": _GO,
+    **dict.fromkeys((".py", ".pyi", ".pyw"), _PYTHON),
+    **dict.fromkeys(
+        (".sh", ".bash", ".zsh", ".rb", ".pl", ".pm", ".r", ".yaml", ".yml"), _HASH
+    ),
+    **dict.fromkeys((".toml", ".cmake", ".mk", ".dockerfile", ".tf"), _HASH),
+    **dict.fromkeys((".css", ".scss", ".less"), _CSS),
+    ".sql": _SQL,
+    ".lua": _LUA,
+    **dict.fromkeys((".html", ".htm", ".xml", ".svg", ".vue", ".md"), _MARKUP),
+}
+
+# Files recognised by name rather than extension
+LANGUAGE_FILENAMES: Dict[str, CommentSyntax] = {
+    "Makefile": _HASH,
+    "Dockerfile": _HASH,
+    "CMakeLists.txt": _HASH,
+}
+
+# Words that mark a leading comment block as a license header
+LICENSE_MARKERS = re.compile(
+    r"copyright|spdx-license-identifier|all rights reserved|licensed under|"
+    r"permission is hereby granted|general public license|apache license",
+    re.IGNORECASE,
+)
+
+Transform = Callable[[str, Optional[CommentSyntax]], str]
+
+# Registered transforms, applied in registration order
+TRANSFORMS: Dict[str, Transform] = {}
+
+
+def register_transform(name: str):
+    """Register a transform under ``name``, for use as a decorator."""
+
+    def decorator(func: Transform) -> Transform:
+        TRANSFORMS[name] = func
+        return func
+
+    return decorator
+
+
+def language_for(path: str) -> Optional[CommentSyntax]:
+    """Get the comment syntax for a file, or None if it is not known."""
+    path = PurePath(path)
+    return LANGUAGE_FILENAMES.get(path.name) or LANGUAGES.get(path.suffix.lower())
+
+
+def _comment_regex(syntax: CommentSyntax) -> Tuple[str, str]:
+    """Build regexes matching one comment, as (line comment, block comment)."""
+    line = "|".join(re.escape(marker) + r"[^\n]*" for marker in syntax.line)
+    block = "|".join(
+        re.escape(opener) + r"[\s\S]*?" + re.escape(closer)
+        for opener, closer in syntax.block
+    )
+    return line, block
+
+
+@lru_cache(maxsize=None)
+def _comment_pattern(syntax: CommentSyntax) -> re.Pattern:
+    """
+    Compile the regex finding string literals and comments of a language.
+
+    Every alternative starts with a quote or a comment marker, which keeps
+    the regex engine's scan fast; telling them apart is left to the caller.
+    """
+    alternatives = list(syntax.strings)
+    alternatives.extend(c for c in _comment_regex(syntax) if c)
+    return re.compile("|".join(alternatives))
+
+
+@lru_cache(maxsize=None)
+def _license_pattern(syntax: CommentSyntax) -> re.Pattern:
+    """Compile the regex matching the leading comment block of a file."""
+    line, block = _comment_regex(syntax)
+    headers = []
+    if line:
+        headers.append(r"(?:[ \t]*%s\n)+" % line)
+    if block:
+        headers.append(r"[ \t]*%s[ \t]*\n" % block)
+    return re.compile(r"\A(?:[ \t]*\n)*(?:%s)(?:[ \t]*\n)*" % "|".join(headers))
+
+
+def _split_shebang(text: str) -> Tuple[str, str]:
+    """Split off a ``#!`` line, which must survive comment stripping."""
+    if text.startswith("#!"):
+        end = text.find("\n") + 1 or len(text)
+        return text[:end], text[end:]
+    return "", text
+
+
+@register_transform("license")
+def strip_license_header(text: str, syntax: Optional[CommentSyntax]) -> str:
+    """Remove a license or copyright comment at the top of a file."""
+    if syntax is None:
+        return text
+
+    shebang, body = _split_shebang(text)
+    header = _license_pattern(syntax).match(body)
+    if header is None or not LICENSE_MARKERS.search(header.group()):
+        return text
+
+    return shebang + body[header.end() :]
+
+
+@register_transform("comments")
+def strip_comments(text: str, syntax: Optional[CommentSyntax]) -> str:
+    """Remove comments, keeping string literals and the shebang line."""
+    if syntax is None:
+        return text
+
+    shebang, body = _split_shebang(text)
+    pieces = []
+    pos = 0
+
+    search = _comment_pattern(syntax).search
+    match = search(body)
+
+    while match is not None:
+        start, end = match.span()
+        first = body[start]
+
+        if first in _QUOTES:
+            match = search(body, end)  # String literal
+            continue
+        if first == "#" and start and not body[start - 1].isspace():
+            match = search(body, start + 1)  # Not a comment: $#, url#fragment
+            continue
+
+        line_start = body.rfind("\n", 0, start) + 1
+        line_end = body.find("\n", end)
+        if line_end < 0:
+            line_end = len(body)
+
+        if body[line_start:start].strip():
+            # Comment after code: drop the spaces separating them too
+            cut = max(len(body[:start].rstrip(" \t")), pos)
+        elif body[end:line_end].strip():
+            # Comment before code: keep the indentation
+            cut = start
+        else:
+            # Comment on lines of its own: drop the lines
+            cut = max(line_start, pos)
+            end = min(line_end + 1, len(body))
+
+        pieces.append(body[pos:cut])
+        pos = end
+        match = search(body, end)
+
+    pieces.append(body[pos:])
+    return shebang + "".join(pieces)
+
+
+@register_transform("trailing-whitespace")
+def strip_trailing_whitespace(text: str, syntax: Optional[CommentSyntax]) -> str:
+    """Remove spaces and tabs at the end of every line."""
+    if " \n" not in text and "\t\n" not in text and not text.endswith((" ", "\t")):
+        return text
+    return "\n".join(line.rstrip(" \t") for line in text.split("\n"))
+
+
+@register_transform("blank-lines")
+def collapse_blank_lines(text: str, syntax: Optional[CommentSyntax]) -> str:
+    """Collapse runs of blank lines into one and drop them at both ends."""
+    text = re.sub(r"\n(?:[ \t]*\n){2,}", "\n\n", text)
+    return text.strip("\n")
+
+
+class TransformPipeline:
+    """
+    An ordered set of transforms applied to every emitted file.
+
+    Only transform names are stored, so pipelines can be sent to worker
+    processes; the functions are looked up in ``TRANSFORMS`` there.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        names = set(names)
+        unknown = names.difference(TRANSFORMS)
+        if unknown:
+            raise ValueError(f"Unknown transforms: {', '.join(sorted(unknown))}")
+
+        # Registration order, so e.g. license headers go before comments
+        self.names = tuple(name for name in TRANSFORMS if name in names)
+
+    def __bool__(self) -> bool:
+        return bool(self.names)
+
+    def apply(self, path: str, text: str) -> str:
+        """Run every transform over the text of the file at ``path``."""
+        syntax = language_for(path)
+        for name in self.names:
+            text = TRANSFORMS[name](text, syntax)
+        return text
+
+    def __call__(self, item: Tuple[str, Optional[str]]) -> Optional[str]:
+        """Transform a ``(path, text)`` pair; None text is passed through."""
+        path, text = item
+        return None if text is None else self.apply(path, text)
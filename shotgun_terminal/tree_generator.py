@@ -1,9 +1,22 @@
 """Generate file tree structure similar to the tree command."""
 
+import os
 from pathlib import Path
 from typing import List
 
 
+def _split_path(file_path) -> List[str]:
+    """Split a relative path into its parts, like ``Path(file_path).parts`` but quicker."""
+    path = os.fspath(file_path)
+    if os.altsep:
+        path = path.replace(os.altsep, os.sep)
+
+    parts = path.split(os.sep)
+    if "" in parts or "." in parts:
+        return list(Path(path).parts)
+    return parts
+
+
 class TreeGenerator:
     """Generate a tree structure representation of the project directory."""
 
@@ -36,7 +49,7 @@ class TreeGenerator:
         tree_structure = {}
 
         for file_path in included_files:
-            parts = Path(file_path).parts
+            parts = _split_path(file_path)
             current = tree_structure
 
             # Build nested structure
@@ -1,13 +1,18 @@
 """Rich-based hierarchical file tree selector with checkboxes."""
 
 import os
+import stat
+import subprocess
 import sys
-import fnmatch
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Set, Optional, Tuple
+from typing import Dict, Iterable, List, Set, Optional, Tuple
 
 # Platform-specific imports for key capture
 try:
+    import select
     import termios
     import tty
     UNIX_AVAILABLE = True
@@ -19,21 +24,63 @@ try:
     WINDOWS_AVAILABLE = True
 except ImportError:
     WINDOWS_AVAILABLE = False
-from rich.console import Console
+from rich.console import Console, Group
+from rich.live import Live
 from rich.tree import Tree
 from rich.panel import Panel
 from rich.text import Text
 from rich.align import Align
+from rich.markup import escape
+
+from .file_tree import CHECKED, EXPANDED, IS_DIRECTORY, LOADED, NO_NODE, ROOT, RULE_IGNORED, USER_SET, FileTree
+from .dir_index import DirectoryIndex, open_directory_index
+from .git_files import GitFileList, iter_git_files, list_git_files
+from .ignore_rules import (
+    GitIgnoreRules,
+    IgnoreRuleSet,
+    NestedIgnoreRules,
+    PathRules,
+    RuleUnion,
+    compile_ignore_rules,
+)
+from .path_search import SearchIndex, SearchResults
+from .tokens import estimate_size_tokens
+from .walker import Identity, directory_identity, read_directory, walk
 
 console = Console()
 
 # Unicode checkbox symbols
 SELECTED = "☑"  # Selected for inclusion in prompt
 UNSELECTED = "☐"  # Not selected for inclusion
-IGNORED = "☒"  # Ignored by default patterns
 DIRECTORY = "📁"  # Directory icon
 FILE = "📄"  # File icon
 
+# Height of the file tree panel, borders included
+TREE_PANEL_HEIGHT = 20
+
+# Time from a key press until the search must stop looking for matches and
+# leave the rest of the frame to drawing, in seconds
+SEARCH_FRAME_BUDGET = 0.012
+
+# How often the selector redraws while the scan or a search is running, in
+# seconds; otherwise it only redraws after a key press
+REDRAW_INTERVAL = 0.1
+
+# How often a frame checks the .shotgunignore files for edits, in seconds;
+# there is one to stat per directory seen
+IGNORE_CHECK_INTERVAL = 1.0
+
+# Width of the selected-tokens gauge, in characters
+GAUGE_WIDTH = 20
+
+# Control keys, by the character the terminal sends
+CONTROL_KEYS = {
+    "\x01": "ctrl-a",
+    "\x0e": "ctrl-n",
+    "\x08": "backspace",
+    "\x7f": "backspace",
+}
+
 
 def get_key():
     """Get a single keypress from stdin."""
@@ -58,16 +105,25 @@ def get_key():
         elif key in [b'\x03', b'\x04']:  # Ctrl+C, Ctrl+D
             return 'quit'
         else:
-            return key.decode('utf-8', 'ignore').lower()
+            key = key.decode('utf-8', 'ignore')
+            return CONTROL_KEYS.get(key, key.lower())
     elif UNIX_AVAILABLE:  # Unix/Linux/macOS
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
         try:
-            tty.setraw(sys.stdin.fileno())
-            key = sys.stdin.read(1)
-            
+            # TCSANOW rather than the default TCSAFLUSH, which would drop
+            # keys pressed while the previous frame was drawn
+            tty.setraw(fd, termios.TCSANOW)
+            # Unbuffered reads, so select() sees whether more bytes follow
+            data = os.read(fd, 1)
+            if data and data[0] >= 0xC0:  # Rest of a UTF-8 character
+                data += os.read(fd, 3 if data[0] >= 0xF0 else 2 if data[0] >= 0xE0 else 1)
+            key = data.decode('utf-8', 'ignore')
+
             if key == '\x1b':  # ESC sequence
-                key += sys.stdin.read(2)
+                # A lone Esc has nothing queued after it
+                if select.select([fd], [], [], 0.05)[0]:
+                    key += os.read(fd, 2).decode('utf-8', 'ignore')
                 if key == '\x1b[A':
                     return 'up'
                 elif key == '\x1b[B':
@@ -85,7 +141,7 @@ def get_key():
             elif key in ['\x03', '\x04']:  # Ctrl+C, Ctrl+D
                 return 'quit'
             else:
-                return key.lower()
+                return CONTROL_KEYS.get(key, key.lower())
         finally:
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
     else:
@@ -101,6 +157,64 @@ def get_key():
             return key
 
 
+def format_size(size: int) -> str:
+    """Format a byte count for display, e.g. ``"1.4 MB"``."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_count(count: int) -> str:
+    """Format a token count compactly, e.g. ``"360k"``."""
+    if count < 1000:
+        return str(count)
+    elif count < 10_000:
+        return f"{count / 1000:.1f}k"
+    elif count < 1_000_000:
+        return f"{count // 1000}k"
+    else:
+        return f"{count / 1_000_000:.1f}M"
+
+
+def key_waiting(timeout: float) -> bool:
+    """Wait up to ``timeout`` seconds for a key press; True if one is ready."""
+    if os.name == 'nt' and WINDOWS_AVAILABLE:
+        deadline = time.monotonic() + timeout
+        while not msvcrt.kbhit():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+    elif UNIX_AVAILABLE:
+        return bool(select.select([sys.stdin], [], [], timeout)[0])
+    else:
+        # Line-based input can only block
+        return True
+
+
+@contextmanager
+def cbreak_input():
+    """
+    Stop the terminal from echoing and line-buffering keys for a while.
+
+    Keys pressed between two ``get_key`` calls then wait unechoed instead
+    of being drawn over the selector, and ``key_waiting`` sees each key as
+    soon as it is pressed rather than at the end of a line.
+    """
+    if os.name == 'nt' or not UNIX_AVAILABLE or not sys.stdin.isatty():
+        yield
+        return
+
+    fd = sys.stdin.fileno()
+    old_settings = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd, termios.TCSANOW)
+        yield
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+
+
 class ShotgunIgnoreManager:
     """Manages .shotgunignore file for persistent file exclusion."""
 
@@ -122,24 +236,36 @@ class ShotgunIgnoreManager:
             "*.egg-info",
             ".shotgunignore",
         ]
+        self.default_rules = IgnoreRuleSet(self.default_patterns)
+        # The rules last compiled, which know the files they were read from
+        self._cache: Optional[NestedIgnoreRules] = None
+
+    def read_ignore_rules(self) -> NestedIgnoreRules:
+        """
+        Compile the ignore rules, if a .shotgunignore file has changed.
+
+        The default patterns come first, then the .shotgunignore files of
+        the project: the top-level one and those in subdirectories, read
+        as their directories are reached, with .gitignore semantics. Any
+        of them that was read (or looked for) being edited, created or
+        deleted gives new rules.
+        """
+        if self._cache is not None and not self._cache.changed():
+            return self._cache
+
+        self._cache = NestedIgnoreRules(
+            self.directory, [".shotgunignore"], [GitIgnoreRules(self.default_patterns)]
+        )
+        return self._cache
 
-    def read_ignore_patterns(self) -> Set[str]:
-        """Read ignore patterns from .shotgunignore file."""
-        patterns = set(self.default_patterns)
-
-        if self.ignore_file.exists():
-            try:
-                with open(self.ignore_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith("#"):
-                            patterns.add(line)
-            except Exception as e:
-                console.print(
-                    f"[yellow]Warning:[/yellow] Could not read .shotgunignore: {e}"
-                )
-
-        return patterns
+    def hidden_rules(self, read_gitignore: bool) -> PathRules:
+        """
+        Rules for what is never listed: the default patterns, plus every
+        .gitignore in the project with ``read_gitignore``.
+        """
+        if not read_gitignore:
+            return self.default_rules
+        return RuleUnion(self.default_rules, NestedIgnoreRules(self.directory, [".gitignore"]))
 
     def write_ignore_patterns(self, patterns: Set[str]) -> bool:
         """Write ignore patterns to .shotgunignore file."""
@@ -161,6 +287,7 @@ class ShotgunIgnoreManager:
                     for pattern in sorted(custom_patterns):
                         f.write(f"{pattern}\n")
 
+            self._cache = None
             console.print(
                 f"[green]✓[/green] Saved ignore patterns to {self.ignore_file}"
             )
@@ -170,181 +297,725 @@ class ShotgunIgnoreManager:
             console.print(f"[red]Error:[/red] Could not write .shotgunignore: {e}")
             return False
 
-    def should_ignore(self, file_path: Path, patterns: Set[str]) -> bool:
+    def should_ignore(self, file_path: Path, patterns: Iterable[str]) -> bool:
         """Check if a file should be ignored based on patterns."""
         relative_path = file_path.relative_to(self.directory)
-        path_str = str(relative_path)
+        return compile_ignore_rules(patterns).matches(relative_path)
 
-        for pattern in patterns:
-            # Direct match
-            if fnmatch.fnmatch(path_str, pattern):
-                return True
 
-            # Directory match (for folder patterns ending with /)
-            if pattern.endswith("/") and (
-                path_str.startswith(pattern) or fnmatch.fnmatch(path_str + "/", pattern)
-            ):
-                return True
+class DirectoryTotals:
+    """File counts and sizes below a directory."""
 
-            # Parent directory match
-            if "/" in pattern:
-                parts = Path(pattern).parts
-                path_parts = relative_path.parts
-                if len(parts) <= len(path_parts):
-                    match = True
-                    for i, part in enumerate(parts):
-                        if not fnmatch.fnmatch(path_parts[i], part):
-                            match = False
-                            break
-                    if match:
-                        return True
+    __slots__ = ("files", "size", "selected_files", "selected_size", "skipped")
 
-        return False
+    def __init__(self):
+        self.files = 0
+        self.size = 0
+        # Files the ignore patterns leave selected
+        self.selected_files = 0
+        self.selected_size = 0
+        # Part of the directory was pruned by the user before it was scanned
+        self.skipped = False
+
+
+class DirectoryScanner:
+    """
+    Walks the project on a background thread, totalling every directory.
+
+    The tree only lists a directory once it is expanded, so these totals
+    are what the selector shows for directories that were never opened,
+    and the paths found are what the search mode looks through. Both grow
+    while the scan runs; ``done`` is set once it has finished.
 
+    ``pruned`` holds the directories the user has excluded. It is shared
+    with the selector and read as the scan goes, so a directory excluded
+    before the scan reaches it is skipped, and its totals and those above
+    it are marked ``skipped``.
 
-class FileNode:
-    """Represents a file or directory node in the tree."""
+    With ``git_files``, the files git lists are totalled instead of
+    walking the directory; otherwise the walk takes unchanged directories
+    from ``dir_index`` if given. With ``git_rules`` instead, git is asked
+    for its files first, on the scan thread: they are totalled as they
+    are listed, filtered by ``git_rules``, and kept in ``git_files`` once
+    ``git_listed`` is set. Outside a work tree the directory is walked.
+    """
 
     def __init__(
         self,
-        path: Path,
-        is_directory: bool = False,
-        parent: Optional["FileNode"] = None,
+        directory: Path,
+        default_rules: PathRules,
+        ignore_rules: PathRules,
+        pruned: Optional[Set[str]] = None,
+        git_files: Optional[GitFileList] = None,
+        dir_index: Optional[DirectoryIndex] = None,
+        git_rules: Optional[PathRules] = None,
     ):
-        self.path = path
-        self.is_directory = is_directory
-        self.parent = parent
-        self.children: List["FileNode"] = []
-        self.checked = True  # All files start checked
-        self.expanded = True if is_directory else False
-
-    def add_child(self, child: "FileNode"):
-        """Add a child node."""
-        child.parent = self
-        self.children.append(child)
-
-    def set_checked(self, checked: bool, recursive: bool = True):
-        """Set checked state, optionally affecting children."""
-        self.checked = checked
-
-        if recursive and self.is_directory:
-            for child in self.children:
-                child.set_checked(checked, recursive=True)
-
-    def get_all_files(self) -> List["FileNode"]:
-        """Get all file nodes (not directories) in this subtree."""
-        files = []
-        if not self.is_directory:
-            files.append(self)
-
-        for child in self.children:
-            files.extend(child.get_all_files())
-
-        return files
-
-    def get_unchecked_patterns(self, base_path: Path) -> Set[str]:
-        """Get ignore patterns for unchecked items."""
-        patterns = set()
-
-        if not self.checked:
-            relative_path = self.path.relative_to(base_path)
-            if self.is_directory:
-                patterns.add(str(relative_path) + "/")
-            else:
-                patterns.add(str(relative_path))
-        else:
-            # Check children only if this node is checked
-            for child in self.children:
-                patterns.update(child.get_unchecked_patterns(base_path))
+        self.directory = Path(directory)
+        self.default_rules = default_rules
+        self.ignore_rules = ignore_rules
+        self.pruned = pruned if pruned is not None else set()
+        self.git_files = git_files
+        self.dir_index = dir_index
+        self.git_rules = git_rules
+        self.git_listed = threading.Event()  # Set once git's listing is complete
+        self.totals: Dict[str, DirectoryTotals] = {}
+        self.skipped: Set[str] = set()  # Directories pruned when the scan reached them
+        self.index = SearchIndex()  # Every file found, for the search mode
+        self.done = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._scan, name="shotgun-scan", daemon=True)
+
+    def start(self):
+        """Start scanning in the background."""
+        self._thread.start()
+
+    def stop(self):
+        """Ask the scan to stop; it exits at the next directory."""
+        self._stopped = True
+
+    def get(self, relative_dir: str) -> Optional[DirectoryTotals]:
+        """Get the totals of a directory (``""`` for the root) if it was reached."""
+        return self.totals.get(relative_dir)
+
+    @staticmethod
+    def _keys(relative_dir: str) -> List[str]:
+        """Keys of a directory and every directory above it, root first."""
+        keys = [""]
+        if relative_dir:
+            parts = relative_dir.split("/")
+            keys.extend("/".join(parts[: i + 1]) for i in range(len(parts)))
+        return keys
+
+    def _totals(self, key: str) -> DirectoryTotals:
+        totals = self.totals.get(key)
+        if totals is None:
+            totals = self.totals[key] = DirectoryTotals()
+        return totals
+
+    def _skip(self, relative_dir: str):
+        """Record that a directory was pruned before it was scanned."""
+        self.skipped.add(relative_dir)
+        for key in self._keys(relative_dir):
+            self._totals(key).skipped = True
+
+    def was_skipped(self, relative_dir: str) -> bool:
+        """Check whether a directory, or one above it, was left out of the scan."""
+        return any(key in self.skipped for key in self._keys(relative_dir))
+
+    def _pruned_above(self, relative_dir: str) -> Optional[str]:
+        """Find the pruned directory a directory is in (or is), if any."""
+        for key in self._keys(relative_dir):
+            if key in self.pruned:
+                return key
+        return None
+
+    def _add(self, relative_dir: str, found: DirectoryTotals, paths: List[str]):
+        """Add the files found in a directory to it and every directory above it."""
+        self.index.add(paths)
+        for key in self._keys(relative_dir):
+            totals = self._totals(key)
+            totals.files += found.files
+            totals.size += found.size
+            totals.selected_files += found.selected_files
+            totals.selected_size += found.selected_size
+
+    def _count(self, found: DirectoryTotals, relative_path: str, size: int):
+        found.files += 1
+        found.size += size
+        if not self.ignore_rules.matches(relative_path):
+            found.selected_files += 1
+            found.selected_size += size
+
+    def _scan(self):
+        if self.git_files is not None:
+            self._scan_git(self.git_files.paths, self.default_rules)
+        elif self.git_rules is None or not self._scan_git_listing():
+            self._scan_walk()
+
+        if not self._stopped:
+            self.index.finish()
+            self.done = True
+
+    def _scan_git_listing(self) -> bool:
+        """
+        Ask git for its files and total them as they come.
+
+        Returns:
+            False if git listed nothing (outside a work tree), so the
+            directory is to be walked instead
+        """
+        listed = []
+
+        def listing():
+            for relative_path in iter_git_files(self.directory):
+                listed.append(relative_path)
+                yield relative_path
+
+        paths = listing()
+        try:
+            self._scan_git(paths, self.git_rules)
+        except (OSError, subprocess.CalledProcessError):
+            pass  # Not a work tree, or git isn't installed
+        finally:
+            try:
+                paths.close()
+            except (OSError, subprocess.CalledProcessError):
+                pass  # Git was cut off by a stopped scan
+
+            # Even if the scan failed, so nobody waits for it forever
+            if not self._stopped:
+                if listed:
+                    self.git_files = GitFileList(listed)
+                self.git_listed.set()
+
+        return self._stopped or self.git_files is not None
+
+    def _scan_git(self, relative_paths: Iterable[str], rules: PathRules):
+        """Total the files git lists, stat'ing each one for its size."""
+        root = os.fspath(self.directory)
+        relative_root = None
+        found = None
+        paths = []
+        pruned_dir = None
+
+        for relative_path in relative_paths:
+            if self._stopped:
+                return
+            if rules.matches(relative_path):
+                continue
+
+            # Sorted paths keep a directory's files mostly together, so
+            # totals are added up a run of files at a time
+            relative_dir = relative_path.rpartition("/")[0]
+            if relative_dir != relative_root:
+                if found is not None:
+                    self._add(relative_root, found, paths)
+                relative_root = relative_dir
+                found = DirectoryTotals()
+                paths = []
+                pruned_dir = self._pruned_above(relative_dir) if self.pruned else None
+                if pruned_dir is not None:
+                    self._skip(pruned_dir)
+
+            if pruned_dir is not None:
+                continue
 
-        return patterns
+            try:
+                stat_result = os.stat(os.path.join(root, relative_path))
+            except OSError:
+                continue  # Deleted from the work tree
+            if not stat.S_ISREG(stat_result.st_mode):
+                continue  # Such as a submodule
+
+            paths.append(relative_path)
+            self._count(found, relative_path, stat_result.st_size)
+
+        if found is not None:
+            self._add(relative_root, found, paths)
+
+    def _scan_walk(self):
+        listings = walk(
+            self.directory, prune=self.default_rules.should_prune, stat_files=True, index=self.dir_index
+        )
+        for listing in listings:
+            if self._stopped:
+                return
+
+            relative_root = listing.relative_dir
+            prefix = relative_root + "/" if relative_root else ""
+            dirs = listing.dirs
+
+            # Pruned after its parent was listed, so the walk still came here
+            if self.pruned and self._pruned_above(relative_root) is not None:
+                dirs.clear()
+                self._skip(relative_root)
+                continue
+
+            kept = []
+            for name in dirs:
+                if prefix + name in self.pruned:
+                    self._skip(prefix + name)
+                    continue
+                kept.append(name)
+            dirs[:] = kept
+
+            found = DirectoryTotals()
+            paths = []
+            for name, size in zip(listing.files, listing.sizes):
+                relative_path = prefix + name
+                if self.default_rules.matches(relative_path):
+                    continue
+                paths.append(relative_path)
+                self._count(found, relative_path, size)
+
+            self._add(relative_root, found, paths)
+
+        if self.dir_index is not None and not self._stopped:
+            self.dir_index.flush()
 
 
 class RichFileTreeSelector:
     """Rich-based file tree selector with checkboxes."""
 
-    def __init__(self, directory: Path):
+    def __init__(
+        self, directory: Path, token_budget: Optional[int] = None, use_git: bool = True, use_cache: bool = True
+    ):
         self.directory = Path(directory)
+        self.token_budget = token_budget  # Shown against the selected tokens
+        self.use_git = use_git
+        self.use_cache = use_cache
+        self.git_files: Optional[GitFileList] = None  # What git lists, inside a work tree
+        self.git_pending = False  # Waiting for the scanner to list git's files
+        self.dir_index: Optional[DirectoryIndex] = None  # Listings from earlier runs
         self.ignore_manager = ShotgunIgnoreManager(directory)
-        self.root_node = None
+        self.tree: Optional[FileTree] = None
         self.flat_list = []  # Flattened list for navigation
         self.current_index = 0
+        self.scroll_offset = 0  # Index of the first row in the viewport
         self.visible_items = []  # Currently visible items
+        self.live: Optional[Live] = None
+        self.default_rules = self.ignore_manager.default_rules
+        self.ignore_rules = None
+        self.scanner = None
+        self.unloaded: Dict[str, int] = {}  # Directories counted by the scanner
+        self.pruned: Set[str] = set()  # Excluded directories the scan skips
+        self.identities: Dict[int, Optional[Identity]] = {}  # Of loaded directories
+        self.totals_synced = False
+        self.child_names: Dict[int, Dict[str, int]] = {}  # Per loaded directory
+        self.search_query: Optional[str] = None  # None outside the search mode
+        self.search_results: Optional[SearchResults] = None
+        self.search_cursor = 0
+        self.search_offset = 0
+        self.status_message = ""  # Shown until the next key
+        self.frame_start = 0.0  # When the key being handled was read
+        self.ignore_checked = 0.0  # When the .shotgunignore files were last checked
+
+    def build_file_tree(self) -> FileTree:
+        """Build the top level of the file tree; deeper levels load on expand."""
+        self.ignore_rules = self.ignore_manager.read_ignore_rules()
+        if self.use_git and self.git_files is None:
+            # Inside a git work tree, only what git lists is shown; elsewhere
+            # the .gitignore files are applied the same way. Git's listing
+            # comes from the scanner, and until then the .gitignore files
+            # stand in for it
+            self.default_rules = self.ignore_manager.hidden_rules(True)
+            self.git_pending = True
+        if self.use_cache and self.dir_index is None:
+            self.dir_index = open_directory_index(self.directory)
+
+        self.tree = FileTree(self.directory)
+        self.load_children(ROOT)
+        return self.tree
+
+    def load_children(self, node: int):
+        """List a directory's children the first time they are needed."""
+        tree = self.tree
+        if tree.has_flag(node, LOADED):
+            return
+        tree.resolve(node)
+        tree.set_flag(node, LOADED)
+
+        # The children's totals take over from the scanner's
+        tree.set_totals(node, 0, 0, 0, 0)
+        self.unloaded.pop(tree.relative_path(node), None)
+
+        prefix = tree.relative_path(node)
+        # A plain string path, as pathlib would intern every component
+        path = os.path.join(self.directory, prefix)
+        try:
+            stat_result, dirs, files, sizes = read_directory(path, True, self.dir_index)
+        except OSError:
+            return  # Skip directories we can't read
+        self.identities[node] = (stat_result.st_dev, stat_result.st_ino)
+
+        prefix = prefix + "/" if prefix else ""
+        inherited = None
+        if tree.has_flag(node, USER_SET):
+            # The user toggled this directory before it was opened
+            inherited = tree.flags[node] & (CHECKED | USER_SET)
+
+        children = []
+        entries = [(name, True, 0) for name in dirs]
+        entries.extend(zip(files, [False] * len(files), sizes))
+        for name, is_dir, size in sorted(entries):
+            relative_path = prefix + name
 
-    def build_file_tree(self) -> FileNode:
-        """Build the file tree structure."""
-        ignore_patterns = self.ignore_manager.read_ignore_patterns()
-
-        def build_node(
-            path: Path, parent: Optional[FileNode] = None
-        ) -> Optional[FileNode]:
             # Skip if should be ignored by default patterns (but not custom ones)
-            if self.ignore_manager.should_ignore(
-                path, set(self.ignore_manager.default_patterns)
-            ):
-                return None
-
-            is_dir = path.is_dir()
-            node = FileNode(path, is_dir, parent)
-
-            # Set initial checked state based on ignore patterns
-            if self.ignore_manager.should_ignore(path, ignore_patterns):
-                node.checked = False
-
-            if is_dir:
-                try:
-                    for child_path in sorted(path.iterdir()):
-                        child_node = build_node(child_path, node)
-                        if child_node:
-                            node.add_child(child_node)
-                except PermissionError:
-                    pass  # Skip directories we can't read
-
-            return node
-
-        return build_node(self.directory)
-
-    def flatten_tree(
-        self, node: FileNode, level: int = 0
-    ) -> List[Tuple[FileNode, int]]:
-        """Flatten tree into a navigable list."""
+            if self.default_rules.matches(relative_path, is_dir):
+                continue
+
+            if self.git_files is not None:
+                # Ignored by git, or a directory without any files git lists
+                if relative_path not in (self.git_files.dirs if is_dir else self.git_files.files):
+                    continue
+
+            if is_dir and self.leads_to_ancestor(node, os.path.join(path, name)):
+                continue  # A symlink loop, which would expand forever
+
+            # Classify once, so frames never match patterns
+            flags = IS_DIRECTORY if is_dir else 0
+            if self.ignore_rules.matches(relative_path, is_dir):
+                flags |= RULE_IGNORED
+
+            if inherited is not None:
+                flags |= inherited
+            elif not flags & RULE_IGNORED:
+                # Set initial checked state based on ignore patterns
+                flags |= CHECKED
+
+            children.append((name, flags, size))
+
+        for child in tree.add_children(node, children):
+            if tree.is_directory(child):
+                self.unloaded[tree.relative_path(child)] = child
+                self.sync_node_totals(child)
+
+    def leads_to_ancestor(self, node: int, path: str) -> bool:
+        """Check whether a directory in ``node`` is ``node`` or one above it."""
+        identity = directory_identity(path)
+        if identity is None:
+            return False
+
+        ancestor = node
+        while ancestor != NO_NODE:
+            if self.identities.get(ancestor) == identity:
+                return True
+            ancestor = self.tree.parent[ancestor]
+        return False
+
+    def load_all(self):
+        """
+        Load every directory, for when the complete selection is needed.
+
+        Directories the user excluded before opening them are left unread,
+        as nothing below them can be selected; unchecked_patterns() covers
+        them with their own pattern.
+        """
+        if not self.tree:
+            return
+
+        tree = self.tree
+        pending = [ROOT]
+        while pending:
+            node = pending.pop()
+            if not tree.has_flag(node, LOADED) and tree.is_user_set(node) and not tree.is_checked(node):
+                continue
+            self.load_children(node)
+            pending.extend(child for child in tree.children(node) if tree.is_directory(child))
+
+    def start_scanner(self):
+        """Count files below each directory in the background."""
+        if self.scanner:
+            self.scanner.stop()
+        git_rules = self.ignore_manager.default_rules if self.git_pending else None
+        self.scanner = DirectoryScanner(
+            self.directory, self.default_rules, self.ignore_rules, self.pruned, self.git_files, self.dir_index, git_rules
+        )
+        self.totals_synced = False
+        self.scanner.start()
+
+    def sync_git_listing(self):
+        """
+        Switch to git's view of the project once the scanner has listed it.
+
+        Directories loaded before that were filtered by their .gitignore
+        files, which git mostly agrees with. If the user has not opened or
+        toggled anything yet, the top level is listed again from git so
+        the tree matches it exactly.
+        """
+        if not self.git_pending or self.scanner is None or not self.scanner.git_listed.is_set():
+            return
+        self.git_pending = False
+        self.git_files = self.scanner.git_files
+        if self.git_files is None:
+            return  # Not a work tree, so the .gitignore files stay
+
+        self.default_rules = self.ignore_manager.default_rules
+        tree = self.tree
+        for node in range(len(tree)):
+            flags = tree.flags[node]
+            if flags & USER_SET or (node != ROOT and flags & IS_DIRECTORY and flags & LOADED):
+                return
+
+        self.tree = FileTree(self.directory)
+        self.unloaded = {}
+        self.identities = {}
+        self.child_names = {}
+        self.load_children(ROOT)
+        self.totals_synced = False
+        self.update_visible_items()
+
+    def finish_git_listing(self):
+        """Wait for git's listing if it is still coming, and switch to it."""
+        if self.git_pending and self.scanner is not None:
+            self.scanner.git_listed.wait()
+            self.sync_git_listing()
+
+    def refresh_ignore_rules(self):
+        """Reclassify loaded entries if a .shotgunignore file has been edited."""
+        now = time.monotonic()
+        if now - self.ignore_checked < IGNORE_CHECK_INTERVAL:
+            return
+        self.ignore_checked = now
+
+        rules = self.ignore_manager.read_ignore_rules()
+        if rules is self.ignore_rules or not self.tree:
+            return
+        self.ignore_rules = rules
+
+        tree = self.tree
+        pending = [(ROOT, "")]
+        while pending:
+            node, prefix = pending.pop()
+            for child in tree.children(node):
+                relative_path = prefix + tree.name(child)
+                ignored = rules.matches(relative_path, tree.is_directory(child))
+                if ignored != tree.has_flag(child, RULE_IGNORED):
+                    tree.set_flag(child, RULE_IGNORED, ignored)
+                    tree.set_rule_state(child, not ignored)
+                if tree.has_flag(child, LOADED) and tree.is_directory(child):
+                    pending.append((child, relative_path + "/"))
+
+        # Selected totals of unopened directories depend on the rules too
+        if self.scanner:
+            self.start_scanner()
+
+    def set_pruned(self, relative_dir: str, pruned: bool):
+        """
+        Stop or resume scanning below a directory the user excluded or included.
+
+        Including a directory again includes everything below it, so
+        directories pruned inside it are resumed too. Including one inside
+        a pruned directory narrows that down to the subdirectories on the
+        way that are still excluded. The scan restarts if it skipped any
+        of the directories resumed.
+        """
+        if pruned:
+            self.pruned.add(relative_dir)
+            return
+
+        prefix = relative_dir + "/"
+        resumed = [p for p in self.pruned if not relative_dir or p == relative_dir or p.startswith(prefix)]
+        self.pruned.difference_update(resumed)
+
+        parts = relative_dir.split("/") if relative_dir else []
+        for depth in range(len(parts)):
+            above = "/".join(parts[:depth])
+            if above in self.pruned:
+                self.narrow_pruned(above, relative_dir)
+                resumed.append(above)
+
+        if self.scanner is None:
+            return
+        for skipped in list(self.scanner.skipped):
+            if any(skipped == p or skipped.startswith(p + "/") or not p for p in resumed):
+                self.start_scanner()
+                return
+
+    def narrow_pruned(self, pruned_dir: str, relative_dir: str):
+        """
+        Stop pruning a directory as a whole because ``relative_dir``, below
+        it, was included: prune its subdirectories that are still excluded
+        instead, down the way to ``relative_dir``.
+        """
+        self.pruned.discard(pruned_dir)
+
+        node, found = self.find_node(relative_dir)
+        if not found:
+            return
+        path = []
+        while node != ROOT and self.tree.relative_path(node) != pruned_dir:
+            path.append(node)
+            node = self.tree.parent[node]
+
+        # ``node`` is the pruned directory; its children are loaded, as are
+        # those of every directory on the way down
+        for on_path in reversed(path):
+            for child in self.tree.children(node):
+                if child != on_path and self.tree.is_directory(child) and not self.tree.is_checked(child):
+                    self.pruned.add(self.tree.relative_path(child))
+            node = on_path
+
+    def has_background_work(self) -> bool:
+        """Whether the scan or a search is still running, so frames change by themselves."""
+        if self.scanner is not None and not self.totals_synced:
+            return True
+        return self.search_query is not None and not self.search_results.done
+
+    def sync_node_totals(self, node: int):
+        """Copy the background scan's totals to a directory not loaded yet."""
+        totals = self.scanner.get(self.tree.relative_path(node)) if self.scanner else None
+        if totals is not None:
+            self.tree.set_totals(node, totals.files, totals.size, totals.selected_files, totals.selected_size)
+
+    def sync_totals(self):
+        """Bring unloaded directories up to date with the background scan."""
+        if self.scanner is None or self.totals_synced:
+            return
+
+        # Once a pass has run after the scan finished, the totals are final
+        done = self.scanner.done
+        for node in list(self.unloaded.values()):
+            self.sync_node_totals(node)
+        self.totals_synced = done
+
+    def find_node(self, relative_path: str, load: bool = False) -> Tuple[int, bool]:
+        """
+        Find the node of a project-relative path.
+
+        Returns the node and True, or the deepest ancestor that is in the
+        tree and False. With ``load`` the directories on the way are
+        loaded, so any path that still exists is found.
+        """
+        tree = self.tree
+        node = ROOT
+        for name in relative_path.split("/"):
+            if not tree.has_flag(node, LOADED):
+                if not load:
+                    return node, False
+                self.load_children(node)
+
+            names = self.child_names.get(node)
+            if names is None:
+                names = self.child_names[node] = {tree.name(child): child for child in tree.children(node)}
+            child = names.get(name)
+            if child is None:
+                return node, False
+            node = child
+
+        return node, True
+
+    def is_path_checked(self, relative_path: str) -> bool:
+        """Check whether a path is selected, without loading its directories."""
+        node, found = self.find_node(relative_path)
+        if found or self.tree.is_user_set(node):
+            return self.tree.is_checked(node)
+
+        # Below directories that still follow the ignore rules
+        return not self.ignore_rules.matches(relative_path)
+
+    def flatten_tree(self, node: int = ROOT, level: int = 0) -> List[Tuple[int, int]]:
+        """Flatten the visible descendants of a node into a navigable list."""
+        tree = self.tree
         items = []
 
-        # Always include children of root, but not root itself
-        if node.path == self.directory:
-            # For root directory, include all children
-            for child in node.children:
-                items.extend(self.flatten_tree(child, level))
-        else:
-            # Include this node
-            items.append((node, level))
+        # Depth-first with a stack of child iterators, one per open directory
+        stack = [(tree.children(node), level)]
+        while stack:
+            children, depth = stack[-1]
+            for child in children:
+                items.append((child, depth))
 
-            # Include children if directory is expanded
-            if node.is_directory and node.expanded:
-                for child in node.children:
-                    items.extend(self.flatten_tree(child, level + 1))
+                # Include children if directory is expanded
+                if tree.flags[child] & EXPANDED:
+                    stack.append((tree.children(child), depth + 1))
+                    break
+            else:
+                stack.pop()
 
         return items
 
-    def get_checkbox_symbol(self, node: FileNode) -> str:
+    def get_checkbox_symbol(self, node: int) -> str:
         """Get the appropriate checkbox symbol for a node."""
-        ignore_patterns = self.ignore_manager.read_ignore_patterns()
-
-        # Check if ignored by default patterns
-        if self.ignore_manager.should_ignore(
-            node.path, set(self.ignore_manager.default_patterns)
-        ):
-            return IGNORED
-
-        # Check if explicitly ignored in .shotgunignore
-        if not node.checked:
+        # Entries matching the default patterns are never loaded, and custom
+        # patterns were applied to the checked state when the node was
+        if not self.tree.is_checked(node):
             return UNSELECTED
 
         return SELECTED
 
-    def render_tree(self):
-        """Render the current tree state."""
-        console.clear()
+    def scroll_to_cursor(self) -> range:
+        """Move the viewport so the cursor is on screen; return its rows."""
+        rows = TREE_PANEL_HEIGHT - 2
+        if self.current_index < self.scroll_offset:
+            self.scroll_offset = self.current_index
+        elif self.current_index >= self.scroll_offset + rows:
+            self.scroll_offset = self.current_index - rows + 1
+        self.scroll_offset = max(0, min(self.scroll_offset, len(self.visible_items) - rows))
+
+        return range(self.scroll_offset, min(self.scroll_offset + rows, len(self.visible_items)))
+
+    def format_row(self, index: int) -> str:
+        """Format one row of the tree as Rich markup."""
+        tree = self.tree
+        node, level = self.visible_items[index]
+
+        # Indentation
+        indent = "  " * level
+
+        # Checkbox symbol
+        checkbox = self.get_checkbox_symbol(node)
+
+        # Icon
+        is_directory = tree.is_directory(node)
+        icon = DIRECTORY if is_directory else FILE
+
+        # Name, with sizes (and the file count of directories) once known
+        name = tree.name(node) + self.format_totals(node)
+
+        # Expansion indicator for directories
+        expand_indicator = ""
+        if is_directory:
+            expand_indicator = "▼ " if tree.has_flag(node, EXPANDED) else "▶ "
+
+        # Highlight current line
+        line_text = f"{indent}{expand_indicator}{checkbox} {icon} {name}"
+        if index == self.current_index:
+            line_text = f"[reverse]{line_text}[/reverse]"
+
+        return line_text
+
+    def format_totals(self, node: int) -> str:
+        """
+        Format the size and token estimate of a row as Rich markup.
+
+        Directories show the totals of everything below them, plus the
+        selected part when only some of it is selected; token counts
+        larger than the budget are shown in red.
+        """
+        tree = self.tree
+        totals = tree.totals(node)
+        tokens = estimate_size_tokens(totals.size)
+        over_budget = self.token_budget is not None and tokens > self.token_budget
+
+        if not tree.is_directory(node):
+            token_text = f"~{format_count(tokens)} tokens"
+            if over_budget:
+                token_text = f"[red]{token_text}[/red]"
+            return f" [dim]({format_size(totals.size)} · {token_text})[/dim]"
+
+        partial = ""
+        relative_dir = tree.relative_path(node)
+        scanned = self.scanner.get(relative_dir) if self.scanner else None
+        if scanned is None and self.scanner is not None and self.scanner.was_skipped(relative_dir):
+            # Inside a directory the scan left out, so never counted
+            if not tree.has_flag(node, LOADED):
+                return ""
+            partial = "+"
+        elif scanned is not None and scanned.skipped:
+            # Pruned before the scan got there, so only partly counted
+            partial = "+"
+        elif not totals.files and self.scanner is not None and not self.scanner.done:
+            return ""  # Not counted yet
+
+        token_text = f"~{format_count(tokens)}{partial} tokens"
+        if over_budget:
+            token_text = f"[red]{token_text}[/red]"
+        text = f"{totals.files}{partial} files · {format_size(totals.size)}{partial} · {token_text}"
+        if 0 < totals.selected_size < totals.size:
+            text += f" · ~{format_count(estimate_size_tokens(totals.selected_size))} selected"
+        return f" [dim]({text})[/dim]"
+
+    def render_tree(self) -> Group:
+        """
+        Render the current tree state.
+
+        Only the rows inside the viewport are formatted, so a frame costs
+        the same however many entries are expanded.
+        """
+        self.refresh_ignore_rules()
+        self.sync_git_listing()
+        self.sync_totals()
 
         # Header
         header = Panel.fit(
@@ -352,68 +1023,148 @@ class RichFileTreeSelector:
             f"Directory: {self.directory}",
             border_style="cyan",
         )
-        console.print(header)
-
-        # Tree display
-        tree_lines = []
-        for i, (node, level) in enumerate(self.visible_items):
-            # Indentation
-            indent = "  " * level
-
-            # Checkbox symbol
-            checkbox = self.get_checkbox_symbol(node)
-
-            # Icon
-            icon = DIRECTORY if node.is_directory else FILE
 
-            # Name
-            name = node.path.name
+        if self.search_query is not None:
+            return self.render_search(header)
 
-            # Expansion indicator for directories
-            expand_indicator = ""
-            if node.is_directory:
-                expand_indicator = "▼ " if node.expanded else "▶ "
-
-            # Highlight current line
-            line_text = f"{indent}{expand_indicator}{checkbox} {icon} {name}"
-            if i == self.current_index:
-                line_text = f"[reverse]{line_text}[/reverse]"
-
-            tree_lines.append(line_text)
+        # Tree display
+        tree_lines = [self.format_row(i) for i in self.scroll_to_cursor()]
 
         # Display tree in a panel
         tree_content = "\n".join(tree_lines) if tree_lines else "No files found"
+        position = ""
+        if self.visible_items:
+            position = f"[dim]{self.current_index + 1}/{len(self.visible_items)}[/dim]"
         tree_panel = Panel(
             tree_content,
             title="[bold]File Tree[/bold]",
+            subtitle=position,
             border_style="blue",
-            height=20,
+            height=TREE_PANEL_HEIGHT,
         )
-        console.print(tree_panel)
 
         # Instructions
         instructions = Panel.fit(
             "[bold]Navigation:[/bold]\n"
-            "↑↓/K/J Navigate  [bold]Space[/bold] Toggle  [bold]Enter[/bold] Expand/Collapse\n"
+            "↑↓/K/J Navigate  [bold]Space[/bold] Toggle  [bold]Enter[/bold] Expand/Collapse  [bold]/[/bold] Search\n"
             "[bold]A[/bold] Select All  [bold]N[/bold] Select None  [bold]S[/bold] Save & Continue  [bold]Q[/bold] Quit  [bold]H[/bold] Help",
             border_style="green",
         )
-        console.print(instructions)
+
+        return self.render_frame(
+            [header, tree_panel, instructions],
+            "Press any key (↑↓ to navigate, Space to toggle, Enter to expand, / to search, S to save, Q to quit, H for help)",
+        )
+
+    def render_frame(self, panels: list, hint: str) -> Group:
+        """Add the selection stats and a hint line below the panels of a frame."""
+        frame = list(panels)
 
         # Stats
-        if self.root_node:
-            all_files = self.root_node.get_all_files()
-            selected_count = sum(1 for f in all_files if f.checked)
-            total_count = len(all_files)
+        if self.tree:
+            totals = self.tree.totals(ROOT)
+            selected_tokens = estimate_size_tokens(totals.selected_size)
 
-            stats_text = f"[dim]Files: {selected_count}/{total_count} selected[/dim]"
-            console.print(Align.center(stats_text))
+            scanned = self.scanner.get("") if self.scanner else None
+            file_count = f"{totals.files}+" if scanned is not None and scanned.skipped else totals.files
+
+            stats_text = f"[dim]Files: {totals.selected_files}/{file_count} selected, {format_size(totals.selected_size)}"
+            if self.token_budget:
+                stats_text += f"[/dim]  {self.format_gauge(selected_tokens)}"
+            else:
+                stats_text += f", ~{selected_tokens:,} tokens[/dim]"
+            if self.scanner and not self.scanner.done:
+                stats_text += " [dim](scanning...)[/dim]"
+            frame.append(Align.center(stats_text))
+
+        frame.append("\n" + (self.status_message or f"[dim]{hint}[/dim]"))
+        return Group(*frame)
+
+    def format_gauge(self, selected_tokens: int) -> str:
+        """Format the selected tokens against the token budget as a bar."""
+        budget = self.token_budget
+        ratio = selected_tokens / budget
+        filled = min(GAUGE_WIDTH, round(ratio * GAUGE_WIDTH))
+        color = "red" if ratio > 1 else "yellow" if ratio > 0.8 else "green"
+
+        bar = "█" * filled + "░" * (GAUGE_WIDTH - filled)
+        return f"[{color}]{bar} ~{selected_tokens:,} / {budget:,} tokens ({ratio:.0%})[/{color}]"
+
+    def render_search(self, header: Panel) -> Group:
+        """
+        Render the search mode, with the matching files in place of the tree.
+
+        Matches are looked for until ``SEARCH_FRAME_BUDGET`` seconds after
+        the key press, so typing stays responsive on large projects; the
+        count is marked with ``+`` while the search is still incomplete.
+        """
+        results = self.search_results
+        if results.index is not self.scanner.index:
+            # The scan was restarted with new ignore rules
+            self.update_search()
+            results = self.search_results
+        results.advance(deadline=self.frame_start + SEARCH_FRAME_BUDGET)
+
+        matches = results.matches
+        rows = TREE_PANEL_HEIGHT - 2
+        self.search_cursor = max(0, min(self.search_cursor, len(matches) - 1))
+        if self.search_cursor < self.search_offset:
+            self.search_offset = self.search_cursor
+        elif self.search_cursor >= self.search_offset + rows:
+            self.search_offset = self.search_cursor - rows + 1
+
+        lines = []
+        paths = results.index.paths
+        for i in range(self.search_offset, min(self.search_offset + rows, len(matches))):
+            path = paths[matches[i]]
+            checkbox = SELECTED if self.is_path_checked(path) else UNSELECTED
+            line = f"{checkbox} {FILE} {escape(path)}"
+            if i == self.search_cursor:
+                line = f"[reverse]{line}[/reverse]"
+            lines.append(line)
+
+        if lines:
+            content = "\n".join(lines)
+        elif not self.search_query:
+            content = "[dim]Type to search file paths[/dim]"
+        elif results.done:
+            content = "[dim]No matching files[/dim]"
+        else:
+            content = "[dim]Searching...[/dim]"
+
+        position = ""
+        if self.search_query:
+            count = f"{len(matches)}" if results.done else f"{len(matches)}+"
+            position = f"[dim]{self.search_cursor + 1 if matches else 0}/{count}[/dim]"
+        search_panel = Panel(
+            content,
+            title=f"[bold]Search:[/bold] {escape(self.search_query)}▏",
+            subtitle=position,
+            border_style="blue",
+            height=TREE_PANEL_HEIGHT,
+        )
+
+        instructions = Panel.fit(
+            "[bold]Search:[/bold]\n"
+            "Type to filter  ↑↓ Navigate  [bold]Space[/bold] Toggle  [bold]Enter[/bold] Show in tree  [bold]Esc[/bold] Back\n"
+            "[bold]Ctrl+A[/bold] Select all matches  [bold]Ctrl+N[/bold] Deselect all matches",
+            border_style="green",
+        )
+
+        return self.render_frame(
+            [header, search_panel, instructions],
+            "Type to search (↑↓ to navigate, Space to toggle, Enter to show in tree, Esc to go back)",
+        )
 
     def handle_input(self) -> bool:
         """Handle user input. Returns False to quit."""
         try:
-            console.print("\n[dim]Press any key (↑↓ to navigate, Space to toggle, Enter to expand, S to save, Q to quit, H for help)[/dim]")
             key = get_key()
+            self.frame_start = time.perf_counter()
+            self.status_message = ""
+
+            if self.search_query is not None:
+                return self.handle_search_key(key)
 
             if key in ["q", "quit"]:
                 return False
@@ -433,6 +1184,8 @@ class RichFileTreeSelector:
                 self.select_none()
             elif key in ["h", "?"]:
                 self.show_help()
+            elif key == "/":
+                self.start_search()
             elif key == "esc":
                 return False
 
@@ -444,6 +1197,111 @@ class RichFileTreeSelector:
             console.print(f"[red]Input error:[/red] {e}")
             return True
 
+    def handle_search_key(self, key: str) -> bool:
+        """Handle a key in the search mode. Returns False to quit."""
+        results = self.search_results
+
+        if key == "quit":
+            return False
+        elif key == "esc":
+            self.end_search()
+        elif key == "enter":
+            if results.matches:
+                self.reveal(results.index.paths[results.matches[self.search_cursor]])
+            self.end_search()
+        elif key == "up":
+            if self.search_cursor > 0:
+                self.search_cursor -= 1
+        elif key == "down":
+            # The next match may not have been found yet
+            results.advance(until=self.search_cursor + 2, deadline=self.frame_start + SEARCH_FRAME_BUDGET)
+            if self.search_cursor < len(results.matches) - 1:
+                self.search_cursor += 1
+        elif key == "space":
+            self.toggle_match()
+        elif key == "ctrl-a":
+            self.check_matches(True)
+        elif key == "ctrl-n":
+            self.check_matches(False)
+        elif key == "backspace":
+            if self.search_query:
+                self.search_query = self.search_query[:-1]
+                self.update_search()
+        elif len(key) == 1 and key.isprintable():
+            self.search_query += key
+            self.update_search()
+
+        return True
+
+    def start_search(self):
+        """Enter the search mode."""
+        if self.scanner is None:
+            self.start_scanner()
+        self.search_query = ""
+        self.search_results = None
+        self.update_search()
+
+    def end_search(self):
+        """Leave the search mode and return to the tree."""
+        self.search_query = None
+        self.search_results = None
+
+    def update_search(self):
+        """Search the scanner's index for the current query."""
+        index = self.scanner.index
+        # A query that extends the previous one only narrows its matches
+        previous = self.search_results
+        if previous is not None and previous.index is not index:
+            previous = None
+
+        self.search_results = index.search(self.search_query, previous)
+        self.search_cursor = 0
+        self.search_offset = 0
+
+    def toggle_match(self):
+        """Toggle selection of the file under the search cursor."""
+        results = self.search_results
+        if not results.matches:
+            return
+
+        node, found = self.find_node(results.index.paths[results.matches[self.search_cursor]], load=True)
+        if found:
+            self.tree.set_checked(node, not self.tree.is_checked(node))
+
+    def check_matches(self, checked: bool):
+        """Select or deselect every file matching the search."""
+        results = self.search_results
+        paths = results.index.paths
+
+        count = 0
+        for match in results.complete():
+            node, found = self.find_node(paths[match], load=True)
+            if found:
+                self.tree.set_checked(node, checked)
+                count += 1
+
+        action = "Selected" if checked else "Deselected"
+        self.status_message = f"[green]✓[/green] {action} {count} matching files"
+        if not results.done:
+            self.status_message += " [dim](scan still running, more may match)[/dim]"
+
+    def reveal(self, relative_path: str):
+        """Expand the directories above a path and move the cursor to it."""
+        node, found = self.find_node(relative_path, load=True)
+        if not found:
+            return
+
+        ancestor = self.tree.parent[node]
+        while ancestor > ROOT:
+            self.tree.set_flag(ancestor, EXPANDED)
+            ancestor = self.tree.parent[ancestor]
+
+        self.update_visible_items()
+        for index, (item, _) in enumerate(self.visible_items):
+            if item == node:
+                self.current_index = index
+                break
+
     def navigate_up(self):
         """Navigate to previous item."""
         if self.current_index > 0:
@@ -458,30 +1316,49 @@ class RichFileTreeSelector:
         """Toggle selection of current item."""
         if self.visible_items and self.current_index < len(self.visible_items):
             node, _ = self.visible_items[self.current_index]
-            node.set_checked(not node.checked, recursive=True)
+            checked = not self.tree.is_checked(node)
+            self.tree.set_checked(node, checked)
+
+            # Don't spend the scan on a directory that was just excluded
+            if self.tree.is_directory(node):
+                self.set_pruned(self.tree.relative_path(node), not checked)
 
     def expand_collapse_current(self):
         """Expand or collapse current directory."""
         if self.visible_items and self.current_index < len(self.visible_items):
-            node, _ = self.visible_items[self.current_index]
-            if node.is_directory:
-                node.expanded = not node.expanded
-                self.update_visible_items()
+            node, level = self.visible_items[self.current_index]
+            if not self.tree.is_directory(node):
+                return
+
+            # Splice the directory's rows in or out below the cursor rather
+            # than flattening the whole tree again
+            start = self.current_index + 1
+            if self.tree.has_flag(node, EXPANDED):
+                self.tree.set_flag(node, EXPANDED, False)
+                end = start
+                while end < len(self.visible_items) and self.visible_items[end][1] > level:
+                    end += 1
+                del self.visible_items[start:end]
+            else:
+                self.load_children(node)
+                self.tree.set_flag(node, EXPANDED)
+                self.visible_items[start:start] = self.flatten_tree(node, level + 1)
 
     def select_all(self):
         """Select all files."""
-        if self.root_node:
-            self.root_node.set_checked(True, recursive=True)
+        if self.tree:
+            self.tree.set_checked(ROOT, True)
+            self.set_pruned("", False)
 
     def select_none(self):
         """Deselect all files."""
-        if self.root_node:
-            self.root_node.set_checked(False, recursive=True)
+        if self.tree:
+            self.tree.set_checked(ROOT, False)
 
     def update_visible_items(self):
         """Update the visible items list."""
-        if self.root_node:
-            self.visible_items = self.flatten_tree(self.root_node)
+        if self.tree:
+            self.visible_items = self.flatten_tree(ROOT)
             # Ensure current index is within bounds
             if self.current_index >= len(self.visible_items):
                 self.current_index = max(0, len(self.visible_items) - 1)
@@ -501,6 +1378,15 @@ class RichFileTreeSelector:
   A           - Select all files
   N           - Deselect all files
   
+[bold]Search:[/bold]
+  /           - Search file paths (letters in order, e.g. "tsel")
+  ↑, ↓        - Move through the matches
+  Space       - Toggle selection of the current match
+  Ctrl+A      - Select all matching files
+  Ctrl+N      - Deselect all matching files
+  Enter       - Show the current match in the tree
+  Esc         - Back to the tree
+  
 [bold]Actions:[/bold]
   S           - Save selections and continue
   Q, Esc      - Quit without saving
@@ -509,31 +1395,35 @@ class RichFileTreeSelector:
 [bold]Symbols:[/bold]
   ☑ - Selected for inclusion in prompt
   ☐ - Not selected for inclusion  
-  ☒ - Ignored by default patterns
   📁 - Directory
   📄 - File
   ▶ - Collapsed directory
   ▼ - Expanded directory
 """
-        console.print(Panel(help_text, border_style="yellow"))
-        console.print("[dim]Press any key to continue...[/dim]")
+        help_panel = Group(
+            Panel(help_text, border_style="yellow"),
+            "[dim]Press any key to continue...[/dim]",
+        )
+        if self.live:
+            self.live.update(help_panel, refresh=True)
+        else:
+            console.print(help_panel)
         get_key()
 
     def save_and_continue(self) -> bool:
         """Save selections and exit."""
-        if not self.root_node:
+        if not self.tree:
             console.print("[red]Error:[/red] No files to save")
             return True
 
-        ignore_patterns = self.root_node.get_unchecked_patterns(self.directory)
+        self.load_all()
+        ignore_patterns = self.tree.unchecked_patterns()
         # Add default patterns
         ignore_patterns.update(self.ignore_manager.default_patterns)
 
         if self.ignore_manager.write_ignore_patterns(ignore_patterns):
-            selected_files = [
-                node.path for node in self.root_node.get_all_files() if node.checked
-            ]
-            console.print(f"[green]✓[/green] Selected {len(selected_files)} files")
+            selected_count = self.tree.totals(ROOT).selected_files
+            console.print(f"[green]✓[/green] Selected {selected_count} files")
             return False  # Exit the loop
         else:
             console.print("[red]Error:[/red] Failed to save ignore patterns")
@@ -543,8 +1433,17 @@ class RichFileTreeSelector:
         """Run the file selector and return selected files."""
         console.print("[cyan]Building file tree...[/cyan]")
 
-        self.root_node = self.build_file_tree()
-        if not self.root_node:
+        try:
+            return self._run()
+        finally:
+            if self.dir_index is not None:
+                self.dir_index.close()
+                self.dir_index = None
+
+    def _run(self) -> List[Path]:
+        """Build the tree, run the interaction loop and collect the selection."""
+        self.build_file_tree()
+        if not self.tree:
             console.print("[red]Error:[/red] Could not build file tree")
             return []
 
@@ -557,66 +1456,83 @@ class RichFileTreeSelector:
         console.print("[green]✓[/green] File tree built successfully")
         console.print("[dim]Use 'help' command for navigation instructions[/dim]")
 
-        # Main interaction loop
+        # Count files below each directory while the user browses
+        self.start_scanner()
+
+        # Main interaction loop; Live redraws the frame in place instead of
+        # clearing and reprinting the whole screen on every key
         try:
-            while True:
-                self.render_tree()
-                if not self.handle_input():
-                    break
+            with Live(console=console, auto_refresh=False) as live, cbreak_input():
+                self.live = live
+                while True:
+                    live.update(self.render_tree(), refresh=True)
+
+                    # Keep showing the scan's and the search's progress
+                    # until a key is pressed
+                    while self.has_background_work() and not key_waiting(REDRAW_INTERVAL):
+                        self.frame_start = time.perf_counter()
+                        live.update(self.render_tree(), refresh=True)
+
+                    if not self.handle_input():
+                        break
+
+            # The rest of the selection is loaded from git's view below
+            self.finish_git_listing()
         except KeyboardInterrupt:
             console.print("\n[yellow]Operation cancelled[/yellow]")
             return []
+        finally:
+            self.live = None
+            self.scanner.stop()
 
         # Return selected files
-        if self.root_node:
-            selected_files = [
-                node.path for node in self.root_node.get_all_files() if node.checked
-            ]
-            return selected_files
+        if self.tree:
+            self.load_all()
+            return [self.tree.path(node) for node in self.tree.iter_selected()]
 
         return []
 
 
-def run_hierarchical_selector(directory: Path) -> List[Path]:
+def run_hierarchical_selector(
+    directory: Path, token_budget: Optional[int] = None, use_git: bool = True, use_cache: bool = True
+) -> List[Path]:
     """Run the hierarchical file selector and return selected files."""
     try:
-        selector = RichFileTreeSelector(directory)
+        selector = RichFileTreeSelector(directory, token_budget, use_git, use_cache)
         return selector.run()
     except Exception as e:
         console.print(f"[red]Error:[/red] Failed to run hierarchical selector: {e}")
         return []
 
 
-def run_simple_selector(directory: Path) -> List[Path]:
+def run_simple_selector(directory: Path, use_git: bool = True, use_cache: bool = True) -> List[Path]:
     """Simple fallback file selector using basic file listing."""
     console.print("[yellow]Using simple file selector[/yellow]")
 
     ignore_manager = ShotgunIgnoreManager(directory)
-    ignore_patterns = ignore_manager.read_ignore_patterns()
-
-    # Get all files
-    all_files = []
-    for root, dirs, files in os.walk(directory):
-        # Remove ignored directories from dirs to prevent traversal
-        dirs[:] = [
-            d
-            for d in dirs
-            if not ignore_manager.should_ignore(
-                Path(root) / d, set(ignore_manager.default_patterns)
-            )
-        ]
+    git_files = list_git_files(directory) if use_git else None
+    rules = RuleUnion(
+        ignore_manager.hidden_rules(use_git and git_files is None),
+        ignore_manager.read_ignore_rules(),
+    )
 
-        for file in files:
-            file_path = Path(root) / file
-            if not ignore_manager.should_ignore(
-                file_path, set(ignore_manager.default_patterns)
-            ):
-                all_files.append(file_path)
-
-    # Filter out files that should be ignored based on .shotgunignore
-    selected_files = [
-        f for f in all_files if not ignore_manager.should_ignore(f, ignore_patterns)
-    ]
+    # Get the files that are neither hidden nor ignored by .shotgunignore,
+    # from git inside a work tree, otherwise without descending into
+    # ignored directories
+    selected_files = []
+    if git_files is not None:
+        for relative_path in git_files.paths:
+            if not rules.matches(relative_path):
+                selected_files.append(Path(directory, relative_path))
+    else:
+        dir_index = open_directory_index(directory) if use_cache else None
+        for listing in walk(directory, prune=rules.should_prune, index=dir_index):
+            prefix = listing.relative_dir + "/" if listing.relative_dir else ""
+            for name in listing.files:
+                if not rules.matches(prefix + name):
+                    selected_files.append(Path(os.path.join(listing.path, name)))
+        if dir_index is not None:
+            dir_index.close()
 
     console.print(
         f"[green]✓[/green] Found {len(selected_files)} files (filtered by .shotgunignore)"
@@ -0,0 +1,173 @@
+"""Directory walking on ``os.scandir`` with pruning and symlink-loop protection."""
+
+import os
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# One directory of a walk: ``relative_dir`` is ``/``-separated ("" for the
+# root) and ``path`` the directory's own path, ``dirs`` and ``files`` are
+# names sorted, and ``sizes`` the sizes of the files when they were stat'ed
+Listing = namedtuple("Listing", ["relative_dir", "path", "dirs", "files", "sizes"])
+
+# (st_dev, st_ino) of a directory
+Identity = Tuple[int, int]
+
+# Identities of a directory and those above it, as nested
+# ``(identity, parent chain)`` pairs so siblings share their ancestors
+IdentityChain = Optional[Tuple[Optional[Identity], "IdentityChain"]]
+
+
+def directory_identity(path: str) -> Optional[Identity]:
+    """Get the identity of a directory (following symlinks), if it can be read."""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_dev, stat_result.st_ino
+
+
+def in_chain(identity: Optional[Identity], chain: IdentityChain) -> bool:
+    """Check whether a directory is one of those in a chain (a symlink loop)."""
+    if identity is None:
+        return False
+    while chain is not None:
+        if chain[0] == identity:
+            return True
+        chain = chain[1]
+    return False
+
+
+def scan_directory(
+    path: str, stat_files: bool = False
+) -> Tuple[List[str], List[str], Optional[List[int]]]:
+    """
+    List a directory, split into subdirectories and everything else.
+
+    Entry types come from the directory listing itself, so only symlinks
+    cost an extra ``stat``; symlinks to directories count as directories.
+
+    Args:
+        path: Directory to list
+        stat_files: Also ``stat`` the files for their sizes
+
+    Returns:
+        ``(dirs, files, sizes)``: the names, each sorted, and with
+        ``stat_files`` the sizes of the files (0 for those that can't be
+        stat'ed), otherwise None
+
+    Raises:
+        OSError: If the directory cannot be listed
+    """
+    dirs = []
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                dirs.append(entry.name)
+            elif stat_files:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                files.append((entry.name, size))
+            else:
+                files.append(entry.name)
+
+    dirs.sort()
+    files.sort()
+    if not stat_files:
+        return dirs, files, None
+    return dirs, [name for name, _ in files], [size for _, size in files]
+
+
+def read_directory(
+    path: str, stat_files: bool = False, index=None
+) -> Tuple[os.stat_result, List[str], List[str], Optional[List[int]]]:
+    """
+    ``stat`` and list a directory, see ``scan_directory``.
+
+    With a ``DirectoryIndex``, the listing is taken from it while the
+    directory's mtime is unchanged. The lists returned may be shared, so
+    they must not be modified.
+
+    Raises:
+        OSError: If the directory cannot be read
+    """
+    stat_result = os.stat(path)
+    if index is not None:
+        listing = index.scan(path, stat_result.st_mtime_ns, stat_files)
+    else:
+        listing = scan_directory(path, stat_files)
+    return (stat_result,) + listing
+
+
+def _list(
+    path: str,
+    relative_dir: str,
+    prune: Optional[Callable[[str], bool]],
+    stat_files: bool,
+    index,
+) -> Tuple[Optional[Identity], Listing]:
+    """List one directory of a walk, with its identity."""
+    try:
+        stat_result, dirs, files, sizes = read_directory(path, stat_files, index)
+    except OSError:
+        return None, Listing(relative_dir, path, [], [], [] if stat_files else None)
+
+    prefix = relative_dir + "/" if relative_dir else ""
+    # A new list either way, so callers can prune it in place
+    dirs = [name for name in dirs if prune is None or not prune(prefix + name)]
+
+    identity = (stat_result.st_dev, stat_result.st_ino)
+    return identity, Listing(relative_dir, path, dirs, files, sizes)
+
+
+def walk(
+    root,
+    prune: Optional[Callable[[str], bool]] = None,
+    stat_files: bool = False,
+    index=None,
+) -> Iterator[Listing]:
+    """
+    Walk a directory tree top-down, like ``os.walk`` on ``os.scandir``.
+
+    Directories are yielded depth first, with their entries sorted by
+    name. As with ``os.walk``, removing entries from ``listing.dirs``
+    before asking for the next listing keeps the walk out of them.
+
+    Symlinks to directories are followed, except into a directory that is
+    already above them (compared by ``(st_dev, st_ino)``), so symlink
+    loops end after one round.
+
+    Args:
+        root: Directory to walk
+        prune: Called with the relative path of each subdirectory; those
+            it returns True for are left out of the walk
+        stat_files: ``stat`` files while listing, see ``scan_directory``
+        index: A ``DirectoryIndex`` to take unchanged listings from
+
+    Yields:
+        A ``Listing`` per directory, the root first
+    """
+    root = os.fspath(root)
+    # Directories still to walk, next one last, with the chain of those
+    # above them: (relative dir, path, chain)
+    stack: List[Tuple[str, str, IdentityChain]] = [("", root, None)]
+
+    while stack:
+        relative_dir, path, chain = stack.pop()
+        identity, listing = _list(path, relative_dir, prune, stat_files, index)
+        if in_chain(identity, chain):
+            continue  # A symlink to a directory above it
+        chain = (identity, chain)
+
+        yield listing
+
+        prefix = relative_dir + "/" if relative_dir else ""
+        for name in reversed(listing.dirs):
+            stack.append((prefix + name, os.path.join(path, name), chain))
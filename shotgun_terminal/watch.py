@@ -0,0 +1,678 @@
+"""Watch mode: keep a generated context file up to date as files change."""
+
+import ctypes
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from rich.console import Console
+
+from .ignore_rules import RuleUnion, compile_ignore_rules
+from .manifest import ManifestEntry, ScanManifest
+from .packing import pack_manifest
+from .prompts import process_template
+from .tokens import estimate_tokens
+from .tree_selector import ShotgunIgnoreManager
+from .walker import scan_directory, walk
+
+console = Console()
+
+# After the first change, changes are collected until there has been none
+# for this long, so an editor's save (write, rename, chmod) is one update
+SETTLE_TIME = 0.01
+
+# ...but for no longer than this after the first change, in seconds
+MAX_SETTLE_TIME = 0.05
+
+# How often the polling fallback compares stat results, in seconds
+POLL_INTERVAL = 0.5
+
+# inotify event bits, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+# struct inotify_event without its name: wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+# What an update changed: files re-read, added and removed
+WatchUpdate = namedtuple("WatchUpdate", ["changed", "added", "removed"])
+
+
+def _stamp(stat_result: os.stat_result) -> Tuple[int, int, int]:
+    """The parts of a stat result that change when a file is written or replaced."""
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino
+
+
+def _path_key(path: str) -> str:
+    """
+    Sort key putting paths in the order of the selector's tree: with the
+    separator as the lowest character, parents sort before their siblings'
+    longer names.
+    """
+    return path.replace(os.sep, "\0")
+
+
+class InotifyWatcher:
+    """
+    Change notification through Linux inotify, with one watch per directory.
+
+    Files are watched through their directories, so editors that save by
+    writing a new file and renaming it over the old one are seen too.
+    """
+
+    name = "inotify"
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._init = libc.inotify_init1
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self._fd = self._init(IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+        # Watch descriptor -> relative directories (symlinks can share one)
+        self._watches: Dict[int, Set[str]] = {}
+        self._dirs: Dict[str, int] = {}
+
+    def watch(self, dirs: Iterable[str], files: Iterable[str]):
+        """
+        Watch exactly these relative directories; ``files`` are seen
+        through them.
+
+        Raises:
+            OSError: If a watch cannot be added, e.g. because the inotify
+                watch limit is reached
+        """
+        wanted = set(dirs)
+
+        for relative_dir in list(self._dirs):
+            if relative_dir not in wanted:
+                self._forget(relative_dir, remove=True)
+
+        for relative_dir in wanted.difference(self._dirs):
+            path = os.path.join(self.directory, relative_dir)
+            wd = self._add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue  # Gone already; its parent reports that
+                raise OSError(error, os.strerror(error), path)
+
+            self._watches.setdefault(wd, set()).add(relative_dir)
+            self._dirs[relative_dir] = wd
+
+    def _forget(self, relative_dir: str, remove: bool):
+        wd = self._dirs.pop(relative_dir)
+        shared = self._watches.get(wd)
+        if shared is not None:
+            shared.discard(relative_dir)
+            if not shared:
+                del self._watches[wd]
+                if remove:
+                    self._rm_watch(self._fd, wd)
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait for changes and return the relative paths of the files and
+        directories that changed, or an empty set on timeout.
+        """
+        changed: Set[str] = set()
+        settle_deadline = None
+
+        while True:
+            if settle_deadline is None:
+                wait_time = timeout
+            else:
+                wait_time = min(SETTLE_TIME, settle_deadline - time.monotonic())
+                if wait_time <= 0:
+                    break
+
+            ready, _, _ = select.select([self._fd], [], [], wait_time)
+            if not ready:
+                break
+
+            self._read_events(changed)
+            if changed and settle_deadline is None:
+                settle_deadline = time.monotonic() + MAX_SETTLE_TIME
+
+        return changed
+
+    def _read_events(self, changed: Set[str]):
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: have every directory checked
+                changed.update(self._dirs)
+                continue
+
+            relative_dirs = self._watches.get(wd, ())
+            for relative_dir in list(relative_dirs):
+                if name:
+                    changed.add(os.path.join(relative_dir, name))
+                else:
+                    changed.add(relative_dir)
+                    if mask & IN_IGNORED:
+                        # The directory is gone and so is its watch
+                        self._forget(relative_dir, remove=False)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Change detection by comparing ``stat`` results every ``POLL_INTERVAL``."""
+
+    name = "polling"
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        self._stamps: Dict[str, Optional[Tuple[int, int, int]]] = {}
+
+    def _stamp(self, relative_path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            return _stamp(os.stat(os.path.join(self.directory, relative_path)))
+        except OSError:
+            return None
+
+    def watch(self, dirs: Iterable[str], files: Iterable[str]):
+        """Watch exactly these relative directories and files."""
+        stamps = {}
+        for relative_path in (*dirs, *files):
+            if relative_path in self._stamps:
+                stamps[relative_path] = self._stamps[relative_path]
+            else:
+                stamps[relative_path] = self._stamp(relative_path)
+        self._stamps = stamps
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait for changes and return the relative paths of the files and
+        directories that changed, or an empty set on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            changed = set()
+            for relative_path, stamp in self._stamps.items():
+                current = self._stamp(relative_path)
+                if current != stamp:
+                    self._stamps[relative_path] = current
+                    changed.add(relative_path)
+
+            if changed:
+                return changed
+
+            sleep_time = POLL_INTERVAL
+            if deadline is not None:
+                sleep_time = min(sleep_time, deadline - time.monotonic())
+                if sleep_time <= 0:
+                    return changed
+            time.sleep(sleep_time)
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory):
+    """Get an inotify watcher where available, otherwise a polling one."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            console.print(
+                f"[yellow]Warning:[/yellow] inotify unavailable ({e}), polling for changes"
+            )
+    return PollingWatcher(directory)
+
+
+class LiveContext:
+    """
+    A generated context kept up to date as the files behind it change.
+
+    ``update`` re-scans only the files that changed and reuses every other
+    file's block through the generator's ``block_memo``; the project tree
+    is rebuilt only when files were added or removed. The output file is
+    replaced atomically, so readers never see it half written.
+
+    The selected files are tracked whether or not they currently exist, so
+    a file that is deleted and written again comes back. New files are
+    picked up in open directories: those where every file that could be
+    selected was selected, and directories created inside them. Elsewhere
+    the selection stays as it was made.
+    """
+
+    def __init__(
+        self,
+        generator,
+        manifest: ScanManifest,
+        output_file: str,
+        prompt_type: str,
+        user_task: str,
+        custom_rules: str,
+        ignore_patterns: Iterable[str] = (),
+        token_budget: Optional[int] = None,
+        pack_order: str = "smallest",
+        rank_file: Optional[str] = None,
+        use_git: bool = True,
+    ):
+        self.generator = generator
+        self.directory = generator.directory
+        self.output_file = os.path.abspath(output_file)
+        self.prompt_type = prompt_type
+        self.user_task = user_task
+        self.custom_rules = custom_rules
+        self.token_budget = token_budget
+        self.pack_order = pack_order
+        self.rank_file = rank_file
+
+        # The output itself never goes into the context, or each write
+        # would trigger the next
+        self.output_path = os.path.relpath(self.output_file, self.directory)
+
+        # The .shotgunignore rules are swapped for new ones when any of
+        # the files changes, the other rules stay
+        self.ignore_manager = ShotgunIgnoreManager(self.directory)
+        self.hidden_rules = self.ignore_manager.hidden_rules(use_git)
+        self.pattern_rules = compile_ignore_rules(ignore_patterns)
+        self.ignore_rules = None
+        self._refresh_rules()
+
+        self.entries: Dict[str, ManifestEntry] = {
+            entry.path: entry for entry in manifest if entry.path != self.output_path
+        }
+        self.order = [path for path in manifest.paths() if path in self.entries]
+        self.dir_files: Dict[str, Set[str]] = {}
+        for path in self.order:
+            self.dir_files.setdefault(os.path.dirname(path), set()).add(path)
+
+        self.open_dirs: Set[str] = set()
+        # Subdirectories of open directories that existed but were left out
+        self.closed_dirs: Set[str] = set()
+        for relative_dir in list(self.dir_files):
+            self._classify(relative_dir)
+
+        generator.verbose = False
+        if generator.block_memo is None:
+            generator.block_memo = {}
+
+        self.project_tree = generator.generate_project_tree(self._manifest())
+        self.prompt_tokens = self._prompt_tokens()
+        self.total_tokens = 0
+        self.paths_changed = True  # The sets to watch changed since last asked
+
+        self._pending: Set[str] = set()
+        self._gone: Set[str] = set()
+
+    def _refresh_rules(self):
+        """Reload the .shotgunignore rules if one of the files was edited."""
+        rules = self.ignore_manager.read_ignore_rules()
+        if rules is not self.ignore_rules:
+            self.ignore_rules = rules
+            self.rules = RuleUnion(self.hidden_rules, rules, self.pattern_rules)
+
+    def _manifest(self) -> ScanManifest:
+        return ScanManifest(self.directory, [self.entries[p] for p in self.order])
+
+    def _prompt_tokens(self) -> int:
+        return estimate_tokens(
+            process_template(
+                self.prompt_type,
+                self.user_task,
+                self.custom_rules,
+                "",
+                self.project_tree,
+            )
+        )
+
+    def _wants(self, path: str) -> bool:
+        """Check if a new file would be added to the selection."""
+        name = os.path.basename(path)
+        if name.startswith(".") or name.endswith("~") or path == self.output_path:
+            return False
+        return not self.rules.matches(path)
+
+    def _wants_dir(self, path: str) -> bool:
+        """Check if new files below a new directory would be added."""
+        if os.path.basename(path).startswith("."):
+            return False
+        return not self.rules.should_prune(path)
+
+    def _classify(self, relative_dir: str):
+        """Mark a directory open if every file that could be selected in it is."""
+        try:
+            dirs, files, _ = scan_directory(os.path.join(self.directory, relative_dir))
+        except OSError:
+            return
+
+        selected = self.dir_files.get(relative_dir, ())
+        for name in files:
+            path = os.path.join(relative_dir, name)
+            if path not in selected and self._wants(path):
+                return
+
+        self.open_dirs.add(relative_dir)
+        for name in dirs:
+            path = os.path.join(relative_dir, name)
+            if path not in self.dir_files:
+                self.closed_dirs.add(path)
+
+    def watched_dirs(self) -> Set[str]:
+        """Directories whose entries are watched."""
+        return self.open_dirs.union(self.dir_files)
+
+    def selected_files(self) -> Set[str]:
+        """Files tracked, including selected files that are currently missing."""
+        files = set()
+        for paths in self.dir_files.values():
+            files.update(paths)
+        return files
+
+    def update(self, changed_paths: Iterable[str]) -> Optional[WatchUpdate]:
+        """
+        Bring the context up to date after changes to ``changed_paths``,
+        relative paths of files or directories, and rewrite the output.
+
+        Returns:
+            What changed, or None if no file in the context did and the
+            output was left alone
+        """
+        self._refresh_rules()
+        self._pending = set()
+        self._gone = set()
+        for path in sorted(changed_paths):
+            self._check(path)
+
+        if not self._pending and not self._gone:
+            return None
+
+        scanned = {}
+        if self._pending:
+            for entry in self.generator.scan(sorted(self._pending), []):
+                scanned[entry.path] = entry
+
+        added = []
+        changed = 0
+        for path in self._pending:
+            entry = scanned.get(path)
+            if entry is None:
+                # Not a regular file (any more)
+                if path in self.entries:
+                    self._gone.add(path)
+                continue
+
+            if path in self.entries:
+                changed += 1
+            else:
+                added.append(path)
+                self.dir_files.setdefault(os.path.dirname(path), set()).add(path)
+            self.entries[path] = entry
+
+        removed = []
+        for path in self._gone.difference(scanned):
+            if path in self.entries:
+                del self.entries[path]
+                removed.append(path)
+
+        if not changed and not added and not removed:
+            return None
+
+        if removed:
+            gone = set(removed)
+            self.order = [path for path in self.order if path not in gone]
+        if added:
+            self.order.extend(added)
+            self.order.sort(key=_path_key)
+
+        manifest = self._manifest()
+        if self.generator.dedupe:
+            manifest.mark_duplicates()
+
+        if added or removed:
+            self.project_tree = self.generator.generate_project_tree(manifest)
+            self.prompt_tokens = self._prompt_tokens()
+            self.paths_changed = True
+
+        self.write(manifest)
+        return WatchUpdate(changed, len(added), len(removed))
+
+    def _check(self, path: str):
+        """Find out what a change notification for a path means."""
+        if path == self.output_path:
+            return
+
+        if path in self.dir_files.get(os.path.dirname(path), ()):
+            self._check_file(path)
+        elif path in self.open_dirs or path in self.dir_files:
+            self._check_dir(path)
+        elif os.path.isdir(os.path.join(self.directory, path)):
+            self._check_dir(path)
+        elif os.path.dirname(path) in self.open_dirs and self._wants(path):
+            self._pending.add(path)
+
+    def _check_file(self, path: str):
+        entry = self.entries.get(path)
+        try:
+            stat_result = os.stat(os.path.join(self.directory, path))
+        except OSError:
+            stat_result = None
+
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            if entry is not None:
+                self._gone.add(path)
+        elif entry is None or _stamp(entry.stat_result) != _stamp(stat_result):
+            self._pending.add(path)
+
+    def _check_dir(self, path: str):
+        # Directories may have come back, so have their watches renewed
+        self.paths_changed = True
+
+        watched = self.watched_dirs()
+        prefix = os.path.join(path, "") if path else ""
+        for relative_dir in watched:
+            if relative_dir == path or relative_dir.startswith(prefix):
+                self._relist(relative_dir)
+
+        if (
+            path not in watched
+            and path not in self.closed_dirs
+            and os.path.dirname(path) in self.open_dirs
+            and os.path.isdir(os.path.join(self.directory, path))
+            and self._wants_dir(path)
+        ):
+            self._add_tree(path)
+
+    def _relist(self, relative_dir: str):
+        """Check the selected files of a directory, and new ones if it is open."""
+        try:
+            dirs, files, _ = scan_directory(os.path.join(self.directory, relative_dir))
+        except OSError:
+            self._gone.update(self.dir_files.get(relative_dir, ()))
+            return
+
+        for path in self.dir_files.get(relative_dir, ()):
+            self._check_file(path)
+
+        if relative_dir not in self.open_dirs:
+            return
+
+        for name in files:
+            path = os.path.join(relative_dir, name)
+            if path not in self.entries and self._wants(path):
+                self._pending.add(path)
+
+        watched = self.watched_dirs()
+        for name in dirs:
+            path = os.path.join(relative_dir, name)
+            if (
+                path not in watched
+                and path not in self.closed_dirs
+                and self._wants_dir(path)
+            ):
+                self._add_tree(path)
+
+    def _add_tree(self, path: str):
+        """Add a new directory below an open one, and everything in it."""
+
+        def prune(relative_dir):
+            return not self._wants_dir(os.path.join(path, relative_dir))
+
+        for listing in walk(os.path.join(self.directory, path), prune=prune):
+            relative_dir = path
+            if listing.relative_dir:
+                relative_dir = os.path.join(
+                    path, listing.relative_dir.replace("/", os.sep)
+                )
+            self.open_dirs.add(relative_dir)
+
+            for name in listing.files:
+                file_path = os.path.join(relative_dir, name)
+                if self._wants(file_path):
+                    self._pending.add(file_path)
+
+    def write(self, manifest: Optional[ScanManifest] = None):
+        """Write the context to the output file, replacing it atomically."""
+        if manifest is None:
+            manifest = self._manifest()
+
+        plan = None
+        if self.token_budget:
+            plan = pack_manifest(
+                manifest,
+                max(self.token_budget - self.prompt_tokens, 0),
+                self.generator.max_file_size,
+                self.pack_order,
+                self.user_task,
+                self.rank_file,
+            )
+
+        # The blocks are in memory anyway, and joining them in one go is
+        # much quicker than streaming them one by one
+        blocks = self.generator.iter_context(manifest, "claude-xml", plan)
+        context = process_template(
+            self.prompt_type,
+            self.user_task,
+            self.custom_rules,
+            "\n".join(blocks),
+            self.project_tree,
+        )
+
+        # Written next to the output (hidden, so it is never picked up as a
+        # new file) and renamed over it
+        output_dir, output_name = os.path.split(self.output_file)
+        temp_path = os.path.join(output_dir, f".{output_name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(context)
+            os.replace(temp_path, self.output_file)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self.total_tokens = self.prompt_tokens + self.generator.context_tokens
+
+
+def _watch_paths(watcher, live: LiveContext):
+    """Point the watcher at the live context's paths, falling back to polling."""
+    try:
+        watcher.watch(live.watched_dirs(), live.selected_files())
+    except OSError as e:
+        watcher.close()
+        console.print(
+            f"[yellow]Warning:[/yellow] Could not watch with {watcher.name} ({e}), polling for changes"
+        )
+        watcher = PollingWatcher(live.directory)
+        watcher.watch(live.watched_dirs(), live.selected_files())
+
+    live.paths_changed = False
+    return watcher
+
+
+def watch_context(live: LiveContext, output_file: str):
+    """Rewrite the context whenever the files behind it change, until Ctrl+C."""
+    watcher = _watch_paths(open_watcher(live.directory), live)
+    console.print(
+        f"\n[blue]Watching {len(live.entries)} files for changes ({watcher.name}), "
+        "press Ctrl+C to stop[/blue]"
+    )
+
+    try:
+        while True:
+            changed_paths = watcher.wait()
+            start = time.perf_counter()
+
+            try:
+                update = live.update(changed_paths)
+            except Exception as e:
+                console.print(f"[red]Error updating context:[/red] {e}")
+                continue
+
+            if live.paths_changed:
+                watcher = _watch_paths(watcher, live)
+            if update is None:
+                continue
+
+            elapsed = (time.perf_counter() - start) * 1000
+            details = []
+            if update.changed:
+                details.append(f"{update.changed} changed")
+            if update.added:
+                details.append(f"{update.added} added")
+            if update.removed:
+                details.append(f"{update.removed} removed")
+            console.print(
+                f"[dim]{time.strftime('%H:%M:%S')}[/dim] Updated {output_file} "
+                f"({', '.join(details)}) in {elapsed:.0f} ms, "
+                f"{live.total_tokens} tokens"
+            )
+    except KeyboardInterrupt:
+        console.print("\n[blue]Stopped watching[/blue]")
+    finally:
+        watcher.close()